@@ -0,0 +1,10 @@
+# Loaded by gunicorn from the working directory (Procfile: gunicorn lava_ott.wsgi).
+
+
+def post_worker_init(worker):
+    # Runs in each worker once the app is loaded, so with --preload too: threads started in the
+    # master don't survive the fork. Flushes the buffers this worker holds in memory.
+    from users.scheduler import start_role, WORKER
+
+    started = start_role(WORKER)
+    worker.log.info('Periodic tasks started: %s', ', '.join(started) or 'none')
@@ -99,6 +99,9 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # A file rather than the in-memory default, so the concurrency tests can run on SQLite:
+        # threads wait on its write lock instead of failing, and spawned processes can open it.
+        'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
     }
 }
 
@@ -121,6 +124,19 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Background jobs (users.scheduler, videos.sweeper) log to the console.
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'users.scheduler': {'handlers': ['console'], 'level': 'INFO'},
+        'videos.sweeper': {'handlers': ['console'], 'level': 'INFO'},
+    },
+}
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/4.2/topics/i18n/
@@ -177,6 +193,82 @@ ADMIN_SESSION_AGE = 3000  # In seconds
 USER_KEEP_SESSION_AGE = 300 * 86400  # In seconds
 USER_SESSION_AGE = 30 * 86400  # In seconds
 
+# Resolved sessions are kept in a per-process cache so authenticated requests skip the DB.
+SESSION_CACHE_ENABLED = True
+SESSION_CACHE_TIMEOUT = 60  # In seconds
+SESSION_CACHE_MAX_SIZE = 10000
+# A cached user without a subscription is re-read from the DB at most this often, per worker.
+SUBSCRIPTION_RECHECK_INTERVAL = 10  # In seconds
+
+# Sliding expiry is only persisted once it drifts by more than this fraction of the session age,
+# and pending updates are written in bulk every SESSION_TOUCH_FLUSH_INTERVAL seconds per worker.
+SESSION_TOUCH_COALESCE = True
+SESSION_TOUCH_TOLERANCE = 0.05
+SESSION_TOUCH_FLUSH_INTERVAL = 30  # In seconds
+
+# Session types listed here ('web', 'app') get self-contained signed tokens that are verified
+# without a session lookup. Stateless tokens have a fixed lifetime of the session age.
+SESSION_STATELESS_TYPES = ()
+SESSION_REVOCATION_SYNC_INTERVAL = 5  # In seconds
+SESSION_REVOCATION_SYNC_OVERLAP = 300  # Seconds of already synced rows re-read, for late-committing writes
+SESSION_REVOCATION_SHORT_SECONDS = 3600  # Revocations ending sooner are kept exactly, outside the Bloom filters
+SESSION_REVOCATION_BUCKET_SECONDS = 30 * 86400  # In seconds
+SESSION_REVOCATION_CAPACITY = 10000  # Per bucket
+SESSION_REVOCATION_ERROR_RATE = 0.001
+
+# How long a worker trusts its copy of the server enabled flag set through setproject before it
+# compares Project.version, bumped by setproject, and re-reads the flag if the version moved.
+SERVER_STATUS_CACHE_TIMEOUT = 10  # In seconds
+
+# Periodic tasks (users.scheduler): per-worker flushes run in gunicorn workers (gunicorn.conf.py), the
+# *_INTERVAL jobs below that default to None run in the `manage.py run_periodic_tasks` process once set.
+# Run the order sweeper (manage.py sweep_orders) this often. None disables it.
+ORDER_SWEEP_INTERVAL = None  # In seconds
+
+# The app video list is rebuilt on video changes, and at least this often for the view counters.
+CATALOG_CACHE_TIMEOUT = 60  # In seconds
+
+# Old app builds call app-video-list without 'cursor' or 'per_page' and expect every video.
+APP_VIDEO_LIST_FULL_RESPONSE = True
+APP_VIDEO_PAGE_SIZE = 12
+APP_VIDEO_PAGE_SIZE_MAX = 50
+
+# Sync tokens point this far back so changes committed while a sync ran are sent again, not lost.
+APP_VIDEO_SYNC_OVERLAP = 5  # In seconds
+
+# Resumable video uploads (video-upload/)
+VIDEO_UPLOAD_MAX_CHUNK_SIZE = 100 * 1024 * 1024  # Largest PATCH body, in bytes
+VIDEO_UPLOAD_READ_SIZE = 1024 * 1024  # Request body is copied to the file this many bytes at a time
+VIDEO_UPLOAD_LOCK_TIMEOUT = 15 * 60  # A chunk request still writing after this loses its lease, in seconds
+VIDEO_UPLOAD_EXPIRY = 7 * 24 * 60 * 60  # Unfinished uploads older than this are removed by --reconcile, in seconds
+
+# Files of deleted videos and carousel images are queued and removed by process_media_deletions.
+MEDIA_DELETION_INTERVAL = None  # In seconds; also run the queue from run_periodic_tasks when set
+MEDIA_DELETION_BATCH_SIZE = 100
+MEDIA_DELETION_MAX_ATTEMPTS = 5
+# How long a worker's claim on a batch lasts before other workers may take the batch again.
+MEDIA_DELETION_CLAIM_TIMEOUT = 10 * 60  # In seconds
+MEDIA_ORPHAN_MIN_AGE = 24 * 60 * 60  # Reconciliation leaves younger unreferenced files alone, in seconds
+
+# Thumbnail and carousel renditions (videos.images)
+IMAGE_RENDITION_WIDTHS = (320, 640, 1280)
+IMAGE_RENDITION_QUALITY = 80
+IMAGE_LQIP_WIDTH = 24  # Width of the inline placeholder
+# Processes per server worker, and as many threads saving their output; 0 renders in the saving thread
+IMAGE_RENDITION_WORKERS = 2
+
+# Plays are counted in memory and added to the video rows in bulk this often per worker.
+PLAY_COUNT_FLUSH_INTERVAL = 10  # In seconds
+
+# Playback heartbeats are buffered per worker and folded into WatchProgress this often.
+WATCH_PROGRESS_FLUSH_INTERVAL = 10  # In seconds
+WATCH_HEARTBEAT_MAX_SECONDS = 60  # Most watch time a single heartbeat can add
+WATCH_COMPLETED_RATIO = 0.95  # Videos watched past this share of their duration leave "continue watching"
+CONTINUE_WATCHING_LIMIT = 20
+# Recompute Video.watch_hours as its baseline plus the WatchProgress totals this often; None leaves it to the
+# aggregate_watch_hours command.
+WATCH_HOURS_AGGREGATE_INTERVAL = None  # In seconds
+
 # CORS_ALLOWED_ORIGINS = ['https://lavaott-979ac37aaaa6.herokuapp.com']
 
 # AWS S3 Bucket Conf
@@ -210,6 +302,15 @@ AWS_S3_URL_PROTOCOL = 'https:'
 # MEDIA_ROOT = f'{AWS_S3_URL_PROTOCOL}//{AWS_S3_CUSTOM_DOMAIN}'
 # DEFAULT_FILE_STORAGE = 'storages.backends.s3boto3.S3Boto3Storage'
 
+# Storage of Video.file and Video.trailer: 'default', or 'parallel-s3' to upload them to the
+# AWS_STORAGE_BUCKET_NAME bucket with concurrent multipart parts (videos.s3_storage).
+VIDEO_STORAGE = 'default'
+VIDEO_S3_MULTIPART_THRESHOLD = 64 * 1024 * 1024  # Smaller files are sent in one request
+VIDEO_S3_PART_SIZE = 16 * 1024 * 1024  # S3 needs at least 5MB for all but the last part
+VIDEO_S3_MAX_WORKERS = 8  # Parts in flight per upload
+VIDEO_S3_PART_RETRIES = 3
+VIDEO_S3_VERIFY_ETAG = True  # Disable for SSE-KMS buckets, whose ETags aren't MD5 based
+
 
 # ----- OTP ----- #
 OTP_SEND = True
@@ -265,4 +366,31 @@ PAYMENT_CONFIG = {
 PAYMENT_URL_CONFIG = {
     'response_url': 'https://api.lavaott.com/payment/response/',  # Use HTTPS for production
     'webhook_url': 'https://api.lavaott.com/payment/webhook/',   # Optional but recommended
-}
\ No newline at end of file
+}
+
+# Cashfree HTTP client (payment.gateway)
+PAYMENT_GATEWAY_CONNECT_TIMEOUT = 3.05  # In seconds
+PAYMENT_GATEWAY_READ_TIMEOUT = 10  # In seconds
+PAYMENT_GATEWAY_RETRIES = 2  # Connection errors for any call; read errors and 429/5xx for GET only
+PAYMENT_GATEWAY_BACKOFF = 0.3  # Exponential backoff factor, in seconds
+PAYMENT_GATEWAY_BACKOFF_JITTER = 0.2  # Random extra delay per retry, in seconds
+PAYMENT_GATEWAY_POOL_SIZE = 10  # Keep-alive connections per worker
+PAYMENT_GATEWAY_FAILURE_THRESHOLD = 5  # Consecutive failures that open the circuit
+PAYMENT_GATEWAY_RESET_TIMEOUT = 30  # Seconds the circuit stays open before a trial call
+
+# Pending transaction reconciliation (payment.reconcile)
+# Off by default: with None nothing reconciles unless `manage.py reconcile_transactions` is scheduled
+# (e.g. every 5 minutes), and payments whose final webhook never arrives stay pending.
+PAYMENT_RECONCILE_INTERVAL = None  # In seconds
+PAYMENT_RECONCILE_WINDOW_HOURS = 12  # Transactions created earlier are no longer checked
+PAYMENT_RECONCILE_WORKERS = 4  # Concurrent gateway calls
+PAYMENT_RECONCILE_RATE = 10  # Gateway calls per second
+
+# Cashfree webhooks (payment.webhooks)
+PAYMENT_WEBHOOK_TOLERANCE = 5 * 60  # Oldest accepted x-webhook-timestamp, in seconds
+PAYMENT_WEBHOOK_PROCESS_INTERVAL = None  # In seconds; None leaves it to the process_webhook_events command
+PAYMENT_WEBHOOK_BATCH_SIZE = 100
+PAYMENT_WEBHOOK_MAX_ATTEMPTS = 5
+
+# Gateway order ids and receipts (payment.ids)
+PAYMENT_ID_BLOCK_SIZE = 100  # Sequence values reserved per worker process at a time
@@ -4,3 +4,14 @@ from django.apps import AppConfig
 class PaymentConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'payment'
+
+    def ready(self):
+        from django.conf import settings
+        from users.scheduler import register_periodic, BACKGROUND
+        from .reconcile import reconcile_transactions
+        from .webhooks import process_webhook_events
+
+        register_periodic('transaction-reconcile', settings.PAYMENT_RECONCILE_INTERVAL, reconcile_transactions,
+                          BACKGROUND)
+        register_periodic('webhook-events', settings.PAYMENT_WEBHOOK_PROCESS_INTERVAL, process_webhook_events,
+                          BACKGROUND)
@@ -0,0 +1,112 @@
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from django.conf import settings
+
+
+class CircuitOpenError(requests.exceptions.RequestException):
+    """Raised without calling the gateway while the circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Opens after failure_threshold consecutive failures and rejects calls for reset_timeout
+    seconds. After that one trial call is let through: success closes the circuit, failure
+    opens it again.
+    """
+
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if self._trial or time.monotonic() - self.opened_at < self.reset_timeout:
+                return False
+            self._trial = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self._trial = False
+
+    def end_trial(self):
+        with self._lock:
+            self._trial = False
+
+
+class GatewayClient:
+    """
+    Keep-alive session for payment gateway calls, shared by every request in the worker.
+
+    Connection errors are retried for any method, since nothing was sent. Read errors and
+    429/5xx responses are only retried for GET, with exponential backoff plus jitter.
+    Responses of 429/5xx and errors count against the circuit breaker.
+    """
+
+    def __init__(self, connect_timeout, read_timeout, retries, backoff, backoff_jitter, pool_size,
+                 failure_threshold, reset_timeout):
+        self.timeout = (connect_timeout, read_timeout)
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff,
+            backoff_jitter=backoff_jitter,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset({'GET'}),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def request(self, method, url, **kwargs):
+        if not self.breaker.allow():
+            raise CircuitOpenError('Payment gateway is temporarily unavailable.')
+
+        kwargs.setdefault('timeout', self.timeout)
+        try:
+            response = self.session.request(method, url, **kwargs)
+            if response.status_code == 429 or response.status_code >= 500:
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+            return response
+        except requests.exceptions.RequestException:
+            self.breaker.record_failure()
+            raise
+        finally:
+            # Whatever a trial call raised, the next call after reset_timeout gets a trial of its own.
+            self.breaker.end_trial()
+
+
+gateway = GatewayClient(
+    connect_timeout=settings.PAYMENT_GATEWAY_CONNECT_TIMEOUT,
+    read_timeout=settings.PAYMENT_GATEWAY_READ_TIMEOUT,
+    retries=settings.PAYMENT_GATEWAY_RETRIES,
+    backoff=settings.PAYMENT_GATEWAY_BACKOFF,
+    backoff_jitter=settings.PAYMENT_GATEWAY_BACKOFF_JITTER,
+    pool_size=settings.PAYMENT_GATEWAY_POOL_SIZE,
+    failure_threshold=settings.PAYMENT_GATEWAY_FAILURE_THRESHOLD,
+    reset_timeout=settings.PAYMENT_GATEWAY_RESET_TIMEOUT,
+)
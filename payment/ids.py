@@ -0,0 +1,68 @@
+import os
+import threading
+import time
+
+from django.conf import settings
+
+ALPHABET = '0123456789abcdefghijklmnopqrstuvwxyz'
+# Fixed widths keep ids the same length, so they sort by time and then by counter.
+TIME_WIDTH = 9
+COUNTER_WIDTH = 8
+
+
+def base36(value, width):
+    digits = []
+    while value:
+        value, digit = divmod(value, 36)
+        digits.append(ALPHABET[digit])
+    return ''.join(reversed(digits)).rjust(width, '0')
+
+
+def reserve_block(name, size):
+    """
+    Reserve [start, end) from the named Sequence row. Called inside a transaction that later
+    rolls back, the block is handed out again, so call it from outside one.
+    """
+    from django.db import transaction
+    from django.db.models import F
+    from .models import Sequence
+
+    with transaction.atomic():
+        # The UPDATE takes the row lock, so two workers never read the same range.
+        if not Sequence.objects.filter(name=name).update(next_value=F('next_value') + size):
+            Sequence.objects.get_or_create(name=name)
+            Sequence.objects.filter(name=name).update(next_value=F('next_value') + size)
+        end = Sequence.objects.filter(name=name).values_list('next_value', flat=True).get()
+    return end - size, end
+
+
+class BlockAllocator:
+    """
+    Hands out values of a database sequence from blocks of block_size reserved per process, so
+    most calls need no query. Values are unique but not gapless: a restart drops the rest of
+    the block. A forked child notices the pid change and reserves its own block.
+    """
+
+    def __init__(self, name, block_size):
+        self.name = name
+        self.block_size = block_size
+        self._pid = None
+        self._next = self._end = 0
+        self._lock = threading.Lock()
+
+    def next(self):
+        with self._lock:
+            if self._pid != os.getpid() or self._next >= self._end:
+                self._next, self._end = reserve_block(self.name, self.block_size)
+                self._pid = os.getpid()
+            value = self._next
+            self._next += 1
+            return value
+
+
+allocator = BlockAllocator('payment', settings.PAYMENT_ID_BLOCK_SIZE)
+
+
+def new_id(prefix):
+    """Time-sortable unique id for the gateway, e.g. order_0mvdl902300000001."""
+    return f'{prefix}_{base36(time.time_ns() // 1000000, TIME_WIDTH)}{base36(allocator.next(), COUNTER_WIDTH)}'
@@ -0,0 +1,105 @@
+import statistics
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+
+
+class GatewayHandler(BaseHTTPRequestHandler):
+    """Answers after server.latency seconds: 503 while server.failing is set, 200 otherwise."""
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.hits += 1
+            server.connections.add(self.client_address)
+        time.sleep(server.latency)
+        body = b'{"order_status": "PAID"}'
+        status = b'503 Service Unavailable' if server.failing else b'200 OK'
+        # One write, so keep-alive calls don't wait on a delayed ACK between headers and body.
+        self.wfile.write(b'HTTP/1.1 %s\r\nContent-Type: application/json\r\nContent-Length: %d\r\n\r\n%s'
+                         % (status, len(body), body))
+
+
+class Command(BaseCommand):
+    help = ('Compare a new connection per call with the pooled GatewayClient, and the cost of calls during '
+            'a gateway outage with and without the circuit breaker. Uses a local server unless --url is given.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', help='GET this URL instead of the local server, e.g. a sandbox endpoint. '
+                                          'The outage run is skipped.')
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--latency-ms', type=float, default=5, help='Response delay of the local server.')
+
+    def handle(self, *args, **kwargs):
+        from payment.gateway import GatewayClient, CircuitOpenError
+
+        def client():
+            return GatewayClient(
+                connect_timeout=settings.PAYMENT_GATEWAY_CONNECT_TIMEOUT,
+                read_timeout=settings.PAYMENT_GATEWAY_READ_TIMEOUT,
+                retries=settings.PAYMENT_GATEWAY_RETRIES,
+                backoff=settings.PAYMENT_GATEWAY_BACKOFF,
+                backoff_jitter=settings.PAYMENT_GATEWAY_BACKOFF_JITTER,
+                pool_size=settings.PAYMENT_GATEWAY_POOL_SIZE,
+                failure_threshold=settings.PAYMENT_GATEWAY_FAILURE_THRESHOLD,
+                reset_timeout=settings.PAYMENT_GATEWAY_RESET_TIMEOUT,
+            )
+
+        server = None
+        url = kwargs['url']
+        if url is None:
+            server = ThreadingHTTPServer(('127.0.0.1', 0), GatewayHandler)
+            server.lock = threading.Lock()
+            server.latency = kwargs['latency_ms'] / 1000
+            server.failing = False
+            server.hits = 0
+            server.connections = set()
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            url = f'http://127.0.0.1:{server.server_port}/orders/benchmark'
+
+        def run(label, call):
+            if server is not None:
+                server.hits = 0
+                server.connections = set()
+            timings = []
+            for _ in range(kwargs['requests']):
+                started = time.perf_counter()
+                try:
+                    call()
+                except CircuitOpenError:
+                    pass
+                timings.append((time.perf_counter() - started) * 1000)
+            line = (f'{label:<32} p50 {statistics.median(timings):7.2f}ms  '
+                    f'p95 {sorted(timings)[int(len(timings) * .95)]:7.2f}ms')
+            if server is not None:
+                line += f'  calls served {server.hits:>4}  connections {len(server.connections):>4}'
+            self.stdout.write(line)
+
+        try:
+            timeout = (settings.PAYMENT_GATEWAY_CONNECT_TIMEOUT, settings.PAYMENT_GATEWAY_READ_TIMEOUT)
+            if requests.get(url, timeout=timeout).status_code >= 500:
+                raise CommandError(f'{url} is failing, nothing to compare.')
+
+            run('new connection per call', lambda: requests.get(url, timeout=timeout))
+            pooled = client()
+            run('pooled GatewayClient', lambda: pooled.request('GET', url))
+
+            if server is not None:
+                # Every call fails. GatewayClient retries the first ones with backoff, then its breaker
+                # opens and calls fail without reaching the server.
+                server.failing = True
+                run('outage, new connection per call', lambda: requests.get(url, timeout=timeout))
+                breaker = client()
+                run('outage, GatewayClient', lambda: breaker.request('GET', url))
+        finally:
+            if server is not None:
+                server.shutdown()
+                server.server_close()
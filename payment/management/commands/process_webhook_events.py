@@ -0,0 +1,23 @@
+import time
+
+from django.core.management import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Apply queued payment gateway webhooks to their transactions.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None)
+        parser.add_argument('--loop', type=float, default=None, metavar='SECONDS',
+                            help='Keep running, draining the inbox every SECONDS.')
+
+    def handle(self, *args, **kwargs):
+        from payment.webhooks import process_webhook_events
+
+        while True:
+            metrics = process_webhook_events(batch_size=kwargs['batch_size'])
+            self.stdout.write(self.style.SUCCESS(
+                'Processed {events} events: {applied} applied, {failed} failed in {duration}s'.format(**metrics)))
+            if not kwargs['loop']:
+                break
+            time.sleep(kwargs['loop'])
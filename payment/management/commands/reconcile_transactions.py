@@ -0,0 +1,18 @@
+from django.core.management import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Settle pending transactions from their status at the payment gateway.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since-hours', type=int, default=None)
+        parser.add_argument('--workers', type=int, default=None)
+        parser.add_argument('--rate', type=float, default=None, help='Gateway calls per second.')
+
+    def handle(self, *args, **kwargs):
+        from payment.reconcile import reconcile_transactions
+
+        metrics = reconcile_transactions(since_hours=kwargs['since_hours'], max_workers=kwargs['workers'],
+                                         rate=kwargs['rate'])
+        self.stdout.write(self.style.SUCCESS(
+            'Checked {checked}: {paid} paid, {failed} failed, {unreachable} unreachable in {duration}s'.format(**metrics)))
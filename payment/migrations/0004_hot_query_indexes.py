@@ -0,0 +1,22 @@
+# Generated by Django 5.0 on 2026-10-18 08:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payment', '0003_rename_cachefree_order_id_transaction_razorpay_order_id'),
+        ('videos', '0003_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['order', 'status', 'timestamp'], name='transaction_order_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(condition=models.Q(('status', 'created')), fields=['timestamp'], name='transaction_created_idx'),
+        ),
+    ]
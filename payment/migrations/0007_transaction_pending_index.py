@@ -0,0 +1,22 @@
+# Generated by Django 5.0 on 2026-10-18 09:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payment', '0006_sequence'),
+        ('videos', '0010_video_watch_hours_baseline'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='transaction',
+            name='transaction_created_idx',
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(condition=models.Q(('status__in', ('created', 'attempted'))), fields=['timestamp'], name='transaction_pending_idx'),
+        ),
+    ]
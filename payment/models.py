@@ -31,10 +31,41 @@ class Transaction(models.Model):
 
     order = models.ForeignKey('videos.Order', on_delete=models.SET_NULL, null=True)
 
+    class Meta:
+        indexes = [
+            # OrderCreateView / TransactionHistoryView: order__user, status, timestamp
+            models.Index(fields=['order', 'status', 'timestamp'], name='transaction_order_status_idx'),
+            # Pending payment reconciliation: status IN ('created', 'attempted') AND timestamp >= since
+            models.Index(fields=['timestamp'], condition=models.Q(status__in=('created', 'attempted')),
+                         name='transaction_pending_idx'),
+        ]
+
     @classmethod
     def generate_receipt(cls):
-        from random import randint
-        from django.db.models import Max
-        d = Transaction.objects.aggregate(latest_id=Max('id', default=1))
-        return f'receipt{int(d.get("latest_id")) + 1}_{randint(10000, 99999)}{randint(10000, 99999)}'
+        from .ids import new_id
+        return new_id('receipt')
+
+
+class Sequence(models.Model):
+    """Named counters handed out in blocks by payment.ids.BlockAllocator."""
+    name = models.CharField(max_length=50, primary_key=True)
+    next_value = models.BigIntegerField(default=1)
+
+
+class PaymentWebhookEvent(models.Model):
+    """Inbox of verified gateway webhooks, applied in batches by payment.webhooks.process_webhook_events."""
+    event_id = models.CharField(max_length=200, unique=True)
+    event_type = models.CharField(max_length=100)
+    order_id = models.CharField(max_length=200, db_index=True)
+    payload = models.JSONField()
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(blank=True, null=True)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True, default='')
 
+    class Meta:
+        indexes = [
+            # Webhook worker: processed_at IS NULL ORDER BY id
+            models.Index(fields=['id'], condition=models.Q(processed_at__isnull=True),
+                         name='webhook_event_pending_idx'),
+        ]
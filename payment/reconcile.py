@@ -0,0 +1,113 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+import requests
+from django.conf import settings
+from django.utils import timezone
+
+# Cashfree order_status -> Transaction.status; ACTIVE orders are still awaiting payment.
+GATEWAY_STATUS = {'PAID': 'paid', 'EXPIRED': 'failed', 'TERMINATED': 'failed'}
+# Transaction statuses that are not final; 'attempted' is set by a user-dropped webhook.
+PENDING_STATUSES = ('created', 'attempted')
+
+# Metrics of the most recent run in this process.
+last_run = {}
+
+
+class RateLimiter:
+    """Spaces calls at least 1 / rate seconds apart across threads."""
+
+    def __init__(self, rate):
+        self.interval = 1 / rate if rate else 0
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            delay = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+
+def fetch_order(order_id, limiter):
+    """The gateway's view of an order, or None if it couldn't be fetched."""
+    from .views import make_cashfree_request, get_correct_api_endpoint
+
+    limiter.wait()
+    api_endpoint, _ = get_correct_api_endpoint()
+    try:
+        response = make_cashfree_request(f'{api_endpoint}/{order_id}', method='GET')
+    except requests.exceptions.RequestException:
+        return None
+    if response.status_code != 200:
+        return None
+    try:
+        return response.json()
+    except ValueError:
+        # A 200 with an HTML error page or a truncated body; try again on the next run.
+        return None
+
+
+def reconcile_transactions(since_hours=None, max_workers=None, rate=None):
+    """
+    Ask the gateway about transactions still pending after since_hours, up to max_workers at a
+    time and at most rate calls per second, then write the settled ones with one bulk_update
+    and activate the paid orders.
+    """
+    from django.db import transaction as db_transaction
+    from .models import Transaction
+    from .utils import activate_order
+
+    started = time.monotonic()
+    since = timezone.now() - timedelta(hours=since_hours or settings.PAYMENT_RECONCILE_WINDOW_HOURS)
+    pending = list(Transaction.objects.filter(status__in=PENDING_STATUSES, timestamp__gte=since))
+
+    limiter = RateLimiter(rate or settings.PAYMENT_RECONCILE_RATE)
+    with ThreadPoolExecutor(max_workers=max_workers or settings.PAYMENT_RECONCILE_WORKERS) as pool:
+        results = list(pool.map(lambda trans: fetch_order(trans.razorpay_order_id, limiter), pending))
+
+    settled = {}
+    for trans, data in zip(pending, results):
+        status = GATEWAY_STATUS.get((data or {}).get('order_status'))
+        if status is not None:
+            settled[trans.id] = (trans, status, data)
+
+    updated = []
+    with db_transaction.atomic():
+        # Skip rows the payment response view settled while the gateway was being queried.
+        still_pending = (Transaction.objects.select_for_update(of=('self',))
+                         .filter(id__in=settled, status__in=PENDING_STATUSES))
+        for trans in still_pending.select_related('order'):
+            _, status, data = settled[trans.id]
+            trans.status = status
+            trans.payment_timestamp = timezone.now()
+            trans.payment_id = data.get('cf_order_id')
+            if status == 'paid':
+                trans.amount_paid = trans.amount
+                if trans.order is not None:
+                    # A savepoint per order, so one bad order doesn't hold back the rest.
+                    try:
+                        with db_transaction.atomic():
+                            activate_order(trans.order)
+                    except Exception as e:
+                        print(f'Could not activate order {trans.order_id}: ', str(e))
+                        continue
+            updated.append(trans)
+
+        Transaction.objects.bulk_update(updated, ['status', 'payment_timestamp', 'payment_id', 'amount_paid'])
+
+    last_run.clear()
+    last_run.update({
+        'finished_at': timezone.now(),
+        'checked': len(pending),
+        'unreachable': sum(1 for data in results if data is None),
+        'paid': sum(1 for trans in updated if trans.status == 'paid'),
+        'failed': sum(1 for trans in updated if trans.status == 'failed'),
+        'duration': round(time.monotonic() - started, 3),
+    })
+    print('Transaction reconciliation: ', last_run)
+    return dict(last_run)
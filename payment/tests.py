@@ -1,3 +1,327 @@
-from django.test import TestCase
+import json
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from unittest import mock
 
-# Create your tests here.
+import requests
+from django.conf import settings
+from django.db import connection, connections
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+
+from videos.models import Order
+
+from .gateway import GatewayClient, CircuitOpenError
+from .ids import BlockAllocator, new_id
+from .models import PaymentWebhookEvent, Transaction
+from .reconcile import reconcile_transactions
+from .webhooks import process_webhook_events
+
+# Small blocks, so the workers keep coming back to the Sequence row and contend for it.
+BLOCK_SIZE = 10
+
+
+def draw(allocator, count):
+    """Runs in a worker thread, which has its own DB connection to close."""
+    try:
+        return [allocator.next() for _ in range(count)]
+    finally:
+        connections.close_all()
+
+
+def draw_threads(threads, count):
+    allocator = BlockAllocator('test', BLOCK_SIZE)
+    with ThreadPoolExecutor(threads) as pool:
+        return [value for values in pool.map(lambda _: draw(allocator, count), range(threads)) for value in values]
+
+
+# Runs in a separate interpreter against the test database; Django is set up before this module loads.
+WORKER = """
+import json, sys
+import django
+from django.conf import settings
+
+db_name, threads, count = json.loads(sys.argv[1])
+settings.DATABASES['default']['NAME'] = db_name
+django.setup()
+from payment.tests import draw_threads
+print(json.dumps(draw_threads(threads, count)))
+"""
+
+
+class BlockAllocatorTests(TransactionTestCase):
+    """Parallel checkouts must never be handed the same order id."""
+
+    def test_threads(self):
+        values = draw_threads(8, 500)
+        self.assertEqual(len(values), 4000)
+        self.assertEqual(len(set(values)), len(values))
+
+    def test_processes(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest('Other processes cannot open an in-memory test database.')
+        args = json.dumps([str(connection.settings_dict['NAME']), 4, 250])
+        workers = [subprocess.Popen([sys.executable, '-c', WORKER, args], stdout=subprocess.PIPE,
+                                    cwd=settings.BASE_DIR) for _ in range(4)]
+        values = []
+        for worker in workers:
+            output = worker.communicate()[0]
+            self.assertEqual(worker.returncode, 0)
+            values += json.loads(output.splitlines()[-1])
+        # The parent's own allocator shares the sequence with the children.
+        allocator = BlockAllocator('test', BLOCK_SIZE)
+        values += [allocator.next() for _ in range(100)]
+        self.assertEqual(len(values), 4100)
+        self.assertEqual(len(set(values)), len(values))
+
+    def test_concurrent_checkouts(self):
+        from base64 import b64encode
+        from django.contrib.auth.models import AnonymousUser
+        from rest_framework.test import APIRequestFactory
+        from users.models import User
+        from .views import PaymentCheckoutView
+
+        order = Order.objects.create(user=User.objects.create(username='u', mobile_number='1'),
+                                     subscription_amount=99, subscription_period='30')
+        path_id = b64encode(f'123456{order.id}'.encode()).decode()
+        sent = []
+
+        def create_gateway_order(url, method='GET', **kwargs):
+            sent.append(kwargs['json']['order_id'])
+            response = mock.Mock(status_code=200)
+            response.json.return_value = {'payment_session_id': 'session', 'cf_order_id': 1, 'order_token': ''}
+            return response
+
+        # Each thread stands in for a worker process with its own block of the sequence.
+        workers = threading.local()
+
+        class WorkerAllocator:
+            def next(self):
+                if not hasattr(workers, 'allocator'):
+                    workers.allocator = BlockAllocator('payment', BLOCK_SIZE)
+                return workers.allocator.next()
+
+        def checkout(_):
+            try:
+                for _ in range(25):
+                    request = APIRequestFactory().get(f'/payment/checkout/{path_id}/')
+                    request.user = AnonymousUser()
+                    self.assertEqual(PaymentCheckoutView.as_view()(request, id=path_id).status_code, 200)
+            finally:
+                connections.close_all()
+
+        with mock.patch('payment.views.make_cashfree_request', side_effect=create_gateway_order), \
+                mock.patch('payment.ids.allocator', WorkerAllocator()):
+            with ThreadPoolExecutor(8) as pool:
+                list(pool.map(checkout, range(8)))
+
+        order_ids = list(Transaction.objects.values_list('razorpay_order_id', flat=True))
+        self.assertEqual(len(order_ids), 200)
+        self.assertEqual(len(set(order_ids)), 200)
+        self.assertEqual(sorted(sent), sorted(order_ids))
+
+    def test_ids_sort_by_time(self):
+        ids = [new_id('order') for _ in range(200)]
+        self.assertEqual(len(set(ids)), len(ids))
+        self.assertEqual(sorted(ids), ids)
+        self.assertTrue(all(len(value) == len(ids[0]) <= 45 for value in ids))
+
+
+class MockGatewayHandler(BaseHTTPRequestHandler):
+    """Answers 503 while server.failures is positive, then 200; /slow sleeps past the read timeout."""
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def respond(self):
+        server = self.server
+        with server.lock:
+            server.hits += 1
+            failing = server.failures > 0
+            if failing:
+                server.failures -= 1
+        if self.path == '/slow':
+            time.sleep(1)
+        body = json.dumps({'order_status': 'PAID'}).encode()
+        self.send_response(503 if failing else 200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self.respond()
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        self.respond()
+
+
+class GatewayClientTests(SimpleTestCase):
+    """GatewayClient against a local mock gateway."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), MockGatewayHandler)
+        cls.server.lock = threading.Lock()
+        cls.server.daemon_threads = True
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.url = f'http://127.0.0.1:{cls.server.server_port}'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.server.hits = 0
+        self.server.failures = 0
+        self.client = GatewayClient(connect_timeout=0.5, read_timeout=0.2, retries=2, backoff=0.01,
+                                    backoff_jitter=0.01, pool_size=2, failure_threshold=3, reset_timeout=0.2)
+
+    def test_get_retries_server_errors(self):
+        self.server.failures = 2
+        response = self.client.request('GET', self.url + '/orders/1')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.server.hits, 3)
+        self.assertIsNone(self.client.breaker.opened_at)
+
+    def test_post_is_not_retried(self):
+        self.server.failures = 1
+        response = self.client.request('POST', self.url + '/orders', json={})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(self.server.hits, 1)
+
+    def test_read_timeout(self):
+        with self.assertRaises(requests.exceptions.RequestException):
+            self.client.request('POST', self.url + '/slow', json={})
+        self.assertEqual(self.client.breaker.failures, 1)
+
+    def test_breaker_opens_and_closes_after_trial(self):
+        self.server.failures = 100
+        for _ in range(3):
+            self.assertEqual(self.client.request('POST', self.url + '/orders', json={}).status_code, 503)
+        hits = self.server.hits
+        with self.assertRaises(CircuitOpenError):
+            self.client.request('POST', self.url + '/orders', json={})
+        self.assertEqual(self.server.hits, hits)
+
+        # A failed trial opens the circuit again.
+        time.sleep(0.25)
+        self.assertEqual(self.client.request('POST', self.url + '/orders', json={}).status_code, 503)
+        with self.assertRaises(CircuitOpenError):
+            self.client.request('POST', self.url + '/orders', json={})
+
+        time.sleep(0.25)
+        self.server.failures = 0
+        self.assertEqual(self.client.request('POST', self.url + '/orders', json={}).status_code, 200)
+        self.assertIsNone(self.client.breaker.opened_at)
+
+    def test_trial_ending_in_other_error_allows_another(self):
+        self.server.failures = 100
+        for _ in range(3):
+            self.client.request('POST', self.url + '/orders', json={})
+        time.sleep(0.25)
+        with mock.patch.object(self.client.session, 'request', side_effect=ValueError):
+            with self.assertRaises(ValueError):
+                self.client.request('POST', self.url + '/orders', json={})
+        self.server.failures = 0
+        self.assertEqual(self.client.request('POST', self.url + '/orders', json={}).status_code, 200)
+        self.assertIsNone(self.client.breaker.opened_at)
+
+
+def make_transaction(order_id, status='created', order=None):
+    return Transaction.objects.create(razorpay_order_id=order_id, amount=99, amount_due=99, amount_paid=0,
+                                      created_at='0', currency='INR', entity='order', receipt=f'receipt_{order_id}',
+                                      note_1='', note_2='', status=status, order=order)
+
+
+class ReconcileTests(TestCase):
+
+    def reconcile(self, gateway_statuses):
+        def fetch_order(order_id, limiter):
+            return {'order_status': gateway_statuses[order_id], 'cf_order_id': f'cf_{order_id}'}
+
+        with mock.patch('payment.reconcile.fetch_order', side_effect=fetch_order):
+            return reconcile_transactions(max_workers=2, rate=1000)
+
+    def test_settles_created_and_attempted(self):
+        make_transaction('order_a')
+        make_transaction('order_b', status='attempted')
+        make_transaction('order_c')
+        make_transaction('order_d', status='failed')
+
+        metrics = self.reconcile({'order_a': 'PAID', 'order_b': 'PAID', 'order_c': 'ACTIVE'})
+        self.assertEqual(metrics['checked'], 3)
+        statuses = dict(Transaction.objects.values_list('razorpay_order_id', 'status'))
+        self.assertEqual(statuses, {'order_a': 'paid', 'order_b': 'paid', 'order_c': 'created', 'order_d': 'failed'})
+        self.assertEqual(Transaction.objects.get(razorpay_order_id='order_b').amount_paid, 99)
+
+    def test_settles_transaction_left_attempted_by_webhook(self):
+        make_transaction('order_a')
+        PaymentWebhookEvent.objects.create(event_id='e1', order_id='order_a', event_type='PAYMENT_USER_DROPPED_WEBHOOK',
+                                           payload={'data': {'payment': {'cf_payment_id': 1}}})
+        process_webhook_events()
+        self.assertEqual(Transaction.objects.get(razorpay_order_id='order_a').status, 'attempted')
+
+        self.reconcile({'order_a': 'PAID'})
+        self.assertEqual(Transaction.objects.get(razorpay_order_id='order_a').status, 'paid')
+
+
+class PaymentResponseTests(TestCase):
+
+    def setUp(self):
+        from users.models import User
+
+        user = User.objects.create(username='u', mobile_number='1')
+        self.order = Order.objects.create(user=user, subscription_amount=99, subscription_period='30')
+        self.transaction = make_transaction('order_a', order=self.order)
+
+    def respond(self, order_status):
+        from rest_framework.test import APIRequestFactory
+        from .views import PaymentResponseView
+
+        response = mock.Mock(status_code=200)
+        response.json.return_value = {'order_status': order_status, 'cf_order_id': 'cf_order_a'}
+        request = APIRequestFactory().get('/payment/response/', {'order_id': 'order_a'})
+        with mock.patch('payment.views.make_cashfree_request', return_value=response) as verify:
+            page = PaymentResponseView.as_view()(request)
+        self.transaction.refresh_from_db()
+        self.order.refresh_from_db()
+        return page, verify.call_count
+
+    def test_paid(self):
+        page, calls = self.respond('PAID')
+        self.assertIn(b'Payment Successful!', page.content)
+        self.assertEqual(calls, 1)
+        self.assertEqual((self.transaction.status, self.transaction.amount_paid), ('paid', 99))
+        self.assertEqual(self.transaction.payment_id, 'cf_order_a')
+        self.assertEqual((self.order.status, self.order.is_active), ('completed', True))
+
+    def test_repeated_callback_is_answered_from_the_database(self):
+        self.respond('PAID')
+        expiration_date = self.order.expiration_date
+        page, calls = self.respond('PAID')
+        self.assertIn(b'Payment Successful!', page.content)
+        self.assertEqual(calls, 0)
+        self.assertEqual(self.order.expiration_date, expiration_date)
+
+    def test_failed(self):
+        self.assertEqual(self.respond('EXPIRED')[1], 1)
+        self.assertEqual(self.transaction.status, 'failed')
+        self.assertEqual(self.respond('PAID')[1], 0)
+        self.assertEqual((self.transaction.status, self.order.status), ('failed', 'pending'))
+
+    def test_active_order_stays_pending(self):
+        page, calls = self.respond('ACTIVE')
+        self.assertIn(b'still being processed', page.content)
+        self.assertEqual((self.transaction.status, self.transaction.payment_timestamp), ('created', None))
+        # The next callback asks the gateway again and can settle it.
+        self.assertEqual(self.respond('PAID')[1], 1)
+        self.assertEqual(self.transaction.status, 'paid')
@@ -8,4 +8,5 @@ urlpatterns = [
     path('checkout/<id>/', PaymentCheckoutView.as_view(), name='checkout-test'),
 
     path('response/', PaymentResponseView.as_view(), name='response-test'),
+    path('webhook/', PaymentWebhookView.as_view(), name='webhook'),
 ]
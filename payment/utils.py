@@ -0,0 +1,14 @@
+from django.utils import timezone
+
+
+def activate_order(order):
+    """Start the subscription of a paid order from now."""
+    from videos.utils import get_expiry_date
+
+    new_start_date = timezone.now()
+    order.status = 'completed'
+    order.is_active = True
+    order.start_date = new_start_date
+    order.expiration_date = get_expiry_date(new_start_date, period=order.subscription_period)
+    order.save()
+    print(f"🎉 Subscription activated for order {order.id}")
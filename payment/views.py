@@ -1,21 +1,21 @@
 # ===== UPDATED VIEWS.PY (Laravel Style) =====
 import datetime
 import requests
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from django.http import JsonResponse
 from django.shortcuts import render, redirect
+from django.db import transaction as db_transaction
 from django.utils import timezone
 from datetime import timedelta
 import json
-import urllib3
 
+from .gateway import gateway
 from .models import Transaction
+from .reconcile import GATEWAY_STATUS
+from .utils import activate_order
 from videos.models import Order
 from django.conf import settings
-from videos.utils import get_expiry_date
 
 url_config = settings.PAYMENT_URL_CONFIG
 config = settings.PAYMENT_CONFIG
@@ -54,17 +54,14 @@ def make_cashfree_request(url, method='GET', **kwargs):
         'x-api-version': '2022-01-01'  # Using same version as Laravel example
     })
     kwargs['headers'] = headers
-    kwargs['timeout'] = kwargs.get('timeout', 30)
     kwargs['verify'] = True
     
     try:
         print(f"Making {method} request to: {url}")
         print(f"Using credentials: x-client-id={config['key_id']}")
         
-        if method.upper() == 'POST':
-            response = requests.post(url, **kwargs)
-        else:
-            response = requests.get(url, **kwargs)
+        # Pooled session with connect/read timeouts, GET retries and a circuit breaker
+        response = gateway.request(method.upper(), url, **kwargs)
             
         print(f"Response status: {response.status_code}")
         
@@ -108,7 +105,8 @@ class PaymentCheckoutBaseView(APIView):
             
             # Generate unique IDs (Laravel style)
             import random
-            unique_order_id = f'order_{random.randint(1111111111, 9999999999)}'
+            from .ids import new_id
+            unique_order_id = new_id('order')
             customer_id = f'customer_{random.randint(111111111, 999999999)}'
             
             print(f"🎫 Generated order ID: {unique_order_id}")
@@ -254,68 +252,66 @@ class PaymentResponseView(APIView):
         
         # Verify payment status with Cashfree API (like Laravel)
         try:
-            api_endpoint, credentials_type = get_correct_api_endpoint()
-            verify_url = f"{api_endpoint}/{order_id}"
-            
-            print(f"🔍 Verifying payment with Cashfree: {verify_url}")
-            
-            response = make_cashfree_request(verify_url, method='GET')
-            
-            if response.status_code == 200:
+            transaction = Transaction.objects.filter(razorpay_order_id=order_id).first()
+            if transaction is None:
+                print(f"❌ Transaction not found for order_id: {order_id}")
+                return render(request, 'error.html', {
+                    'err_msg': f'Invalid order ID: {order_id}'
+                })
+
+            # Refreshes and repeated callbacks are answered from the database.
+            if transaction.status in ('paid', 'failed'):
+                print(f"📋 Transaction {transaction.id} already {transaction.status}")
+                return self.render_result(request, transaction)
+
+            with db_transaction.atomic():
+                # Concurrent callbacks for the order wait here; only the first asks the gateway.
+                transaction = Transaction.objects.select_for_update(of=('self',)).select_related('order').get(
+                    id=transaction.id)
+                if transaction.status in ('paid', 'failed'):
+                    print(f"📋 Transaction {transaction.id} settled by a concurrent callback")
+                    return self.render_result(request, transaction)
+
+                api_endpoint, credentials_type = get_correct_api_endpoint()
+                verify_url = f"{api_endpoint}/{order_id}"
+
+                print(f"🔍 Verifying payment with Cashfree: {verify_url}")
+
+                response = make_cashfree_request(verify_url, method='GET')
+
+                if response.status_code != 200:
+                    print(f"❌ Payment verification failed: {response.status_code} - {response.text}")
+                    return render(request, 'error.html', {
+                        'err_msg': f'Payment verification failed: {response.text}'
+                    })
+
                 response_data = response.json()
                 print(f"✅ Cashfree verification response: {response_data}")
-                
+
                 # Update payment status in database (like Laravel)
-                try:
-                    transaction = Transaction.objects.get(razorpay_order_id=order_id)
-                    print(f"📋 Found transaction: {transaction.id}")
-                    
-                    # Check payment status
-                    order_status = response_data.get('order_status', 'UNKNOWN')
-                    is_paid = (order_status == 'PAID')
-                    
-                    transaction.status = 'paid' if is_paid else 'failed'
-                    transaction.payment_timestamp = timezone.now()
-                    transaction.payment_id = response_data.get('cf_order_id')
-                    
-                    if is_paid:
-                        transaction.amount_paid = transaction.amount
-                        
-                        # Activate subscription (like Laravel success)
-                        order = transaction.order
-                        new_start_date = timezone.now()
-                        order.status = 'completed'
-                        order.is_active = True
-                        order.start_date = new_start_date
-                        order.expiration_date = get_expiry_date(new_start_date, period=order.subscription_period)
-                        order.save()
-                        print(f"🎉 Subscription activated for order {order.id}")
-                    
-                    transaction.save()
-                    
-                    if is_paid:
-                        return render(request, 'success.html', {
-                            'order_id': order_id,
-                            'amount': transaction.amount,
-                            'payment_id': transaction.payment_id,
-                            'message': 'Payment Successful!'
-                        })
-                    else:
-                        return render(request, 'error.html', {
-                            'err_msg': f'Payment verification failed for Order ID: {order_id}'
-                        })
-                        
-                except Transaction.DoesNotExist:
-                    print(f"❌ Transaction not found for order_id: {order_id}")
-                    return render(request, 'error.html', {
-                        'err_msg': f'Invalid order ID: {order_id}'
-                    })
-            else:
-                print(f"❌ Payment verification failed: {response.status_code} - {response.text}")
-                return render(request, 'error.html', {
-                    'err_msg': f'Payment verification failed: {response.text}'
-                })
-                
+                print(f"📋 Found transaction: {transaction.id}")
+
+                # Check payment status; ACTIVE orders (UPI, delayed settlement) stay pending so a
+                # refresh, a webhook or the reconciler can still settle them.
+                status = GATEWAY_STATUS.get(response_data.get('order_status'))
+                if status is None:
+                    return self.render_result(request, transaction)
+                is_paid = (status == 'paid')
+
+                transaction.status = status
+                transaction.payment_timestamp = timezone.now()
+                transaction.payment_id = response_data.get('cf_order_id')
+
+                if is_paid:
+                    transaction.amount_paid = transaction.amount
+
+                    # Activate subscription (like Laravel success)
+                    activate_order(transaction.order)
+
+                transaction.save()
+
+            return self.render_result(request, transaction)
+
         except Exception as e:
             print(f"💥 Payment verification error: {e}")
             import traceback
@@ -323,11 +319,41 @@ class PaymentResponseView(APIView):
             return render(request, 'error.html', {
                 'err_msg': f'Payment verification failed: {str(e)}'
             })
+
+    def render_result(self, request, transaction):
+        if transaction.status == 'paid':
+            return render(request, 'success.html', {
+                'order_id': transaction.razorpay_order_id,
+                'amount': transaction.amount,
+                'payment_id': transaction.payment_id,
+                'message': 'Payment Successful!'
+            })
+        if transaction.status == 'failed':
+            return render(request, 'error.html', {
+                'err_msg': f'Payment verification failed for Order ID: {transaction.razorpay_order_id}'
+            })
+        return render(request, 'error.html', {
+            'err_msg': f'Payment for Order ID {transaction.razorpay_order_id} is still being processed'
+        })
     
     def post(self, request):
         """Handle POST response from Cashfree (if any)"""
         return self.get(request)  # Use same logic
 
+class PaymentWebhookView(APIView):
+    """Cashfree webhook: verify and queue the event, payment.webhooks applies it later"""
+    authentication_classes = []
+
+    def post(self, request):
+        from .webhooks import enqueue_event, InvalidWebhook
+
+        try:
+            created = enqueue_event(request.body, request.headers)
+        except InvalidWebhook as e:
+            print(f"❌ Rejected webhook: {e}")
+            return JsonResponse({'message': str(e)}, status=e.status)
+        return JsonResponse({'status': 'received' if created else 'duplicate'})
+
 class PaymentResponseTestView(APIView):
     def post(self, request):
         return JsonResponse({'response': request.POST.dict()})
@@ -0,0 +1,164 @@
+import base64
+import hashlib
+import hmac
+import json
+import time
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+# Cashfree event type -> status it moves a transaction to; other events are stored and ignored.
+# 'attempted' stays in reconcile.PENDING_STATUSES, so the reconciler still settles it.
+EVENT_STATUS = {
+    'PAYMENT_SUCCESS_WEBHOOK': 'paid',
+    'PAYMENT_FAILED_WEBHOOK': 'failed',
+    'PAYMENT_USER_DROPPED_WEBHOOK': 'attempted',
+}
+
+# Metrics of the most recent run in this process.
+last_run = {}
+
+
+class InvalidWebhook(ValueError):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def verify_signature(body, timestamp, signature, secret):
+    """Cashfree signs base64(HMAC-SHA256(timestamp + raw body)) with the client secret."""
+    digest = hmac.new(secret.encode(), timestamp.encode() + body, hashlib.sha256).digest()
+    return hmac.compare_digest(base64.b64encode(digest).decode(), signature)
+
+
+def get_event_id(headers, payload, body):
+    """The gateway's idempotency key, else the payment id and event type, else the body hash."""
+    if headers.get('x-idempotency-key'):
+        return headers['x-idempotency-key']
+    payment_id = ((payload.get('data') or {}).get('payment') or {}).get('cf_payment_id')
+    if payment_id is not None:
+        return f"{payload.get('type')}:{payment_id}"
+    return hashlib.sha256(body).hexdigest()
+
+
+def enqueue_event(body, headers):
+    """Verify a webhook and store it in the inbox. Returns False for a duplicate delivery."""
+    from .models import PaymentWebhookEvent
+
+    timestamp = headers.get('x-webhook-timestamp', '')
+    signature = headers.get('x-webhook-signature', '')
+    if not verify_signature(body, timestamp, signature, settings.PAYMENT_CONFIG['key_secret']):
+        raise InvalidWebhook('Invalid signature', status=401)
+    try:
+        # Cashfree sends milliseconds since the epoch.
+        age = time.time() - int(timestamp) / 1000
+        payload = json.loads(body)
+    except ValueError:
+        raise InvalidWebhook('Malformed webhook')
+    if abs(age) > settings.PAYMENT_WEBHOOK_TOLERANCE:
+        raise InvalidWebhook('Stale webhook', status=401)
+
+    order_id = ((payload.get('data') or {}).get('order') or {}).get('order_id') or ''
+    try:
+        with transaction.atomic():
+            PaymentWebhookEvent.objects.create(event_id=get_event_id(headers, payload, body), order_id=order_id,
+                                               event_type=payload.get('type', ''), payload=payload)
+    except IntegrityError:
+        # Cashfree redelivers until it gets a 2xx; the first copy is already queued.
+        return False
+    return True
+
+
+def apply_event(event, trans):
+    """Move trans to the event's status. Paid is final; failed/attempted only replace a pending status."""
+    from django.db import transaction as db_transaction
+    from .reconcile import PENDING_STATUSES
+    from .utils import activate_order
+
+    status = EVENT_STATUS.get(event.event_type)
+    if status is None or trans.status == 'paid':
+        return False
+    if status != 'paid' and trans.status not in PENDING_STATUSES:
+        return False
+
+    data = event.payload.get('data') or {}
+    if status == 'paid':
+        amount = float((data.get('order') or {}).get('order_amount', 0))
+        if abs(amount - trans.amount) > 0.005:
+            raise ValueError(f'Paid amount {amount} does not match {trans.amount}')
+        if trans.order is not None:
+            # A savepoint, so a bad order fails this event without aborting the batch.
+            with db_transaction.atomic():
+                activate_order(trans.order)
+        trans.amount_paid = trans.amount
+
+    trans.status = status
+    trans.payment_timestamp = timezone.now()
+    payment_id = (data.get('payment') or {}).get('cf_payment_id')
+    if payment_id is not None:
+        trans.payment_id = str(payment_id)
+    return True
+
+
+def process_webhook_events(batch_size=None, max_attempts=None):
+    """
+    Apply queued webhooks in batches until the inbox is drained: each batch locks its events and
+    their transactions, applies them in arrival order and writes both back with bulk_update.
+    Events that fail are retried on the next run and left with last_error after max_attempts.
+    """
+    from django.db import transaction as db_transaction
+    from .models import PaymentWebhookEvent, Transaction
+
+    started = time.monotonic()
+    batch_size = batch_size or settings.PAYMENT_WEBHOOK_BATCH_SIZE
+    max_attempts = max_attempts or settings.PAYMENT_WEBHOOK_MAX_ATTEMPTS
+
+    seen, applied, failed = 0, 0, 0
+    retry_ids = set()
+    while True:
+        with db_transaction.atomic():
+            # skip_locked lets several workers drain the inbox without applying an event twice.
+            events = list(PaymentWebhookEvent.objects.select_for_update(skip_locked=True)
+                          .filter(processed_at__isnull=True, attempts__lt=max_attempts)
+                          .exclude(id__in=retry_ids).order_by('id')[:batch_size])
+            if not events:
+                break
+
+            transactions = {trans.razorpay_order_id: trans for trans in
+                            Transaction.objects.select_for_update(of=('self',)).select_related('order')
+                            .filter(razorpay_order_id__in={event.order_id for event in events})}
+            changed = {}
+            now = timezone.now()
+            for event in events:
+                trans = transactions.get(event.order_id)
+                try:
+                    if trans is None:
+                        raise ValueError(f'Unknown order {event.order_id}')
+                    if apply_event(event, trans):
+                        changed[trans.id] = trans
+                        applied += 1
+                    event.processed_at = now
+                    event.last_error = ''
+                except Exception as e:
+                    event.attempts += 1
+                    event.last_error = str(e)
+                    retry_ids.add(event.id)
+                    failed += 1
+
+            Transaction.objects.bulk_update(changed.values(), ['status', 'payment_timestamp', 'payment_id',
+                                                               'amount_paid'])
+            PaymentWebhookEvent.objects.bulk_update(events, ['processed_at', 'attempts', 'last_error'])
+        seen += len(events)
+
+    last_run.clear()
+    last_run.update({
+        'finished_at': timezone.now(),
+        'events': seen,
+        'applied': applied,
+        'failed': failed,
+        'duration': round(time.monotonic() - started, 3),
+    })
+    if seen:
+        print('Webhook events: ', last_run)
+    return dict(last_run)
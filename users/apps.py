@@ -4,3 +4,12 @@ from django.apps import AppConfig
 class UsersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'users'
+
+    def ready(self):
+        from django.conf import settings
+        from . import signals  # noqa: F401
+        from .scheduler import register_periodic, WORKER
+        from .session_touch import touch_buffer
+
+        # Writes queued expiries from workers that stop receiving requests.
+        register_periodic('session-touch', settings.SESSION_TOUCH_FLUSH_INTERVAL, touch_buffer.flush, WORKER)
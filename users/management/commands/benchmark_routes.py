@@ -0,0 +1,72 @@
+import time
+
+from django.core.management import BaseCommand, CommandError
+from django.urls import resolve, Resolver404
+
+# A mix of app, admin panel, payment and unknown paths.
+DEFAULT_PATHS = (
+    '/api/videos/app-video-list/',
+    '/api/videos/video-upload/0b5e5a58-3f4f-4a3b-9d7e-1f2c3d4e5f60/',
+    '/api/users/app/status/',
+    '/api/users/app/login/',
+    '/api/users/server-status/',
+    '/lvadmin/videos/order/12/change/',
+    '/payment/webhook/',
+    '/no/such/path/',
+)
+
+
+def resolve_and_scan(url_path, excluded_paths, admin_paths):
+    """The middleware's routing before RouteClassifier: resolve() and then the prefix scans."""
+    from users.routes import PUBLIC, AUTHENTICATED, ADMIN, UNKNOWN
+
+    try:
+        resolve(url_path)
+    except Resolver404:
+        return UNKNOWN
+    skips_status = url_path.startswith('/lvadmin') or url_path in admin_paths
+    if not any(url_path.startswith(prefix) for prefix in excluded_paths):
+        return AUTHENTICATED
+    return ADMIN if skips_status else PUBLIC
+
+
+class Command(BaseCommand):
+    help = 'Time the middleware route classification against resolve() plus the excluded path scan.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='*', default=DEFAULT_PATHS)
+        parser.add_argument('--iterations', type=int, default=20000, help='Calls timed per path and method.')
+
+    def handle(self, *args, **kwargs):
+        from users.middleware import CustomMiddleWare
+        from users.routes import RouteClassifier
+
+        middleware = CustomMiddleWare(None)
+        excluded_paths, admin_paths = middleware.excluded_paths, middleware.admin_paths
+        routes = RouteClassifier(excluded_paths, admin_paths)
+        iterations = kwargs['iterations']
+
+        before = after = 0
+        for path in kwargs['paths']:
+            expected = resolve_and_scan(path, excluded_paths, admin_paths)
+            route_class = routes.classify(path)
+            if route_class != expected:
+                raise CommandError(f'{path}: classified as {route_class}, expected {expected}')
+
+            started = time.perf_counter()
+            for _ in range(iterations):
+                resolve_and_scan(path, excluded_paths, admin_paths)
+            old = (time.perf_counter() - started) / iterations * 1e6
+
+            started = time.perf_counter()
+            for _ in range(iterations):
+                routes.classify(path)
+            new = (time.perf_counter() - started) / iterations * 1e6
+
+            before += old
+            after += new
+            self.stdout.write(f'{path:<40} {route_class:<14} {old:7.2f}us -> {new:6.2f}us')
+
+        count = len(kwargs['paths'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Average per request: {before / count:.2f}us -> {after / count:.2f}us'))
@@ -0,0 +1,22 @@
+import time
+
+from django.core.management import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Delete expired sessions and session revocations in primary key batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--pause', type=float, default=0.1, help='Seconds to sleep between batches.')
+
+    def handle(self, *args, **kwargs):
+        from users.models import CustomSession
+
+        started = time.monotonic()
+        sessions, revocations = CustomSession.delete_expired_sessions(
+            batch_size=kwargs['batch_size'], pause=kwargs['pause'])
+        elapsed = time.monotonic() - started
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Deleted {sessions} sessions and {revocations} revocations in {elapsed:.2f}s'))
@@ -0,0 +1,16 @@
+import threading
+
+from django.core.management import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = 'Run the database-wide periodic jobs whose *_INTERVAL setting is set, until stopped.'
+
+    def handle(self, *args, **kwargs):
+        from users.scheduler import start_role, BACKGROUND
+
+        started = start_role(BACKGROUND)
+        if not started:
+            raise CommandError('No periodic job has an interval set.')
+        self.stdout.write(self.style.SUCCESS(f'Running {", ".join(started)}'))
+        threading.Event().wait()
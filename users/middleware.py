@@ -1,7 +1,9 @@
-from users.utils import jwt_decode
+import jwt
+from users.utils import jwt_decode_claims
 from users.models import CustomSession, Project
 from django.http import JsonResponse
-from django.urls import resolve
+from django.urls import Resolver404
+from users.routes import RouteClassifier, ADMIN, PUBLIC, UNKNOWN
 
 
 class CustomMiddleWare:
@@ -11,6 +13,7 @@ class CustomMiddleWare:
                                '/lvadmin/',
                                '/api/users/setproject/',
                                '/api/users/setadmin/',
+                               '/api/users/server-status/',
                                '/api/users/app/registration/',
                                '/api/users/otp-send/',
                                '/api/users/delete-otp-verify/',
@@ -26,42 +29,63 @@ class CustomMiddleWare:
         self.admin_paths = [
             '/api/users/setproject/',
             '/api/users/setadmin/',
+            '/api/users/server-status/',
+            # Gateway callbacks must land even while the server is switched off.
+            '/payment/webhook/',
         ]
+        self.routes = None
 
     def check_server_status(self):
         try:
-            Project.objects.get(field1=True)
+            enabled = Project.get_server_status()['enabled']
         except:
             raise Exception('Server Error')
+        if not enabled:
+            raise Exception('Server Error')
 
     def __call__(self, request, *args, **kwargs):
 
-        # To raise not found exception
+        # Built on the first request, once the urlconf is importable.
+        if self.routes is None:
+            self.routes = RouteClassifier(self.excluded_paths, self.admin_paths)
+
         url_path = request.path
-        resolve(url_path)
+        route_class = self.routes.classify(url_path)
+
+        # To raise not found exception
+        if route_class == UNKNOWN:
+            raise Resolver404({'path': url_path})
         # --------------------------- #
 
         # print('Path: ', url_path)
-        if not url_path.startswith('/lvadmin'):
-            if url_path not in self.admin_paths:
-                self.check_server_status()
+        if route_class != ADMIN:
+            self.check_server_status()
 
-        if not self.is_excluded_path(url_path):
+        if route_class not in (ADMIN, PUBLIC):
 
             x_auth = request.META.get('HTTP_XAUTH')
             # print('authtoken: ', x_auth)
             if x_auth is None:
                 return JsonResponse({'logged_in': False, 'message': 'No token found'}, status=401)
 
-            decoded_token = jwt_decode(x_auth)
+            try:
+                claims = jwt_decode_claims(x_auth)
+            except jwt.InvalidTokenError:
+                return JsonResponse({'logged_in': False, 'message': 'Session expired or invalid token'}, status=401)
+
+            decoded_token = claims['token']
             # print('decoded jwt: ', decoded_token)
-            user = CustomSession.get_session(decoded_token)
+            if 'uid' in claims:
+                user = CustomSession.get_stateless_session(claims)
+            else:
+                user = CustomSession.get_session(decoded_token)
             # print('User sessoin: ', user)
             if user is False:
                 request.is_authenticated = False
                 return JsonResponse({'logged_in': False, 'message': 'Session expired or invalid token'}, status=401)
             else:
                 setattr(request, 'customtoken', decoded_token)
+                setattr(request, 'customclaims', claims)
                 setattr(request, 'customuser', user)
                 setattr(request, 'is_authenticated', True)
                 # print('user: ', user)
@@ -71,9 +95,3 @@ class CustomMiddleWare:
         # response.data['status'] = 500
         # print('response: ', response.data)
         return response
-
-    def is_excluded_path(self, url_path):
-        for i in self.excluded_paths:
-            if url_path.startswith(i):
-                # print('---- Excluded ----')
-                return True
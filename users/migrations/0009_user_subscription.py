@@ -0,0 +1,53 @@
+# Generated by Django 5.0 on 2026-10-18 08:32
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def backfill_subscriptions(apps, schema_editor):
+    Order = apps.get_model('videos', 'Order')
+    User = apps.get_model('users', 'User')
+
+    now_date = timezone.now()
+    valid_orders = Order.objects.filter(status='completed', is_active=True, user__isnull=False,
+                                        start_date__isnull=False, expiration_date__gt=now_date)
+    by_user = {}
+    for order in valid_orders.order_by('start_date', 'id'):
+        by_user.setdefault(order.user_id, []).append(order)
+
+    for user_id, orders in by_user.items():
+        curr_order = next((o for o in orders if o.start_date <= now_date), orders[0])
+        queued = [o for o in orders if o.start_date >= curr_order.expiration_date]
+        User.objects.filter(id=user_id).update(
+            subscription_order=curr_order,
+            subscription_expires_at=curr_order.expiration_date,
+            subscription_next_start=queued[0].start_date if queued else None,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0008_project_version'),
+        ('videos', '0002_order_mobile_number_alter_order_user'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='subscription_expires_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='subscription_next_start',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='subscription_order',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='videos.order'),
+        ),
+        migrations.RunPython(backfill_subscriptions, migrations.RunPython.noop),
+    ]
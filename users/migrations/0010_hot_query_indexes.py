@@ -0,0 +1,23 @@
+# Generated by Django 5.0 on 2026-10-18 08:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('users', '0009_user_subscription'),
+        ('videos', '0003_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='customsession',
+            index=models.Index(fields=['expire_date'], name='session_expire_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['subscription_expires_at'], name='user_subscription_expiry_idx'),
+        ),
+    ]
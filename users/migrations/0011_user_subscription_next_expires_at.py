@@ -0,0 +1,18 @@
+# Generated by Django 5.0 on 2026-10-18 09:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0010_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='subscription_next_expires_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
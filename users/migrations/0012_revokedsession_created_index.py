@@ -0,0 +1,17 @@
+# Generated by Django 5.0 on 2026-10-18 09:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0011_user_subscription_next_expires_at'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='revokedsession',
+            index=models.Index(fields=['created_at'], name='revoked_session_created_idx'),
+        ),
+    ]
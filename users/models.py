@@ -3,8 +3,21 @@ from django.contrib.auth.models import AbstractUser
 from cryptography.fernet import Fernet
 from django.conf import settings
 from django.utils import timezone
-from datetime import timedelta
-from .utils import str_to_json
+from datetime import timedelta, datetime, timezone as dt_timezone
+from copy import copy
+from uuid import uuid4
+from .cache import LocalCache
+from .revocation import session_revocations
+from .session_touch import touch_buffer
+from .utils import str_to_json, jwt_encode, delete_in_batches
+
+
+# token -> {'user_id', 'user', 'expire_date'}
+session_cache = LocalCache(timeout=settings.SESSION_CACHE_TIMEOUT, max_size=settings.SESSION_CACHE_MAX_SIZE)
+# 'status' -> trusted without a query until it times out; 'last' -> kept to compare versions with
+server_status_cache = LocalCache(timeout=settings.SERVER_STATUS_CACHE_TIMEOUT, max_size=2)
+# user_id -> entitlement fields last read by check_subscription
+subscription_checks = LocalCache(timeout=settings.SUBSCRIPTION_RECHECK_INTERVAL, max_size=settings.SESSION_CACHE_MAX_SIZE)
 
 
 class User(AbstractUser):
@@ -19,23 +32,68 @@ class User(AbstractUser):
     is_admin = models.BooleanField(default=False)
     image = models.ImageField(upload_to='user_image/', blank=True, null=True)
 
+    # Entitlement, maintained by videos.utils.sync_subscription whenever an order changes.
+    subscription_order = models.ForeignKey('videos.Order', on_delete=models.SET_NULL, null=True, blank=True,
+                                           related_name='+')
+    subscription_expires_at = models.DateTimeField(blank=True, null=True)
+    subscription_next_start = models.DateTimeField(blank=True, null=True)
+    # End of the run of back-to-back queued orders that starts at subscription_next_start.
+    subscription_next_expires_at = models.DateTimeField(blank=True, null=True)
+    SUBSCRIPTION_FIELDS = ('subscription_order_id', 'subscription_expires_at', 'subscription_next_start',
+                           'subscription_next_expires_at')
+
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # Order sweeper: subscription_expires_at <= now
+            models.Index(fields=['subscription_expires_at'], name='user_subscription_expiry_idx'),
+        ]
+
     def has_subscription(self):
-        from videos.utils import subscription_exists
-        return subscription_exists(self)
+        now = timezone.now()
+        if self.subscription_expires_at is not None and self.subscription_expires_at > now:
+            return True
+        # A queued order takes over once the current one ends, whether or not the order sweeper
+        # has promoted it yet.
+        return (self.subscription_next_start is not None and self.subscription_next_start <= now
+                and self.subscription_next_expires_at is not None and self.subscription_next_expires_at > now)
+
+    def check_subscription(self):
+        """
+        has_subscription() for a user that may come from the session cache of this worker. The
+        cached user may predate a purchase completed on another worker, so a user without a
+        subscription is re-read, at most once every SUBSCRIPTION_RECHECK_INTERVAL seconds.
+        """
+        if self.has_subscription():
+            return True
+        fields = subscription_checks.get(self.id)
+        if fields is None:
+            self.refresh_subscription()
+            fields = {field: getattr(self, field) for field in self.SUBSCRIPTION_FIELDS}
+            subscription_checks.set(self.id, fields)
+        else:
+            for field, value in fields.items():
+                setattr(self, field, value)
+        return self.has_subscription()
+
+    def refresh_subscription(self):
+        """Reload the entitlement fields, e.g. when this instance came from the session cache."""
+        self.refresh_from_db(fields=self.SUBSCRIPTION_FIELDS)
 
     def get_active_subscription(self):
         from videos.utils import get_order
         from videos.models import Order
-        from django.core.exceptions import MultipleObjectsReturned
+        now = timezone.now()
         try:
-            order = Order.objects.get(user=self, status='completed', is_active=True, expiration_date__gt=timezone.now())
-            order = get_order(order)
+            order = Order.objects.get(id=self.subscription_order_id, expiration_date__gt=now)
         except Order.DoesNotExist:
-            order = {}
-        except Order.MultipleObjectsReturned:
-            raise MultipleObjectsReturned
+            # A queued order that took over before the order sweeper promoted it.
+            order = Order.objects.filter(user_id=self.id, status='completed', is_active=True, start_date__lte=now,
+                                         expiration_date__gt=now).order_by('start_date', 'id').first()
+            if order is None:
+                return {}
 
-        return order
+        order.user = self
+        return get_order(order)
 
 
 class CustomSession(models.Model):
@@ -44,6 +102,11 @@ class CustomSession(models.Model):
     expire_date = models.DateTimeField()
     inactive_count = models.IntegerField()
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['expire_date'], name='session_expire_date_idx'),
+        ]
+
     @classmethod
     def generate_session_key(cls):
         key = Fernet.generate_key()
@@ -70,8 +133,52 @@ class CustomSession(models.Model):
         cls(session_key=key, session_data=session_data, expire_date=expiry, inactive_count=expiry_sec).save()
         return key
 
+    @classmethod
+    def issue_token(cls, user, session_type='web', keep_me_logged_in=None):
+        """Create a session for the user and return the JWT handed to the client."""
+        if session_type not in settings.SESSION_STATELESS_TYPES:
+            return jwt_encode(cls.set_session(user, session_type, keep_me_logged_in))
+
+        expiry = timezone.now() + timedelta(seconds=cls.get_expiry(keep_me_logged_in))
+        return jwt_encode(uuid4().hex, {'uid': user.id, 'typ': session_type, 'exp': expiry})
+
+    @classmethod
+    def get_stateless_session(cls, claims):
+        """Resolve a self-contained token; its signature and expiry are already verified."""
+        token = claims['token']
+        if session_revocations.is_revoked(token, claims['uid']):
+            session_cache.delete(token)
+            return False
+
+        if settings.SESSION_CACHE_ENABLED:
+            cached = session_cache.get(token)
+            if cached is not None:
+                return copy(cached['user'])
+
+        try:
+            user = User.objects.get(id=claims['uid'])
+        except User.DoesNotExist:
+            return False
+
+        if settings.SESSION_CACHE_ENABLED:
+            expire_date = datetime.fromtimestamp(claims['exp'], tz=dt_timezone.utc)
+            session_cache.set(token, {'user_id': user.id, 'user': copy(user), 'expire_date': expire_date,
+                                      'inactive_count': None})
+        return user
+
     @classmethod
     def get_session(cls, token):
+        if settings.SESSION_CACHE_ENABLED:
+            cached = session_cache.get(token)
+            if cached is not None:
+                # A logout handled by another worker only reaches this cache through the revocation set.
+                if cached['expire_date'] < timezone.now() or session_revocations.is_revoked(token, cached['user_id']):
+                    session_cache.delete(token)
+                    return False
+                cached['expire_date'] = cls.touch_session(token, cached['expire_date'], cached['inactive_count'])
+                # Each request gets its own copy so views can't leak state into the cache.
+                return copy(cached['user'])
+
         try:
             obj = cls.objects.get(session_key=token)
 
@@ -86,11 +193,14 @@ class CustomSession(models.Model):
 
             user = User.objects.get(id=data['user_id'])
 
-            obj.expire_date = timezone.now() + timedelta(seconds=obj.inactive_count)
-            obj.save()
+            obj.expire_date = cls.touch_session(token, obj.expire_date, obj.inactive_count)
 
             print('Current Exp date: ', obj.expire_date)
 
+            if settings.SESSION_CACHE_ENABLED:
+                session_cache.set(token, {'user_id': user.id, 'user': copy(user), 'expire_date': obj.expire_date,
+                                          'inactive_count': obj.inactive_count})
+
             return user
         except User.DoesNotExist:
             print('No user exists. or invalid token...')
@@ -99,16 +209,76 @@ class CustomSession(models.Model):
         return False
 
     @classmethod
-    def delete_session(cls, token):
+    def touch_session(cls, token, expire_date, inactive_count):
+        """
+        Slide the session expiry and return the expiry that is (or will be) stored.
+
+        With SESSION_TOUCH_COALESCE the new expiry is only queued once it is more than
+        SESSION_TOUCH_TOLERANCE of the session age ahead of the stored one, and the queue
+        is written in bulk by touch_buffer.
+        """
+        new_expire_date = timezone.now() + timedelta(seconds=inactive_count)
+
+        if settings.SESSION_TOUCH_COALESCE:
+            tolerance = timedelta(seconds=inactive_count * settings.SESSION_TOUCH_TOLERANCE)
+            if new_expire_date - expire_date <= tolerance:
+                return expire_date
+            touch_buffer.add(token, new_expire_date)
+        else:
+            cls.objects.filter(session_key=token).update(expire_date=new_expire_date)
+        return new_expire_date
+
+    @classmethod
+    def delete_session(cls, token, claims=None):
+        cached = session_cache.get(token)
+        session_cache.delete(token)
+        touch_buffer.discard(token)
+        key = RevokedSession.session_key_for(token)
+        if claims is not None and 'uid' in claims:
+            # Stateless tokens stay valid until they expire unless revoked, whatever the settings now say.
+            RevokedSession.revoke(key, datetime.fromtimestamp(claims['exp'], tz=dt_timezone.utc))
+        elif cached is not None and cached['inactive_count'] is None:
+            RevokedSession.revoke(key, cached['expire_date'])
+        elif settings.SESSION_CACHE_ENABLED:
+            # Other workers may have the session cached; the revocation only has to outlive their entries.
+            RevokedSession.revoke(key, timezone.now() + timedelta(seconds=settings.SESSION_CACHE_TIMEOUT))
         try:
             cls.objects.get(session_key=token).delete()
         except:
             pass
 
     @classmethod
-    def delete_expired_sessions(cls):
+    def invalidate_user(cls, user_id):
+        """Drop every cached session resolved for the given user."""
+        subscription_checks.delete(user_id)
+        return session_cache.delete_where(lambda key, value: value['user_id'] == user_id)
+
+    @classmethod
+    def invalidate_users(cls, user_ids):
+        """invalidate_user for many users in one pass over the cache."""
+        user_ids = set(user_ids)
+        for user_id in user_ids:
+            subscription_checks.delete(user_id)
+        return session_cache.delete_where(lambda key, value: value['user_id'] in user_ids)
+
+    @classmethod
+    def revoke_user(cls, user_id):
+        """Log the user out everywhere, including stateless tokens held by other workers."""
+        cls.invalidate_user(user_id)
+        # Unconditional: stateless tokens issued before SESSION_STATELESS_TYPES changed may still be live.
+        RevokedSession.revoke(RevokedSession.user_key_for(user_id))
+
+    @classmethod
+    def delete_expired_sessions(cls, batch_size=1000, pause=0):
+        """
+        Delete sessions and revocations that expired over a day ago, batch_size primary keys
+        at a time, sleeping pause seconds between batches. Returns (sessions, revocations).
+        """
         today = timezone.now() - timedelta(days=1)
-        cls.objects.filter(expire_date__lte=today).delete()
+        return (
+            delete_in_batches(cls.objects.filter(expire_date__lte=today), batch_size, pause),
+            delete_in_batches(RevokedSession.objects.filter(expire_date__lte=today), batch_size, pause),
+        )
 
     @classmethod
     def get_expiry(cls, keep_me_logged_in=None):
@@ -129,9 +299,72 @@ class CustomSession(models.Model):
             return True
 
 
+class RevokedSession(models.Model):
+    key = models.CharField(max_length=200, db_index=True)
+    expire_date = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # RevocationSet.sync: created_at >= last sync - overlap
+            models.Index(fields=['created_at'], name='revoked_session_created_idx'),
+        ]
+
+    @staticmethod
+    def session_key_for(token):
+        return f'session:{token}'
+
+    @staticmethod
+    def user_key_for(user_id):
+        return f'user:{user_id}'
+
+    @classmethod
+    def revoke(cls, key, expire_date=None):
+        if expire_date is None:
+            max_age = max(settings.ADMIN_SESSION_AGE, settings.USER_SESSION_AGE, settings.USER_KEEP_SESSION_AGE)
+            expire_date = timezone.now() + timedelta(seconds=max_age)
+        cls.objects.create(key=key, expire_date=expire_date)
+        session_revocations.add(key, expire_date)
+
+
 class Project(models.Model):
     field1 = models.BooleanField(default=False)
     field2 = models.BooleanField(default=False)
+    version = models.PositiveIntegerField(default=0)
+
+    @classmethod
+    def get_server_status(cls):
+        """
+        Return the cached server flag. Each worker trusts its copy for SERVER_STATUS_CACHE_TIMEOUT
+        seconds, then compares the version bumped by set_server_status and re-reads the rows only
+        when it moved.
+        """
+        status = server_status_cache.get('status')
+        if status is not None:
+            return status
+
+        from django.db.models import Max
+        last = server_status_cache.get('last')
+        version = cls.objects.aggregate(version=Max('version'))['version'] or 0
+        if last is not None and last['version'] == version:
+            status = dict(last, checked_at=timezone.now())
+        else:
+            rows = list(cls.objects.values_list('field1', 'version'))
+            status = {
+                # Same rule as Project.objects.get(field1=True): exactly one enabled row.
+                'enabled': sum(1 for field1, _ in rows if field1) == 1,
+                'version': max((version for _, version in rows), default=0),
+                'checked_at': timezone.now(),
+            }
+            server_status_cache.set('last', status, timeout=float('inf'))
+        server_status_cache.set('status', status)
+        return status
+
+    @classmethod
+    def set_server_status(cls, enabled):
+        from django.db.models import F
+        cls.objects.all().update(field1=enabled, version=F('version') + 1)
+        server_status_cache.clear()
 
 
 class DeletedUser(models.Model):
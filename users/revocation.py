@@ -0,0 +1,117 @@
+import hashlib
+import math
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+
+class BloomFilter:
+    def __init__(self, capacity, error_rate):
+        self.size = max(8, int(math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2))))
+        self.hash_count = max(1, int(round(self.size / capacity * math.log(2))))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hash_count))
+
+    def add(self, key):
+        for pos in self._positions(key):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, key):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+
+class RevocationSet:
+    """
+    Per-process view of RevokedSession rows used to reject stateless session tokens.
+
+    Keys are held in Bloom filters bucketed by the expiry of the revoked token, so whole
+    buckets are dropped once every token they cover has expired. Revocations that end within
+    short_seconds (logouts that only have to outlive the session cache) are kept in an exact
+    dict instead, so they don't fill the filters. At most once every SESSION_REVOCATION_SYNC_INTERVAL
+    seconds the rows created since the last sync, less sync_overlap seconds, are loaded; the
+    overlap picks up rows whose transaction committed after a later row was already read.
+    A filter hit is confirmed against the table, so false positives never log anyone out.
+    """
+
+    def __init__(self, bucket_seconds, capacity, error_rate, sync_interval, sync_overlap, short_seconds):
+        self.bucket_seconds = bucket_seconds
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.sync_interval = sync_interval
+        self.sync_overlap = sync_overlap
+        self.short_seconds = short_seconds
+        self._buckets = {}
+        # key -> expire_date, for revocations ending within short_seconds
+        self._short = {}
+        self._synced_until = None
+        self._last_sync = None
+        self._lock = threading.Lock()
+
+    def _add(self, key, expire_date, now):
+        if expire_date - now <= timedelta(seconds=self.short_seconds):
+            self._short[key] = max(expire_date, self._short.get(key, expire_date))
+            return
+        bucket = int(expire_date.timestamp() // self.bucket_seconds)
+        if bucket not in self._buckets:
+            self._buckets[bucket] = BloomFilter(self.capacity, self.error_rate)
+        self._buckets[bucket].add(key)
+
+    def _prune(self, now):
+        current = int(now.timestamp() // self.bucket_seconds)
+        for bucket in [b for b in self._buckets if b < current]:
+            del self._buckets[bucket]
+        for key in [k for k, expire_date in self._short.items() if expire_date <= now]:
+            del self._short[key]
+
+    def sync(self, force=False):
+        from .models import RevokedSession
+
+        with self._lock:
+            if not force and self._last_sync is not None and time.monotonic() - self._last_sync < self.sync_interval:
+                return
+            self._last_sync = time.monotonic()
+
+            now = timezone.now()
+            rows = RevokedSession.objects.filter(expire_date__gt=now)
+            if self._synced_until is not None:
+                rows = rows.filter(created_at__gte=self._synced_until - timedelta(seconds=self.sync_overlap))
+            for key, expire_date in rows.values_list('key', 'expire_date').iterator():
+                self._add(key, expire_date, now)
+            self._synced_until = now
+            self._prune(now)
+
+    def add(self, key, expire_date):
+        with self._lock:
+            self._add(key, expire_date, timezone.now())
+
+    def is_revoked(self, token, user_id):
+        from .models import RevokedSession
+
+        self.sync()
+        keys = [RevokedSession.session_key_for(token), RevokedSession.user_key_for(user_id)]
+        now = timezone.now()
+        with self._lock:
+            if any(self._short.get(key, now) > now for key in keys):
+                return True
+            candidates = [key for key in keys if any(key in f for f in self._buckets.values())]
+        if not candidates:
+            return False
+        return RevokedSession.objects.filter(key__in=candidates, expire_date__gt=now).exists()
+
+
+session_revocations = RevocationSet(
+    bucket_seconds=settings.SESSION_REVOCATION_BUCKET_SECONDS,
+    capacity=settings.SESSION_REVOCATION_CAPACITY,
+    error_rate=settings.SESSION_REVOCATION_ERROR_RATE,
+    sync_interval=settings.SESSION_REVOCATION_SYNC_INTERVAL,
+    sync_overlap=settings.SESSION_REVOCATION_SYNC_OVERLAP,
+    short_seconds=settings.SESSION_REVOCATION_SHORT_SECONDS,
+)
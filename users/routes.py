@@ -0,0 +1,96 @@
+import re
+
+from django.urls import get_resolver, URLResolver
+
+PUBLIC = 'public'
+AUTHENTICATED = 'authenticated'
+ADMIN = 'admin'
+UNKNOWN = 'unknown'
+
+# Leading part of a route regex that matches literally; re.escape() turns '-' into '\-'.
+LITERAL_RE = re.compile(r'(?:[^()\[\]{}.*+?|\\^$]|\\[^\w\s])*')
+NAMED_GROUP_RE = re.compile(r'\(\?P<\w+>')
+ESCAPE_RE = re.compile(r'\\(.)')
+
+
+def classify_path(starts_with, is_admin_path, excluded_paths):
+    """
+    The middleware's path rules, shared by the precompiled table and the per-request fallback.
+    starts_with(prefix) and is_admin_path() may return None when the answer can't be known yet.
+    """
+    skips_status = starts_with('/lvadmin')
+    if skips_status is not True:
+        admin_path = is_admin_path()
+        skips_status = None if None in (skips_status, admin_path) else admin_path
+
+    excluded = False
+    for prefix in excluded_paths:
+        starts = starts_with(prefix)
+        if starts is None:
+            excluded = None
+        elif starts:
+            excluded = True
+            break
+
+    if skips_status is None or excluded is None:
+        return None
+    if not excluded:
+        # Token-protected paths always get the server check as well, which is the safe side.
+        return AUTHENTICATED
+    return ADMIN if skips_status else PUBLIC
+
+
+class RouteClassifier:
+    """
+    Maps a request path to PUBLIC, AUTHENTICATED, ADMIN or UNKNOWN with one precompiled regex
+    built from the urlconf, instead of resolving the URL in the middleware and scanning the
+    excluded paths. Routes whose class depends on more than their literal prefix are classified
+    per request with the same rules.
+    """
+
+    def __init__(self, excluded_paths, admin_paths, urlconf=None):
+        self.excluded_paths = tuple(excluded_paths)
+        self.admin_paths = frozenset(admin_paths)
+
+        groups = []
+        self._classes = []
+        for index, regex in enumerate(self._walk(get_resolver(urlconf).url_patterns, '')):
+            groups.append(f'(?P<r{index}>{NAMED_GROUP_RE.sub("(?:", regex)})')
+            self._classes.append(self._classify_route(regex))
+        self._regex = re.compile('/(?:' + '|'.join(groups) + ')') if groups else None
+
+    def _walk(self, patterns, prefix):
+        for pattern in patterns:
+            regex = prefix + pattern.pattern.regex.pattern.lstrip('^')
+            if isinstance(pattern, URLResolver):
+                yield from self._walk(pattern.url_patterns, regex)
+            else:
+                yield regex
+
+    def _classify_route(self, regex):
+        literal = LITERAL_RE.match(regex).group()
+        exact = regex[len(literal):] in ('\\Z', '$')
+        path = '/' + ESCAPE_RE.sub(r'\1', literal)
+
+        def starts_with(prefix):
+            if len(prefix) <= len(path) or exact:
+                return path.startswith(prefix)
+            return None if prefix.startswith(path) else False
+
+        def is_admin_path():
+            if exact:
+                return path in self.admin_paths
+            return None if any(p.startswith(path) for p in self.admin_paths) else False
+
+        return classify_path(starts_with, is_admin_path, self.excluded_paths)
+
+    def classify(self, url_path):
+        match = self._regex.fullmatch(url_path) if self._regex else None
+        if match is None:
+            return UNKNOWN
+
+        route_class = self._classes[int(match.lastgroup[1:])]
+        if route_class is None:
+            route_class = classify_path(url_path.startswith, lambda: url_path in self.admin_paths,
+                                        self.excluded_paths)
+        return route_class
@@ -0,0 +1,63 @@
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Flushes of buffers held in each web worker's memory; started by the gunicorn hook in gunicorn.conf.py.
+WORKER = 'worker'
+# Database-wide jobs that need a single process; started by manage.py run_periodic_tasks.
+BACKGROUND = 'background'
+
+_registry = {}
+_tasks = {}
+_lock = threading.Lock()
+
+
+def register_periodic(name, interval, func, role):
+    """
+    Declare a task to run every interval seconds in processes started for role. Registering
+    starts nothing, so management commands, migrations and the test runner run no threads.
+    """
+    with _lock:
+        _registry[name] = (interval, func, role)
+
+
+def start_role(role):
+    """Start the registered tasks of role that have an interval set. Returns their names."""
+    with _lock:
+        tasks = [(name, interval, func) for name, (interval, func, task_role) in _registry.items()
+                 if task_role == role and interval]
+    for name, interval, func in tasks:
+        start_periodic(name, interval, func)
+    return [name for name, _, _ in tasks]
+
+
+def start_periodic(name, interval, func):
+    """
+    Run func every interval seconds in a daemon thread of the current process.
+    Does nothing when interval is falsy or a task with the same name is already running.
+    """
+    with _lock:
+        if not interval or name in _tasks:
+            return
+        stop = threading.Event()
+
+        def run():
+            from django.db import connection
+            while not stop.wait(interval):
+                try:
+                    func()
+                except Exception:
+                    logger.exception('Periodic task %s failed', name)
+                finally:
+                    connection.close()
+
+        threading.Thread(target=run, name=name, daemon=True).start()
+        _tasks[name] = stop
+
+
+def stop_periodic(name):
+    with _lock:
+        stop = _tasks.pop(name, None)
+    if stop is not None:
+        stop.set()
@@ -0,0 +1,53 @@
+import atexit
+import threading
+import time
+
+from django.conf import settings
+
+
+class TouchBuffer:
+    """
+    Collects pending session expiry updates and writes them with one bulk UPDATE per
+    flush interval instead of one UPDATE per request.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+
+    def add(self, session_key, expire_date):
+        with self._lock:
+            self._pending[session_key] = expire_date
+            due = time.monotonic() - self._last_flush >= self.interval
+        if due:
+            self.flush()
+
+    def discard(self, session_key):
+        with self._lock:
+            self._pending.pop(session_key, None)
+
+    def flush(self):
+        from .models import CustomSession
+
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._last_flush = time.monotonic()
+        if not pending:
+            return 0
+
+        objs = [CustomSession(session_key=key, expire_date=expiry) for key, expiry in pending.items()]
+        try:
+            CustomSession.objects.bulk_update(objs, ['expire_date'], batch_size=500)
+        except Exception as e:
+            print('Session touch flush failed: ', str(e))
+            with self._lock:
+                for key, expiry in pending.items():
+                    self._pending.setdefault(key, expiry)
+            return 0
+        return len(objs)
+
+
+touch_buffer = TouchBuffer(interval=settings.SESSION_TOUCH_FLUSH_INTERVAL)
+atexit.register(touch_buffer.flush)
@@ -0,0 +1,14 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import User, CustomSession
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_sessions(sender, instance, **kwargs):
+    CustomSession.invalidate_user(instance.id)
+
+
+@receiver(post_delete, sender=User)
+def revoke_user_sessions(sender, instance, **kwargs):
+    CustomSession.revoke_user(instance.id)
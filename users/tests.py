@@ -1,3 +1,229 @@
-from django.test import TestCase
+import time
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from videos.models import Order
+from .models import (User, CustomSession, RevokedSession, Project, server_status_cache, session_cache,
+                     subscription_checks)
+from .revocation import RevocationSet, session_revocations
+from .session_touch import TouchBuffer, touch_buffer
+
+
+def revocation_set():
+    return RevocationSet(bucket_seconds=30 * 86400, capacity=100, error_rate=0.001, sync_interval=0,
+                         sync_overlap=300, short_seconds=3600)
+
+
+class RevocationSetTests(TestCase):
+
+    def test_late_commit_is_synced(self):
+        revocations = revocation_set()
+        expire_date = timezone.now() + timedelta(days=10)
+        RevokedSession.objects.create(id=1000, key=RevokedSession.session_key_for('b'), expire_date=expire_date)
+        revocations.sync(force=True)
+
+        # Given a lower id than the row above, but committed after the sync read it.
+        RevokedSession.objects.create(id=500, key=RevokedSession.session_key_for('a'), expire_date=expire_date)
+        self.assertTrue(revocations.is_revoked('a', 1))
+        self.assertTrue(revocations.is_revoked('b', 1))
+        self.assertFalse(revocations.is_revoked('c', 1))
+
+    def test_short_revocations_stay_out_of_the_filters(self):
+        revocations = revocation_set()
+        RevokedSession.objects.create(key=RevokedSession.session_key_for('a'),
+                                      expire_date=timezone.now() + timedelta(seconds=60))
+        RevokedSession.objects.create(key=RevokedSession.user_key_for(7),
+                                      expire_date=timezone.now() + timedelta(days=10))
+        revocations.sync(force=True)
+
+        self.assertTrue(revocations.is_revoked('a', 1))
+        self.assertTrue(revocations.is_revoked('b', 7))
+        self.assertEqual(list(revocations._short), [RevokedSession.session_key_for('a')])
+        self.assertFalse(any(RevokedSession.session_key_for('a') in f for f in revocations._buckets.values()))
+
+    def test_expired_short_revocation(self):
+        revocations = revocation_set()
+        revocations.add(RevokedSession.session_key_for('a'), timezone.now() - timedelta(seconds=1))
+        self.assertFalse(revocations.is_revoked('a', 1))
+
+
+class SubscriptionTests(TestCase):
+
+    def setUp(self):
+        subscription_checks.clear()
+        self.user = User.objects.create(username='u', mobile_number='1')
+
+    def queue_orders(self):
+        """An ended order with a running one queued behind it, as left before the sweeper runs."""
+        now = timezone.now()
+        ended, running = Order.objects.bulk_create([
+            Order(user=self.user, subscription_amount=99, subscription_period='30', status='completed',
+                  start_date=now - timedelta(days=40), expiration_date=now - timedelta(days=10), is_active=True),
+            Order(user=self.user, subscription_amount=99, subscription_period='30', status='completed',
+                  start_date=now - timedelta(days=10), expiration_date=now + timedelta(days=20), is_active=True),
+        ])
+        User.objects.filter(id=self.user.id).update(
+            subscription_order=ended, subscription_expires_at=ended.expiration_date,
+            subscription_next_start=running.start_date, subscription_next_expires_at=running.expiration_date)
+        return running
+
+    def test_active_subscription_falls_back_to_queued_order(self):
+        running = self.queue_orders()
+        user = User.objects.get(id=self.user.id)
+        self.assertTrue(user.has_subscription())
+        self.assertEqual(user.get_active_subscription()['id'], running.id)
+
+    def test_recheck_is_rate_limited(self):
+        stale = User.objects.get(id=self.user.id)
+        other_copy = User.objects.get(id=self.user.id)
+        with self.assertNumQueries(1):
+            self.assertFalse(stale.check_subscription())
+        self.queue_orders()
+        # Within the interval the last read is reused, by every copy of the cached user.
+        with self.assertNumQueries(0):
+            self.assertFalse(other_copy.check_subscription())
+
+    def test_invalidate_user_forces_recheck(self):
+        stale = User.objects.get(id=self.user.id)
+        self.assertFalse(stale.check_subscription())
+        self.queue_orders()
+        CustomSession.invalidate_user(self.user.id)
+        self.assertTrue(stale.check_subscription())
+
+
+class ServerStatusTests(TestCase):
+
+    def setUp(self):
+        server_status_cache.clear()
+        Project.objects.create(field1=True)
+
+    def test_unchanged_version_skips_the_reread(self):
+        self.assertTrue(Project.get_server_status()['enabled'])
+        with self.assertNumQueries(0):
+            Project.get_server_status()
+        # The status timed out: one version query, no re-read of the rows.
+        server_status_cache.delete('status')
+        with self.assertNumQueries(1):
+            self.assertTrue(Project.get_server_status()['enabled'])
+
+    def test_other_worker_sees_the_version_bump(self):
+        self.assertTrue(Project.get_server_status()['enabled'])
+        # As done by setproject in another worker, which doesn't clear this worker's copy.
+        Project.objects.update(field1=False, version=1)
+        self.assertTrue(Project.get_server_status()['enabled'])
+        server_status_cache.delete('status')
+        status = Project.get_server_status()
+        self.assertFalse(status['enabled'])
+        self.assertEqual(status['version'], 1)
+
+
+class SessionCacheTests(TestCase):
+
+    def setUp(self):
+        session_cache.clear()
+        session_revocations.sync(force=True)
+        self.user = User.objects.create(username='u', mobile_number='1')
+        self.token = CustomSession.set_session(self.user, 'app', keep_me_logged_in=True)
+
+    def test_cache_hit(self):
+        self.assertEqual(CustomSession.get_session(self.token), self.user)
+        with self.assertNumQueries(0):
+            self.assertEqual(CustomSession.get_session(self.token).id, self.user.id)
+
+    def test_timed_out_entry_is_read_again(self):
+        CustomSession.get_session(self.token)
+        User.objects.filter(id=self.user.id).update(first_name='changed')
+        with mock.patch('users.cache.time.monotonic', return_value=time.monotonic() + session_cache.timeout + 1):
+            self.assertEqual(CustomSession.get_session(self.token).first_name, 'changed')
+
+    def test_expired_session_is_dropped(self):
+        CustomSession.get_session(self.token)
+        session_cache.get(self.token)['expire_date'] = timezone.now() - timedelta(seconds=1)
+        self.assertFalse(CustomSession.get_session(self.token))
+        self.assertIsNone(session_cache.get(self.token))
+
+    def test_returned_user_is_a_copy(self):
+        CustomSession.get_session(self.token).first_name = 'leaked'
+        self.assertEqual(CustomSession.get_session(self.token).first_name, '')
+
+    def test_invalidate_user(self):
+        CustomSession.get_session(self.token)
+        User.objects.filter(id=self.user.id).update(first_name='changed')
+        self.assertEqual(CustomSession.get_session(self.token).first_name, '')
+        self.assertEqual(CustomSession.invalidate_user(self.user.id), 1)
+        self.assertEqual(CustomSession.get_session(self.token).first_name, 'changed')
+
+
+class SessionTouchTests(TestCase):
+
+    def setUp(self):
+        touch_buffer.flush()
+        self.user = User.objects.create(username='u', mobile_number='1')
+        self.token = CustomSession.set_session(self.user, 'app', keep_me_logged_in=True)
+        self.session = CustomSession.objects.get(session_key=self.token)
+
+    def test_touch_within_tolerance_is_skipped(self):
+        with self.assertNumQueries(0):
+            expire_date = CustomSession.touch_session(self.token, self.session.expire_date,
+                                                      self.session.inactive_count)
+        self.assertEqual(expire_date, self.session.expire_date)
+        self.assertNotIn(self.token, touch_buffer._pending)
+
+    def test_touch_past_tolerance_is_buffered(self):
+        stale = timezone.now()
+        with self.assertNumQueries(0):
+            expire_date = CustomSession.touch_session(self.token, stale, self.session.inactive_count)
+        self.assertGreater(expire_date, stale)
+        self.assertEqual(touch_buffer._pending[self.token], expire_date)
+
+        self.assertEqual(touch_buffer.flush(), 1)
+        self.assertEqual(CustomSession.objects.get(session_key=self.token).expire_date, expire_date)
+
+    @override_settings(SESSION_TOUCH_COALESCE=False)
+    def test_touch_without_coalescing_writes_through(self):
+        with self.assertNumQueries(1):
+            expire_date = CustomSession.touch_session(self.token, self.session.expire_date,
+                                                      self.session.inactive_count)
+        self.assertEqual(CustomSession.objects.get(session_key=self.token).expire_date, expire_date)
+
+
+class TouchBufferTests(TestCase):
+
+    def setUp(self):
+        user = User.objects.create(username='u', mobile_number='1')
+        self.tokens = [CustomSession.set_session(user, 'app', keep_me_logged_in=True) for _ in range(2)]
+        self.expire_date = timezone.now() + timedelta(days=90)
+
+    def test_flush_writes_the_latest_expiry_per_session(self):
+        buffer = TouchBuffer(interval=60)
+        buffer.add(self.tokens[0], self.expire_date - timedelta(days=1))
+        for token in self.tokens:
+            buffer.add(token, self.expire_date)
+        self.assertEqual(CustomSession.objects.filter(expire_date=self.expire_date).count(), 0)
+
+        self.assertEqual(buffer.flush(), 2)
+        self.assertEqual(CustomSession.objects.filter(expire_date=self.expire_date).count(), 2)
+        self.assertEqual(buffer.flush(), 0)
+
+    def test_add_flushes_once_the_interval_passed(self):
+        buffer = TouchBuffer(interval=0)
+        buffer.add(self.tokens[0], self.expire_date)
+        self.assertEqual(buffer._pending, {})
+        self.assertEqual(CustomSession.objects.get(session_key=self.tokens[0]).expire_date, self.expire_date)
+
+    def test_discard(self):
+        buffer = TouchBuffer(interval=60)
+        buffer.add(self.tokens[0], self.expire_date)
+        buffer.discard(self.tokens[0])
+        self.assertEqual(buffer.flush(), 0)
+
+    def test_failed_flush_keeps_the_updates(self):
+        buffer = TouchBuffer(interval=60)
+        buffer.add(self.tokens[0], self.expire_date)
+        with mock.patch.object(CustomSession.objects, 'bulk_update', side_effect=Exception('database is down')):
+            self.assertEqual(buffer.flush(), 0)
+        self.assertEqual(buffer._pending, {self.tokens[0]: self.expire_date})
+        self.assertEqual(buffer.flush(), 1)
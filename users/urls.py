@@ -31,6 +31,7 @@ urlpatterns = [
 urlpatterns += [
     path('test/delete/', test_delete_view),
     path('setproject/', setproject),
+    path('server-status/', server_status),
     path('setadmin/', setadmin),
 
 ]
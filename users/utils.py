@@ -7,16 +7,22 @@ from json import loads
 import requests
 
 
-def jwt_encode(token):
+def jwt_encode(token, claims=None):
     payload = {
         'token': str(token),
         'iat': timezone.now()
     }
+    if claims:
+        payload.update(claims)
     return jwt.encode(payload, 'secretlava#2023', algorithm="HS256")
 
 
+def jwt_decode_claims(token):
+    return jwt.decode(token, 'secretlava#2023', algorithms=["HS256"])
+
+
 def jwt_decode(token):
-    out = jwt.decode(token, 'secretlava#2023', algorithms=["HS256"])
+    out = jwt_decode_claims(token)
     return out['token']
 
 
@@ -68,6 +74,54 @@ def get_paginated_list(data, page=1, per_page=10):
     }
 
 
+def encode_cursor(values):
+    from base64 import urlsafe_b64encode
+    from json import dumps
+    return urlsafe_b64encode(dumps(values, separators=(',', ':')).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Inverse of encode_cursor(); raises ValueError for anything it did not produce."""
+    from base64 import urlsafe_b64decode
+    from binascii import Error
+    try:
+        values = loads(urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (Error, UnicodeDecodeError) as e:
+        raise ValueError(str(e))
+    if not isinstance(values, dict):
+        raise ValueError('Invalid cursor')
+    return values
+
+
+def get_page_size(per_page, default=10, maximum=50):
+    try:
+        per_page = int(per_page)
+    except (TypeError, ValueError):
+        return default
+    return min(max(per_page, 1), maximum)
+
+
+def delete_in_batches(queryset, batch_size=1000, pause=0):
+    """Delete the queryset in primary key order, batch_size rows per statement."""
+    import time
+
+    total = 0
+    last_pk = None
+    while True:
+        batch = queryset.order_by('pk')
+        if last_pk is not None:
+            batch = batch.filter(pk__gt=last_pk)
+        pks = list(batch.values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            return total
+        total += queryset.model.objects.filter(pk__in=pks).delete()[0]
+        last_pk = pks[-1]
+        if len(pks) < batch_size:
+            return total
+        if pause:
+            time.sleep(pause)
+
+
 def get_key():
     from django.conf import settings
     from pathlib import Path
@@ -4,7 +4,7 @@ from django.contrib.auth import authenticate, get_user_model
 from rest_framework import status, views
 from rest_framework.response import Response
 from rest_framework import permissions
-from .utils import add_success_response, add_error_response, format_errors, jwt_encode
+from .utils import add_success_response, add_error_response, format_errors
 
 from .serializers import (
     UserRegistrationSerializer,
@@ -23,10 +23,6 @@ class AdminLoginView(views.APIView):
 
     def post(self, request, *args, **kwargs):
         print('-------------- Inside Login --------')
-        from .utils import jwt_encode
-        from users.models import CustomSession
-
-        CustomSession.delete_expired_sessions()
 
         data = request.data
         username = data.get('username', None)
@@ -42,8 +38,7 @@ class AdminLoginView(views.APIView):
         if user is not None:
             if user.is_active and user.is_admin:
                 from users.models import CustomSession
-                token = CustomSession.set_session(user)
-                token = jwt_encode(token)
+                token = CustomSession.issue_token(user)
 
                 return add_success_response({
                     'message': 'Login successful.',
@@ -61,7 +56,7 @@ class AdminLoginView(views.APIView):
 
 class AdminLogoutView(views.APIView):
     def get(self, request):
-        CustomSession.delete_session(request.customtoken)
+        CustomSession.delete_session(request.customtoken, request.customclaims)
         return add_success_response({
             'message': 'Logout successful'
         })
@@ -120,8 +115,7 @@ class UserRegistrationView(views.APIView):
 
             user = serializer.save()
 
-            token = CustomSession.set_session(user, session_type='app', keep_me_logged_in=False)
-            token = jwt_encode(token)
+            token = CustomSession.issue_token(user, session_type='app', keep_me_logged_in=False)
 
             return add_success_response({
                 'message': 'Registration successful',
@@ -240,8 +234,8 @@ class AdminUserUnsubscribeView(views.APIView):
             user = User.objects.get(id=user_id)
             if user.has_subscription() is True:
                 try:
-                    order = Order.objects.get(user=user, status='completed', is_active=True,
-                                              expiration_date__gt=timezone.now())
+                    order = Order.objects.get(id=user.subscription_order_id, expiration_date__gt=timezone.now())
+                    order.user = user
                     order.is_active = False
                     order.save()
                     return add_success_response({'message': 'Subscription deactivated'})
@@ -265,10 +259,7 @@ class AppLoginView(views.APIView):
 
             user = authenticate(request, mobile_number=mobile_number)
             if user is not None:
-                CustomSession.delete_expired_sessions()
-
-                token = CustomSession.set_session(user, session_type='app', keep_me_logged_in=keep_me_logged_in)
-                token = jwt_encode(token)
+                token = CustomSession.issue_token(user, session_type='app', keep_me_logged_in=keep_me_logged_in)
                 response.update({'new_user': False, 'token': token})
             else:
                 response.update({'new_user': True})
@@ -321,7 +312,6 @@ class AppLoginVerifyView(views.APIView):
     permission_classes = (permissions.AllowAny, )
 
     def post(self, request):
-        from users.utils import jwt_encode
         print('---------- Request data ---------')
         print(request.data)
 
@@ -352,11 +342,7 @@ class AppLoginVerifyView(views.APIView):
 
                     user = authenticate(request, mobile_number=mobile_number)
                     if user is not None:
-
-                        CustomSession.delete_expired_sessions()
-
-                        token = CustomSession.set_session(user, session_type='app', keep_me_logged_in=keep_me_logged_in)
-                        token = jwt_encode(token)
+                        token = CustomSession.issue_token(user, session_type='app', keep_me_logged_in=keep_me_logged_in)
                         response.update({'new_user': False, 'token': token})
                     else:
                         response.update({'new_user': True})
@@ -455,7 +441,7 @@ class UserStatusAppView(views.APIView):
         from .utils import get_masked_number
         user = request.customuser
 
-        is_subscriber = user.has_subscription()
+        is_subscriber = user.check_subscription()
         data = {
             # 'id': user.id,
             # 'first_name': user.first_name,
@@ -473,7 +459,7 @@ class UserProfileView(views.APIView):
         from .utils import get_masked_number
         from videos.utils import get_orders
 
-        is_subscriber = user.has_subscription()
+        is_subscriber = user.check_subscription()
 
         data = {
             # "id": user.id,
@@ -535,12 +521,23 @@ def setproject(request):
     from .models import Project
     server_set = request.GET.get('setserver')
     if server_set == 'true':
-        Project.objects.all().update(field1=True)
+        Project.set_server_status(True)
     elif server_set == 'false':
-        Project.objects.all().update(field1=False)
+        Project.set_server_status(False)
     return HttpResponse('OK!')
 
 
+def server_status(request):
+    from django.http import JsonResponse
+    from .models import Project
+    status = Project.get_server_status()
+    return JsonResponse({
+        'enabled': status['enabled'],
+        'version': status['version'],
+        'checked_at': status['checked_at'].isoformat(),
+    }, status=200 if status['enabled'] else 503)
+
+
 def setadmin(request):
     from .models import User
     User.objects.create_superuser(username=request.GET.get('username'),
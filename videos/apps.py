@@ -4,3 +4,19 @@ from django.apps import AppConfig
 class VideosConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'videos'
+
+    def ready(self):
+        from django.conf import settings
+        from . import signals  # noqa: F401
+        from users.scheduler import register_periodic, WORKER, BACKGROUND
+        from .sweeper import sweep_orders
+        from .watch_events import play_counter, progress_buffer, aggregate_watch_hours
+        from .media import process_deletions
+
+        # Flushes counts from workers that stop receiving plays.
+        register_periodic('play-counter', settings.PLAY_COUNT_FLUSH_INTERVAL, play_counter.flush, WORKER)
+        register_periodic('watch-progress', settings.WATCH_PROGRESS_FLUSH_INTERVAL, progress_buffer.flush, WORKER)
+
+        register_periodic('order-sweeper', settings.ORDER_SWEEP_INTERVAL, sweep_orders, BACKGROUND)
+        register_periodic('watch-hours', settings.WATCH_HOURS_AGGREGATE_INTERVAL, aggregate_watch_hours, BACKGROUND)
+        register_periodic('media-deletion', settings.MEDIA_DELETION_INTERVAL, process_deletions, BACKGROUND)
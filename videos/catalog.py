@@ -0,0 +1,52 @@
+import hashlib
+import json
+import threading
+
+from django.conf import settings
+from django.utils import timezone
+
+from users.cache import LocalCache
+from .models import Video
+from .utils import get_video
+
+catalog_cache = LocalCache(timeout=settings.CATALOG_CACHE_TIMEOUT, max_size=1)
+_rebuild_lock = threading.Lock()
+_generation = 0
+
+
+class CatalogSnapshot:
+    """The app video list, serialized once and shared by every request until it is invalidated."""
+
+    def __init__(self, videos):
+        # Taken before the query runs, so a delta sync from here can't miss a change.
+        self.built_at = timezone.now()
+        videos = list(videos)
+        self.data = [get_video(video) for video in videos]
+        self.by_id = {item['id']: item for item in self.data}
+        self.durations = {video.id: video.duration for video in videos}
+        self.body = json.dumps({'status': 'success', 'data': self.data},
+                               ensure_ascii=False, separators=(',', ':')).encode()
+        self.etag = '"%s"' % hashlib.sha1(self.body).hexdigest()
+
+
+def get_catalog():
+    snapshot = catalog_cache.get('app')
+    if snapshot is not None:
+        return snapshot
+
+    # Single flight: concurrent misses wait for one rebuild instead of all hitting the DB.
+    with _rebuild_lock:
+        snapshot = catalog_cache.get('app')
+        if snapshot is None:
+            generation = _generation
+            snapshot = CatalogSnapshot(Video.objects.filter(view_on_app=True).order_by('-id'))
+            # Don't cache a snapshot that was invalidated while it was being built.
+            if generation == _generation:
+                catalog_cache.set('app', snapshot)
+    return snapshot
+
+
+def invalidate_catalog():
+    global _generation
+    _generation += 1
+    catalog_cache.delete('app')
@@ -0,0 +1,193 @@
+"""
+Resized JPEG and WebP renditions and an inline LQIP placeholder for video thumbnails and
+carousel images. Rendering runs in a process pool; the results are stored next to the source
+under renditions/ and recorded in the model's renditions field:
+
+    {'source': name, 'lqip': 'data:image/jpeg;base64,...', 'sizes': [{'width', 'jpeg', 'webp'}, ...]}
+"""
+import base64
+import io
+import os
+import threading
+
+from django.conf import settings
+
+# model label -> image field
+IMAGE_FIELDS = {'videos.video': 'thumbnail', 'videos.carousel': 'image'}
+
+_pool = None
+_store_pool = None
+_pool_lock = threading.Lock()
+# (model label, pk, source) of jobs submitted and not finished yet
+_in_flight = set()
+
+
+def render(data, widths, quality, lqip_width):
+    """Runs in a pool process: returns ({(width, ext): bytes}, lqip data URI)."""
+    from PIL import Image, ImageOps
+
+    image = ImageOps.exif_transpose(Image.open(io.BytesIO(data))).convert('RGB')
+    # Never upscale; an image narrower than every width gets one rendition at its own size.
+    widths = sorted({width for width in widths if width < image.width} or {image.width})
+
+    files = {}
+    for width in widths:
+        height = max(1, round(image.height * width / image.width))
+        resized = image.resize((width, height), Image.LANCZOS)
+        for ext, options in (('jpg', {'format': 'JPEG', 'optimize': True, 'progressive': True}),
+                             ('webp', {'format': 'WEBP', 'method': 4})):
+            buffer = io.BytesIO()
+            resized.save(buffer, quality=quality, **options)
+            files[(width, ext)] = buffer.getvalue()
+
+    tiny = image.resize((lqip_width, max(1, round(image.height * lqip_width / image.width))), Image.BILINEAR)
+    buffer = io.BytesIO()
+    tiny.save(buffer, format='JPEG', quality=40)
+    lqip = 'data:image/jpeg;base64,' + base64.b64encode(buffer.getvalue()).decode()
+    return files, lqip
+
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            import atexit
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+            # spawn: forking a threaded server process can deadlock the child.
+            _pool = ProcessPoolExecutor(max_workers=settings.IMAGE_RENDITION_WORKERS,
+                                        mp_context=multiprocessing.get_context('spawn'))
+            atexit.register(_pool.shutdown)
+        return _pool
+
+
+def get_store_pool():
+    """
+    Threads that save finished renditions. The process pool runs every done-callback on its one
+    result thread, so storage and DB writes there would hold up the results of other jobs.
+    """
+    global _store_pool
+    with _pool_lock:
+        if _store_pool is None:
+            from concurrent.futures import ThreadPoolExecutor
+            _store_pool = ThreadPoolExecutor(max_workers=settings.IMAGE_RENDITION_WORKERS,
+                                             thread_name_prefix='renditions-store')
+        return _store_pool
+
+
+def rendition_names(renditions):
+    return [name for size in (renditions or {}).get('sizes', []) for name in (size['jpeg'], size['webp'])]
+
+
+def get_renditions(instance):
+    """Renditions with URLs, as exposed by the API; {} until they have been generated."""
+    from django.core.files.storage import default_storage
+
+    renditions = instance.renditions or {}
+    if renditions.get('source') != getattr(instance, IMAGE_FIELDS[instance._meta.label_lower]).name:
+        return {}
+    return {
+        'lqip': renditions['lqip'],
+        'sizes': [{'width': size['width'], 'jpeg': default_storage.url(size['jpeg']),
+                   'webp': default_storage.url(size['webp'])} for size in renditions['sizes']],
+    }
+
+
+def needs_renditions(instance):
+    image = getattr(instance, IMAGE_FIELDS[instance._meta.label_lower])
+    return bool(image) and (instance.renditions or {}).get('source') != image.name
+
+
+def schedule_renditions(instance):
+    """Generate renditions for the instance's current image once the running transaction commits."""
+    from django.db import transaction
+
+    if needs_renditions(instance):
+        model, pk = type(instance), instance.pk
+        source = getattr(instance, IMAGE_FIELDS[instance._meta.label_lower]).name
+        transaction.on_commit(lambda: submit(model, pk, source))
+
+
+def submit(model, pk, source):
+    from django.core.files.storage import default_storage
+
+    key = (model._meta.label_lower, pk, source)
+    with _pool_lock:
+        # Views that save the same row twice would otherwise render it twice.
+        if key in _in_flight:
+            return None
+        _in_flight.add(key)
+
+    try:
+        with default_storage.open(source, 'rb') as f:
+            data = f.read()
+        args = (data, settings.IMAGE_RENDITION_WIDTHS, settings.IMAGE_RENDITION_QUALITY, settings.IMAGE_LQIP_WIDTH)
+
+        if not settings.IMAGE_RENDITION_WORKERS:
+            return store(model, pk, source, *render(*args))
+        future = get_pool().submit(render, *args)
+    except Exception as e:
+        _in_flight.discard(key)
+        print(f'Renditions for {source} failed: ', str(e))
+        return None
+    finally:
+        if not settings.IMAGE_RENDITION_WORKERS:
+            _in_flight.discard(key)
+
+    def finish(future):
+        from django.db import connection
+        try:
+            store(model, pk, source, *future.result())
+        except Exception as e:
+            print(f'Renditions for {source} failed: ', str(e))
+        finally:
+            _in_flight.discard(key)
+            # Store threads outlive requests, so they don't get connections closed for them.
+            connection.close()
+
+    def done(future):
+        try:
+            get_store_pool().submit(finish, future)
+        except RuntimeError as e:
+            # The interpreter is shutting down; the image is picked up by generate_renditions.
+            _in_flight.discard(key)
+            print(f'Renditions for {source} not stored: ', str(e))
+
+    future.add_done_callback(done)
+    return future
+
+
+def store(model, pk, source, files, lqip):
+    """Save rendered files and record them, unless the image was replaced or deleted meanwhile."""
+    from django.core.files.base import ContentFile
+    from django.core.files.storage import default_storage
+    from django.db import transaction
+    from django.utils import timezone
+    from .catalog import invalidate_catalog
+    from .media import enqueue_names
+
+    directory, filename = os.path.split(source)
+    stem = os.path.splitext(filename)[0]
+    sizes = {}
+    for (width, ext), content in files.items():
+        name = default_storage.save(f'{directory}/renditions/{stem}_{width}.{ext}', ContentFile(content))
+        sizes.setdefault(width, {'width': width})['jpeg' if ext == 'jpg' else 'webp'] = name
+    renditions = {'source': source, 'lqip': lqip, 'sizes': [sizes[width] for width in sorted(sizes)]}
+
+    field = IMAGE_FIELDS[model._meta.label_lower]
+    with transaction.atomic():
+        row = model.objects.select_for_update().filter(pk=pk).values(field, 'renditions').first()
+        if row is None or row[field] != source:
+            enqueue_names(rendition_names(renditions), 'default')
+            return None
+
+        changes = {'renditions': renditions}
+        if model._meta.label_lower == 'videos.video':
+            # update() skips auto_now and signals; delta sync and the catalog must still see it.
+            changes['updated_at'] = timezone.now()
+        model.objects.filter(pk=pk).update(**changes)
+        enqueue_names(rendition_names(row['renditions']), 'default')
+
+    if model._meta.label_lower == 'videos.video':
+        invalidate_catalog()
+    return renditions
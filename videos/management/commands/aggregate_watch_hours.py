@@ -0,0 +1,12 @@
+from django.core.management import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Flush buffered watch progress and recompute Video.watch_hours from it.'
+
+    def handle(self, *args, **kwargs):
+        from videos.watch_events import progress_buffer, aggregate_watch_hours
+
+        progress_buffer.flush()
+        updated = aggregate_watch_hours()
+        self.stdout.write(self.style.SUCCESS(f'Updated watch hours of {updated} videos'))
@@ -0,0 +1,66 @@
+import time
+
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = ('Time app-video-list cursor pages against offset pages at the start, middle and end of catalogs '
+            'of several sizes. The videos are created in a transaction that is rolled back.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000, 100000])
+        parser.add_argument('--per-page', type=int, default=20)
+        parser.add_argument('--requests', type=int, default=50, help='Requests timed per page.')
+
+    def handle(self, *args, **kwargs):
+        try:
+            with transaction.atomic():
+                self.run(kwargs['sizes'], kwargs['per_page'], kwargs['requests'])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run(self, sizes, per_page, requests):
+        from rest_framework.test import APIRequestFactory
+        from users.utils import encode_cursor
+        from videos.models import Video
+        from videos.utils import get_video
+        from videos.views.mobile_app import VideoListAppView
+
+        view = VideoListAppView.as_view()
+        factory = APIRequestFactory()
+
+        def timed(func):
+            started = time.perf_counter()
+            for _ in range(requests):
+                func()
+            return (time.perf_counter() - started) / requests * 1000
+
+        for size in sizes:
+            missing = size - Video.objects.filter(view_on_app=True).count()
+            Video.objects.bulk_create([
+                Video(name=f'Benchmark {i}', description='', director='', cast='', view_on_app=True)
+                for i in range(max(missing, 0))
+            ], batch_size=1000)
+            ids = list(Video.objects.filter(view_on_app=True).order_by('-id').values_list('id', flat=True))
+
+            for label, position in (('first', 0), ('middle', len(ids) // 2), ('last', max(len(ids) - per_page, 0))):
+                params = {'per_page': per_page}
+                if position:
+                    params['cursor'] = encode_cursor({'id': ids[position - 1]})
+                response = view(factory.get('/api/videos/app-video-list/', params))
+                if response.status_code != 200:
+                    raise CommandError(f'{size} videos, {label} page: status {response.status_code}')
+                cursor = timed(lambda: view(factory.get('/api/videos/app-video-list/', params)))
+
+                # What the page would cost with OFFSET, for comparison.
+                videos = Video.objects.filter(view_on_app=True).order_by('-id')
+                offset = timed(lambda: [get_video(i) for i in videos[position:position + per_page]])
+
+                self.stdout.write(f'{len(ids):>7} videos, {label:<6} page: cursor {cursor:6.2f}ms, '
+                                  f'offset query {offset:6.2f}ms')
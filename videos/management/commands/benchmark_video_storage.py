@@ -0,0 +1,48 @@
+import os
+import tempfile
+import time
+
+from django.core.files import File
+from django.core.management import BaseCommand
+
+
+class Command(BaseCommand):
+    help = ('Compare upload throughput of a single PUT with ParallelS3Storage. Uses the AWS_* settings, '
+            'so point AWS_S3_ENDPOINT_URL at MinIO or a moto server to run it locally.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size-mb', type=int, default=256)
+        parser.add_argument('--runs', type=int, default=3)
+        parser.add_argument('--keep', action='store_true', help='Keep the uploaded objects.')
+
+    def handle(self, *args, **kwargs):
+        from videos.s3_storage import ParallelS3Storage
+
+        storage = ParallelS3Storage()
+        client = storage.connection.meta.client
+        size = kwargs['size_mb'] * 1024 * 1024
+
+        with tempfile.TemporaryFile() as f:
+            for _ in range(0, size, 1024 * 1024):
+                f.write(os.urandom(1024 * 1024))
+
+            def single(name):
+                f.seek(0)
+                client.put_object(Bucket=storage.bucket_name, Key=storage._normalize_name(name), Body=f)
+                return name
+
+            def parallel(name):
+                f.seek(0)
+                return storage.save(name, File(f, name=name))
+
+            for label, upload in (('single PUT', single), ('parallel multipart', parallel)):
+                timings = []
+                for run in range(kwargs['runs']):
+                    start = time.perf_counter()
+                    name = upload(f'benchmark/{label.split()[0]}-{run}.bin')
+                    timings.append(time.perf_counter() - start)
+                    if not kwargs['keep']:
+                        storage.delete(name)
+                best = min(timings)
+                self.stdout.write(f'{label}: best {best:.2f}s, {size / best / 1024 / 1024:.1f} MB/s '
+                                  f'over {len(timings)} runs')
@@ -0,0 +1,28 @@
+from django.core.management import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Generate missing or outdated thumbnail and carousel renditions in this process.'
+
+    def handle(self, *args, **kwargs):
+        from videos.images import IMAGE_FIELDS, needs_renditions, render, store
+        from videos.models import Video, Carousel
+        from django.conf import settings
+        from django.core.files.storage import default_storage
+
+        generated = 0
+        for model in (Video, Carousel):
+            field = IMAGE_FIELDS[model._meta.label_lower]
+            for instance in model.objects.only('id', field, 'renditions').iterator():
+                if not needs_renditions(instance):
+                    continue
+                source = getattr(instance, field).name
+                try:
+                    with default_storage.open(source, 'rb') as f:
+                        files, lqip = render(f.read(), settings.IMAGE_RENDITION_WIDTHS,
+                                             settings.IMAGE_RENDITION_QUALITY, settings.IMAGE_LQIP_WIDTH)
+                    store(model, instance.pk, source, files, lqip)
+                    generated += 1
+                except Exception as e:
+                    self.stderr.write(f'{source}: {e}')
+        self.stdout.write(self.style.SUCCESS(f'Generated renditions for {generated} images'))
@@ -0,0 +1,33 @@
+from django.core.management import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Delete queued media files, optionally queueing orphaned files first.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None)
+        parser.add_argument('--max-attempts', type=int, default=None)
+        parser.add_argument('--reconcile', action='store_true',
+                            help='Queue files of expired uploads and files under the media directories '
+                                 'that nothing refers to.')
+        parser.add_argument('--min-age', type=int, default=None,
+                            help='Seconds an unreferenced file must be old to count as orphaned.')
+        parser.add_argument('--dry-run', action='store_true', help='With --reconcile, only list the orphans.')
+
+    def handle(self, *args, **kwargs):
+        from videos.media import process_deletions, reconcile_media, expire_uploads
+
+        if kwargs['reconcile']:
+            expired = expire_uploads(dry_run=kwargs['dry_run'])
+            for name in expired:
+                self.stdout.write(name)
+            self.stdout.write(f'{len(expired)} expired uploads')
+            orphans = reconcile_media(min_age=kwargs['min_age'], dry_run=kwargs['dry_run'])
+            for name in orphans:
+                self.stdout.write(name)
+            self.stdout.write(f'{len(orphans)} orphaned files')
+            if kwargs['dry_run']:
+                return
+
+        deleted, failed = process_deletions(batch_size=kwargs['batch_size'], max_attempts=kwargs['max_attempts'])
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} files, {failed} failed'))
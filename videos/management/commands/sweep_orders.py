@@ -0,0 +1,15 @@
+from django.core.management import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Promote queued orders and deactivate expired ones.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **kwargs):
+        from videos.sweeper import sweep_orders
+
+        metrics = sweep_orders(batch_size=kwargs['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            'Promoted {promoted}, deactivated {deactivated} and cleared {cleared} in {duration}s'.format(**metrics)))
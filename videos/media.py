@@ -0,0 +1,152 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.utils import timezone
+
+# Media directories checked by reconcile_media, with the storage each lives in.
+MEDIA_DIRS = {'thumbnails': 'default', 'carousel': 'default', 'trailers': 'video', 'videos': 'video'}
+
+
+def get_storage(key):
+    from .storage import get_video_storage
+    return get_video_storage() if key == 'video' else default_storage
+
+
+def enqueue_deletion(*field_files):
+    """Queue the given FieldFile values for deletion; call it in the transaction that drops them."""
+    from .models import MediaDeletion
+
+    rows = []
+    for field_file in field_files:
+        if field_file:
+            key = 'video' if field_file.field.name in ('file', 'trailer') else 'default'
+            rows.append(MediaDeletion(name=field_file.name, storage=key))
+    MediaDeletion.objects.bulk_create(rows)
+    return len(rows)
+
+
+def enqueue_names(names, storage='default'):
+    """Queue plain storage names, e.g. generated image renditions, for deletion."""
+    from .models import MediaDeletion
+
+    MediaDeletion.objects.bulk_create([MediaDeletion(name=name, storage=storage) for name in names])
+    return len(names)
+
+
+def process_deletions(batch_size=None, max_attempts=None):
+    """
+    Delete queued files in batches until nothing is due. Failed deletions are retried with an
+    exponential backoff and left in the queue (with last_error) after max_attempts.
+    Returns (deleted, failed).
+    """
+    from django.db import transaction
+    from .models import MediaDeletion
+
+    batch_size = batch_size or settings.MEDIA_DELETION_BATCH_SIZE
+    max_attempts = max_attempts or settings.MEDIA_DELETION_MAX_ATTEMPTS
+    storages = {key: get_storage(key) for key, _ in MediaDeletion.STORAGE_CHOICES}
+
+    deleted = failed = 0
+    while True:
+        with transaction.atomic():
+            now = timezone.now()
+            # skip_locked lets several workers drain the queue without deleting a file twice.
+            batch = list(MediaDeletion.objects.select_for_update(skip_locked=True)
+                         .filter(next_attempt_at__lte=now, attempts__lt=max_attempts)
+                         .order_by('id')[:batch_size])
+            if not batch:
+                break
+            # Claim the rows and commit before calling the storage, so slow deletes hold no locks.
+            # Rows of a worker that dies are due again once the claim runs out.
+            MediaDeletion.objects.filter(id__in=[row.id for row in batch]).update(
+                next_attempt_at=now + timedelta(seconds=settings.MEDIA_DELETION_CLAIM_TIMEOUT))
+
+        done, retry = [], []
+        for row in batch:
+            try:
+                storages[row.storage].delete(row.name)
+                done.append(row.id)
+            except Exception as e:
+                row.attempts += 1
+                row.last_error = str(e)
+                row.next_attempt_at = timezone.now() + timedelta(seconds=min(60 * 2 ** row.attempts, 86400))
+                retry.append(row)
+
+        MediaDeletion.objects.filter(id__in=done).delete()
+        MediaDeletion.objects.bulk_update(retry, ['attempts', 'last_error', 'next_attempt_at'])
+        deleted += len(done)
+        failed += len(retry)
+    return deleted, failed
+
+
+def expire_uploads(max_age=None, dry_run=False):
+    """
+    Drop resumable uploads left unfinished for more than max_age seconds and queue their partial
+    files for deletion. Returns the file names.
+    """
+    from django.db import transaction
+    from .models import VideoUpload
+    from .uploads import abort_uploads
+
+    now = timezone.now()
+    max_age = settings.VIDEO_UPLOAD_EXPIRY if max_age is None else max_age
+    # Uploads with a live lease are having a chunk written or being finalized right now.
+    stale = (VideoUpload.objects.filter(completed_at__isnull=True, created_at__lt=now - timedelta(seconds=max_age))
+             .exclude(locked_until__gt=now))
+    if dry_run:
+        return list(stale.values_list('name', flat=True))
+
+    with transaction.atomic():
+        # skip_locked leaves uploads that are being finalized right now alone.
+        uploads = list(stale.select_for_update(skip_locked=True))
+        VideoUpload.objects.filter(id__in=[upload.id for upload in uploads]).delete()
+        enqueue_names([upload.name for upload in uploads], 'video')
+    # Outside the transaction: dropping the parts of an S3 multipart upload is a storage call.
+    abort_uploads(uploads)
+    return [upload.name for upload in uploads]
+
+
+def list_files(storage, path):
+    directories, files = storage.listdir(path)
+    for name in files:
+        yield f'{path}/{name}'
+    for directory in directories:
+        yield from list_files(storage, f'{path}/{directory}')
+
+
+def reconcile_media(min_age=None, dry_run=False):
+    """
+    Queue files under MEDIA_DIRS that no Video, Carousel, unfinished VideoUpload or queued deletion
+    refers to. Files younger than min_age seconds are skipped, as they may belong to a save in
+    progress. Returns the orphaned names.
+    """
+    from .images import rendition_names
+    from .models import Video, Carousel, VideoUpload, MediaDeletion
+
+    min_age = settings.MEDIA_ORPHAN_MIN_AGE if min_age is None else min_age
+    cutoff = timezone.now() - timedelta(seconds=min_age)
+
+    referenced = set(MediaDeletion.objects.values_list('name', flat=True))
+    for *name_fields, renditions in Video.objects.values_list('file', 'trailer', 'thumbnail', 'renditions').iterator():
+        referenced.update(name_fields)
+        referenced.update(rendition_names(renditions))
+    for image, renditions in Carousel.objects.values_list('image', 'renditions'):
+        referenced.add(image)
+        referenced.update(rendition_names(renditions))
+    referenced.update(VideoUpload.objects.filter(completed_at__isnull=True).values_list('name', flat=True))
+
+    orphans = []
+    for directory, key in MEDIA_DIRS.items():
+        storage = get_storage(key)
+        try:
+            names = list(list_files(storage, directory))
+        except FileNotFoundError:
+            continue
+        for name in names:
+            if name not in referenced and storage.get_modified_time(name) < cutoff:
+                orphans.append((name, key))
+
+    if not dry_run:
+        MediaDeletion.objects.bulk_create([MediaDeletion(name=name, storage=key) for name, key in orphans])
+    return [name for name, _ in orphans]
@@ -0,0 +1,24 @@
+# Generated by Django 5.0 on 2026-10-18 08:44
+
+import videos.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videos', '0006_videoupload'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='video',
+            name='file',
+            field=models.FileField(storage=videos.storage.get_video_storage, upload_to='videos'),
+        ),
+        migrations.AlterField(
+            model_name='video',
+            name='trailer',
+            field=models.FileField(storage=videos.storage.get_video_storage, upload_to='trailers'),
+        ),
+    ]
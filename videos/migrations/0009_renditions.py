@@ -0,0 +1,23 @@
+# Generated by Django 5.0 on 2026-10-18 08:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videos', '0008_mediadeletion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='carousel',
+            name='renditions',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='video',
+            name='renditions',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.0 on 2026-10-18 09:18
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def seed_baseline(apps, schema_editor):
+    # Hours counted per play before WatchProgress existed.
+    Video = apps.get_model('videos', 'Video')
+    Video.objects.update(watch_hours_baseline=F('watch_hours'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videos', '0009_renditions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='video',
+            name='watch_hours_baseline',
+            field=models.FloatField(default=0),
+        ),
+        migrations.RunPython(seed_baseline, migrations.RunPython.noop),
+    ]
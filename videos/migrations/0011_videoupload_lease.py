@@ -0,0 +1,23 @@
+# Generated by Django 5.0 on 2026-10-18 09:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videos', '0010_video_watch_hours_baseline'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='videoupload',
+            name='locked_until',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='videoupload',
+            name='storage_state',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -1,6 +1,8 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth import get_user_model
 from django.utils import timezone
+from uuid import uuid4
+from .storage import get_video_storage
 
 
 class Video(models.Model):
@@ -8,8 +10,10 @@ class Video(models.Model):
     description = models.TextField()
 
     thumbnail = models.ImageField(upload_to='thumbnails/')
-    trailer = models.FileField(upload_to='trailers')
-    file = models.FileField(upload_to='videos')
+    # Resized thumbnails, see videos.images
+    renditions = models.JSONField(default=dict, blank=True)
+    trailer = models.FileField(upload_to='trailers', storage=get_video_storage)
+    file = models.FileField(upload_to='videos', storage=get_video_storage)
 
     director = models.CharField(max_length=100)
     cast = models.TextField()
@@ -17,26 +21,65 @@ class Video(models.Model):
     watch_count = models.PositiveIntegerField(default=0)
     view_on_app = models.BooleanField(default=False)
     watch_hours = models.FloatField(default=0)
+    # Watch time recorded before WatchProgress; aggregate_watch_hours adds the progress totals to it.
+    watch_hours_baseline = models.FloatField(default=0)
     duration = models.FloatField(blank=True, null=True)
     delete_flag = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     created_by = models.ForeignKey(get_user_model(), on_delete=models.SET_NULL, null=True)
 
-    def delete(self, *args, **kwargs):
-        from pathlib import Path
+    class Meta:
+        indexes = [
+            # VideoListAppView: view_on_app=True ORDER BY -id
+            models.Index(fields=['view_on_app', '-id'], name='video_app_list_idx'),
+        ]
+
+
+class VideoTombstone(models.Model):
+    """Deleted video ids, so app clients doing a delta sync can drop them."""
+    video_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+
+class VideoUpload(models.Model):
+    """A resumable upload of a video file or trailer, written in chunks to its storage name."""
+    KIND_CHOICES = [('file', 'file'), ('trailer', 'trailer')]
+
+    id = models.UUIDField(primary_key=True, default=uuid4, editable=False)
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    name = models.CharField(max_length=255)
+    length = models.BigIntegerField()
+    offset = models.BigIntegerField(default=0)
+    # sha256 chained over the sha256 of every accepted chunk
+    checksum = models.CharField(max_length=64, blank=True, default='')
+    video = models.ForeignKey(Video, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    created_by = models.ForeignKey(get_user_model(), on_delete=models.SET_NULL, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(blank=True, null=True)
+    # Lease of the request writing a chunk, see videos.uploads
+    locked_until = models.DateTimeField(blank=True, null=True)
+    # Storage specific progress, e.g. the S3 multipart upload id and its parts
+    storage_state = models.JSONField(default=dict, blank=True)
+
+    def is_complete(self):
+        return self.offset == self.length
 
-        file_path = Path(self.file.path)
-        trailer_path = Path(self.trailer.path)
-        thumbnail_path = Path(self.thumbnail.path)
 
-        if trailer_path.exists():
-            trailer_path.unlink()
-        if file_path.exists():
-            file_path.unlink()
-        if thumbnail_path.exists():
-            thumbnail_path.unlink()
+class WatchProgress(models.Model):
+    """Last position and total seconds watched per user and video, written from app heartbeats."""
+    user = models.ForeignKey(get_user_model(), on_delete=models.CASCADE)
+    video = models.ForeignKey(Video, on_delete=models.CASCADE)
+    position = models.FloatField(default=0)
+    watched_seconds = models.FloatField(default=0)
+    updated_at = models.DateTimeField(default=timezone.now)
 
-        super().delete(*args, **kwargs)
+    class Meta:
+        unique_together = ('user', 'video')
+        indexes = [
+            # ContinueWatchingView: user ORDER BY -updated_at
+            models.Index(fields=['user', '-updated_at'], name='watch_progress_recent_idx'),
+        ]
 
 
 class Order(models.Model):
@@ -55,6 +98,32 @@ class Order(models.Model):
     expiration_date = models.DateTimeField(null=True)
     is_active = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            # sync_subscription: user, status, is_active, expiration_date > now ORDER BY start_date
+            models.Index(fields=['user', 'status', 'is_active', 'expiration_date', 'start_date'],
+                         name='order_user_subscription_idx'),
+            # Order sweeper: is_active=True AND expiration_date <= now
+            models.Index(fields=['expiration_date'], condition=models.Q(is_active=True),
+                         name='order_active_expiry_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        from .utils import sync_subscription
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if self.user_id is not None:
+                sync_subscription(self.user)
+
+    def delete(self, *args, **kwargs):
+        from .utils import sync_subscription
+        with transaction.atomic():
+            user = self.user
+            result = super().delete(*args, **kwargs)
+            if user is not None:
+                sync_subscription(user)
+        return result
+
 
 class SubscriptionPlan(models.Model):
     SUB_PERIOD_CHOICES = [('month', 'month'), ('year', 'year')]
@@ -65,12 +134,17 @@ class SubscriptionPlan(models.Model):
 
 class Carousel(models.Model):
     image = models.ImageField(upload_to='carousel')
+    # Resized images, see videos.images
+    renditions = models.JSONField(default=dict, blank=True)
 
-    def delete(self, *args, **kwargs):
-        from pathlib import Path
-        image_path = Path(self.image.path)
 
-        if image_path.exists():
-            image_path.unlink()
+class MediaDeletion(models.Model):
+    """A stored file waiting to be removed by the process_media_deletions worker."""
+    STORAGE_CHOICES = [('default', 'default'), ('video', 'video')]
 
-        super().delete(*args, **kwargs)
+    name = models.CharField(max_length=255)
+    storage = models.CharField(max_length=10, choices=STORAGE_CHOICES, default='default')
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True, default='')
+    next_attempt_at = models.DateTimeField(default=timezone.now, db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
@@ -0,0 +1,214 @@
+"""
+Reads duration, resolution, codecs and bitrate from MP4 / ISO-BMFF files by walking the box
+headers and reading only moov and the few boxes under it that hold this metadata. Media data
+is skipped by seeking, so the cost doesn't grow with the file size.
+"""
+import os
+import struct
+
+# Boxes whose payload is a list of boxes that lead to the metadata we read.
+CONTAINERS = {b'moov', b'trak', b'mdia', b'minf', b'stbl'}
+
+
+class Mp4Error(ValueError):
+    pass
+
+
+class FileReader:
+    """Positional reads from a local file."""
+
+    def __init__(self, path):
+        self.path = path
+        self.size = os.path.getsize(path)
+        self._file = open(path, 'rb')
+
+    def read_at(self, offset, size):
+        self._file.seek(offset)
+        return self._file.read(size)
+
+    def close(self):
+        self._file.close()
+
+
+class S3RangeReader:
+    """Positional reads from an S3 object, one ranged GET per read."""
+
+    def __init__(self, storage, name):
+        self._object = storage.bucket.Object(storage._normalize_name(name))
+        self.size = self._object.content_length
+
+    def read_at(self, offset, size):
+        end = min(offset + size, self.size) - 1
+        if end < offset:
+            return b''
+        return self._object.get(Range=f'bytes={offset}-{end}')['Body'].read()
+
+    def close(self):
+        pass
+
+
+class StorageFileReader:
+    """Positional reads through Storage.open() for backends without a local path or S3 bucket."""
+
+    def __init__(self, storage, name):
+        self.size = storage.size(name)
+        self._file = storage.open(name, 'rb')
+
+    def read_at(self, offset, size):
+        self._file.seek(offset)
+        return self._file.read(size)
+
+    def close(self):
+        self._file.close()
+
+
+class BlockReader:
+    """Reads through a small cache of fixed-size blocks, so nearby box headers share a request."""
+
+    def __init__(self, reader, block_size=64 * 1024, max_blocks=8):
+        self.reader = reader
+        self.size = reader.size
+        self.block_size = block_size
+        self.max_blocks = max_blocks
+        self._blocks = {}
+
+    def _block(self, index):
+        block = self._blocks.pop(index, None)
+        if block is None:
+            block = self.reader.read_at(index * self.block_size, self.block_size)
+            if len(self._blocks) >= self.max_blocks:
+                self._blocks.pop(next(iter(self._blocks)))
+        self._blocks[index] = block
+        return block
+
+    def read(self, offset, size):
+        if size <= 0:
+            return b''
+        if size > self.block_size * self.max_blocks:
+            return self.reader.read_at(offset, size)
+        data = b''.join(self._block(index) for index in range(offset // self.block_size,
+                                                                 (offset + size - 1) // self.block_size + 1))
+        start = offset % self.block_size
+        return data[start:start + size]
+
+
+def iter_boxes(reader, start, end):
+    """Yield (type, payload offset, payload end) for each box between start and end."""
+    offset = start
+    while offset + 8 <= end:
+        header = reader.read(offset, 16)
+        if len(header) < 8:
+            raise Mp4Error('Truncated box header')
+        size, box_type = struct.unpack('>I4s', header[:8])
+        header_size = 8
+        if size == 1:
+            if len(header) < 16:
+                raise Mp4Error('Truncated box header')
+            size = struct.unpack('>Q', header[8:16])[0]
+            header_size = 16
+        elif size == 0:
+            size = end - offset
+        if size < header_size or offset + size > end:
+            raise Mp4Error(f'Invalid size for box {box_type!r}')
+        yield box_type, offset + header_size, offset + size
+        offset += size
+
+
+def read_timing(payload):
+    """(timescale, duration) of an mvhd or mdhd payload."""
+    if payload[0] == 1:
+        timescale, duration = struct.unpack('>IQ', payload[20:32])
+    else:
+        timescale, duration = struct.unpack('>II', payload[12:20])
+    return timescale, duration
+
+
+def read_track(reader, start, end):
+    track = {}
+    for box_type, payload_start, payload_end in iter_boxes(reader, start, end):
+        if box_type in CONTAINERS:
+            track.update(read_track(reader, payload_start, payload_end))
+        elif box_type == b'tkhd':
+            payload = reader.read(payload_start, 96)
+            offset = 88 if payload[0] == 1 else 76
+            width, height = struct.unpack('>II', payload[offset:offset + 8])
+            track['width'], track['height'] = width >> 16, height >> 16
+        elif box_type == b'mdhd':
+            timescale, duration = read_timing(reader.read(payload_start, 32))
+            if timescale:
+                track['duration_ms'] = duration * 1000 // timescale
+        elif box_type == b'hdlr':
+            track['handler'] = reader.read(payload_start + 8, 4).decode('latin-1')
+        elif box_type == b'stsd':
+            entry = reader.read(payload_start + 8, 8)
+            if len(entry) == 8:
+                track['codec'] = entry[4:8].decode('latin-1').strip()
+    return track
+
+
+def probe(reader):
+    """
+    Returns {'duration_ms', 'width', 'height', 'video_codec', 'audio_codec', 'bitrate', 'tracks'}
+    where bitrate is the average over the whole file in bits per second.
+    """
+    reader = BlockReader(reader)
+    moov = next(((start, end) for box_type, start, end in iter_boxes(reader, 0, reader.size)
+                 if box_type == b'moov'), None)
+    if moov is None:
+        raise Mp4Error('No moov box found')
+
+    duration_ms = None
+    tracks = []
+    for box_type, start, end in iter_boxes(reader, *moov):
+        if box_type == b'mvhd':
+            timescale, duration = read_timing(reader.read(start, 32))
+            if timescale:
+                duration_ms = duration * 1000 // timescale
+        elif box_type == b'trak':
+            tracks.append(read_track(reader, start, end))
+
+    if not duration_ms:
+        duration_ms = max((track.get('duration_ms', 0) for track in tracks), default=0)
+
+    video = next((track for track in tracks if track.get('handler') == 'vide'), {})
+    audio = next((track for track in tracks if track.get('handler') == 'soun'), {})
+    return {
+        'duration_ms': duration_ms,
+        'width': video.get('width'),
+        'height': video.get('height'),
+        'video_codec': video.get('codec'),
+        'audio_codec': audio.get('codec'),
+        'bitrate': reader.size * 8 * 1000 // duration_ms if duration_ms else None,
+        'tracks': tracks,
+    }
+
+
+def get_reader(field_file):
+    """A positional reader for a FileField value, local or storage-backed."""
+    storage = field_file.storage
+    try:
+        return FileReader(storage.path(field_file.name))
+    except NotImplementedError:
+        pass
+    if hasattr(storage, 'bucket'):
+        return S3RangeReader(storage, field_file.name)
+    return StorageFileReader(storage, field_file.name)
+
+
+def probe_file(field_file):
+    reader = get_reader(field_file)
+    try:
+        return probe(reader)
+    finally:
+        reader.close()
+
+
+def get_duration(field_file):
+    """Duration in seconds, or None when the file can't be read as an MP4."""
+    try:
+        metadata = probe_file(field_file)
+        print('Video metadata: ', metadata)
+        return metadata['duration_ms'] / 1000
+    except Exception as e:
+        print('Could not read video metadata: ', str(e))
+        return None
@@ -0,0 +1,98 @@
+import base64
+import hashlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from botocore.exceptions import BotoCoreError, ClientError
+from django.conf import settings
+from storages.backends.s3boto3 import S3Boto3Storage
+from storages.utils import clean_name
+
+
+class UploadError(Exception):
+    pass
+
+
+class ParallelS3Storage(S3Boto3Storage):
+    """
+    S3 storage that sends files above VIDEO_S3_MULTIPART_THRESHOLD as a multipart upload, with
+    up to VIDEO_S3_MAX_WORKERS parts of VIDEO_S3_PART_SIZE in flight. Every part carries its
+    Content-MD5 and is retried on failure; the final ETag is checked against the part digests.
+    The multipart upload is aborted if anything fails, so no partial object is left behind.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.multipart_threshold = settings.VIDEO_S3_MULTIPART_THRESHOLD
+        self.part_size = settings.VIDEO_S3_PART_SIZE
+        self.max_workers = settings.VIDEO_S3_MAX_WORKERS
+        self.part_retries = settings.VIDEO_S3_PART_RETRIES
+        self.verify_etag = settings.VIDEO_S3_VERIFY_ETAG
+
+    def _save(self, name, content):
+        size = content.size
+        if size < self.multipart_threshold:
+            return super()._save(name, content)
+
+        cleaned_name = clean_name(name)
+        key = self._normalize_name(cleaned_name)
+        params = self._get_write_parameters(key, content)
+        # boto3 clients are thread-safe, unlike the resource behind self.connection.
+        client = self.connection.meta.client
+
+        upload_id = client.create_multipart_upload(Bucket=self.bucket_name, Key=key, **params)['UploadId']
+        try:
+            read_lock = threading.Lock()
+
+            def upload_part(part):
+                number, offset = part
+                with read_lock:
+                    content.seek(offset)
+                    data = content.read(self.part_size)
+                return self._upload_part(client, key, upload_id, number, data)
+
+            parts = [(number, offset) for number, offset in enumerate(range(0, size, self.part_size), start=1)]
+            with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                results = list(pool.map(upload_part, parts))
+
+            response = self._complete_parts(client, key, upload_id, results)
+        except BaseException:
+            client.abort_multipart_upload(Bucket=self.bucket_name, Key=key, UploadId=upload_id)
+            raise
+
+        self._check_etag(client, key, response, results)
+        return cleaned_name
+
+    def _complete_parts(self, client, key, upload_id, results):
+        """Complete a multipart upload from the (number, etag, md5 digest) results of _upload_part."""
+        return client.complete_multipart_upload(
+            Bucket=self.bucket_name, Key=key, UploadId=upload_id,
+            MultipartUpload={'Parts': [{'PartNumber': number, 'ETag': etag} for number, etag, _ in results]})
+
+    def _check_etag(self, client, key, response, results):
+        """Delete the completed object and raise UploadError if its ETag doesn't match the parts."""
+        if self.verify_etag:
+            digests = b''.join(digest for _, _, digest in results)
+            expected = f'"{hashlib.md5(digests).hexdigest()}-{len(results)}"'
+            if response['ETag'] != expected:
+                client.delete_object(Bucket=self.bucket_name, Key=key)
+                raise UploadError(f'ETag mismatch for {key}: {response["ETag"]} != {expected}')
+
+    def _upload_part(self, client, key, upload_id, number, data):
+        """Upload one part, returning (number, etag, md5 digest)."""
+        digest = hashlib.md5(data).digest()
+        for attempt in range(self.part_retries + 1):
+            try:
+                etag = client.upload_part(
+                    Bucket=self.bucket_name, Key=key, UploadId=upload_id, PartNumber=number, Body=data,
+                    ContentMD5=base64.b64encode(digest).decode())['ETag']
+                if not self.verify_etag or etag.strip('"') == digest.hex():
+                    return number, etag, digest
+                error = UploadError(f'ETag mismatch for part {number} of {key}')
+            except (BotoCoreError, ClientError) as e:
+                error = e
+            print(f'Part {number} of {key} failed (attempt {attempt + 1}): ', str(error))
+            if attempt < self.part_retries:
+                time.sleep(min(2 ** attempt, 10))
+        raise error
@@ -72,6 +72,42 @@ class VideoCreateSerializer(serializers.ModelSerializer):
         return value
 
 
+class VideoUploadCreateSerializer(serializers.Serializer):
+    MAX_SIZES = {
+        'file': (5 * 1024 * 1024 * 1024, "Video size should not exceed 5GB."),
+        'trailer': (1 * 1024 * 1024 * 1024, "Trailer size should not exceed 1GB."),
+    }
+
+    kind = serializers.ChoiceField(choices=['file', 'trailer'])
+    filename = serializers.CharField(max_length=150)
+    length = serializers.IntegerField(min_value=1)
+
+    def validate(self, attrs):
+        max_size, message = self.MAX_SIZES[attrs['kind']]
+        if attrs['length'] > max_size:
+            raise serializers.ValidationError({'length': message})
+        if attrs['filename'].split('.')[-1].strip() not in ('mp4', 'MP4'):
+            raise serializers.ValidationError({'filename': "Video format should be mp4."})
+        return attrs
+
+
+class VideoUploadFinalizeSerializer(VideoCreateSerializer):
+    file_upload = serializers.UUIDField()
+    trailer_upload = serializers.UUIDField()
+
+    class Meta:
+        model = Video
+        fields = (
+            'name',
+            'description',
+            'thumbnail',
+            'file_upload',
+            'trailer_upload',
+            'director',
+            'cast',
+        )
+
+
 class VideoListSerializer(serializers.ModelSerializer):
     class Meta:
         model = Video
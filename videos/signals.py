@@ -0,0 +1,37 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .catalog import invalidate_catalog
+from .images import schedule_renditions, rendition_names
+from .media import enqueue_deletion, enqueue_names
+from .models import Video, VideoTombstone, Carousel
+
+# Saves limited to these fields don't change what the catalog shows beyond its cache timeout.
+COUNTER_FIELDS = {'watch_count', 'watch_hours'}
+
+
+@receiver(post_save, sender=Video)
+def video_saved(sender, instance, update_fields=None, **kwargs):
+    if update_fields and set(update_fields) <= COUNTER_FIELDS:
+        return
+    schedule_renditions(instance)
+    invalidate_catalog()
+
+
+@receiver(post_save, sender=Carousel)
+def carousel_saved(sender, instance, **kwargs):
+    schedule_renditions(instance)
+
+
+@receiver(post_delete, sender=Video)
+def video_deleted(sender, instance, **kwargs):
+    VideoTombstone.objects.create(video_id=instance.id)
+    enqueue_deletion(instance.file, instance.trailer, instance.thumbnail)
+    enqueue_names(rendition_names(instance.renditions))
+    invalidate_catalog()
+
+
+@receiver(post_delete, sender=Carousel)
+def carousel_deleted(sender, instance, **kwargs):
+    enqueue_deletion(instance.image)
+    enqueue_names(rendition_names(instance.renditions))
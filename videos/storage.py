@@ -0,0 +1,10 @@
+from django.conf import settings
+from django.core.files.storage import default_storage
+
+
+def get_video_storage():
+    """Storage for Video.file and Video.trailer, picked by settings.VIDEO_STORAGE."""
+    if settings.VIDEO_STORAGE == 'parallel-s3':
+        from .s3_storage import ParallelS3Storage
+        return ParallelS3Storage()
+    return default_storage
@@ -0,0 +1,85 @@
+import logging
+import time
+
+from django.utils import timezone
+
+from .models import Order
+
+logger = logging.getLogger(__name__)
+
+
+def promote_queued(user_ids, now_date):
+    """
+    Move users whose current order ended on to their queued order, with one locked read, one
+    order query and one bulk update for the whole batch. Returns the number of users promoted.
+    """
+    from django.db import transaction
+    from users.models import User
+    from .utils import valid_subscription_orders, apply_entitlement
+
+    with transaction.atomic():
+        # Same lock as sync_subscription, re-checked so a concurrent order change isn't overwritten.
+        users = list(User.objects.select_for_update().filter(
+            id__in=user_ids, subscription_expires_at__lte=now_date, subscription_next_start__isnull=False))
+        if not users:
+            return 0
+
+        by_user = {}
+        for order in valid_subscription_orders([user.id for user in users], now_date):
+            by_user.setdefault(order.user_id, []).append(order)
+
+        keep_ids = []
+        for user in users:
+            keep_ids += apply_entitlement(user, by_user.get(user.id, []), now_date)
+        Order.objects.filter(user_id__in=[user.id for user in users], status='completed', is_active=True).exclude(
+            id__in=keep_ids).update(is_active=False)
+        User.objects.bulk_update(users, User.SUBSCRIPTION_FIELDS)
+    return len(users)
+
+
+def sweep_orders(batch_size=1000):
+    """
+    Promote queued orders and expire finished ones for all users, batch_size rows at a time,
+    so that subscription checks on the read path never have to write.
+    """
+    from users.models import User, CustomSession
+
+    started = time.monotonic()
+    now_date = timezone.now()
+    promoted = deactivated = cleared = 0
+
+    # Users whose current order ended while another one is queued behind it.
+    due = User.objects.filter(subscription_expires_at__lte=now_date, subscription_next_start__isnull=False)
+    last_pk = 0
+    while True:
+        pks = list(due.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            break
+        promoted += promote_queued(pks, now_date)
+        CustomSession.invalidate_users(pks)
+        last_pk = pks[-1]
+
+    expired = Order.objects.filter(is_active=True, expiration_date__lte=now_date)
+    while True:
+        pks = list(expired.values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            break
+        deactivated += Order.objects.filter(pk__in=pks).update(is_active=False)
+
+    lapsed = User.objects.filter(subscription_expires_at__lte=now_date, subscription_next_start__isnull=True)
+    while True:
+        pks = list(lapsed.values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            break
+        cleared += User.objects.filter(pk__in=pks).update(subscription_order=None, subscription_expires_at=None)
+        CustomSession.invalidate_users(pks)
+
+    metrics = {
+        'duration': round(time.monotonic() - started, 3),
+        'promoted': promoted,
+        'deactivated': deactivated,
+        'cleared': cleared,
+    }
+    logger.info('Order sweep: promoted=%(promoted)d deactivated=%(deactivated)d cleared=%(cleared)d '
+                'duration=%(duration)ss', metrics)
+    return metrics
@@ -1,3 +1,600 @@
-from django.test import TestCase
+import hashlib
+import io
+import os
+import struct
+import tempfile
+import threading
+from datetime import timedelta
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from payment.models import Transaction
+from users.models import User, CustomSession
+from .media import expire_uploads, process_deletions
+from .models import MediaDeletion, Order, Video, VideoUpload, WatchProgress
+from .mp4 import Mp4Error, S3RangeReader, StorageFileReader, get_duration, get_reader, probe
+from .sweeper import sweep_orders
+from .uploads import UploadConflict, claim, complete_upload, create_upload, write_chunk
+from .watch_events import aggregate_watch_hours
+
+try:
+    import boto3
+    from botocore.exceptions import ClientError
+    from moto import mock_aws
+except ImportError:
+    mock_aws = None
+
+# Orders seeded for the query plan checks; set HOT_QUERY_SEED_ORDERS=1000000 for a full-size run.
+SEED_ORDERS = int(os.environ.get('HOT_QUERY_SEED_ORDERS', 20000))
+
+
+class HotQueryPlanTests(TestCase):
+    """EXPLAIN the hot queries on a seeded dataset and check each one searches its index."""
+
+    @classmethod
+    def setUpTestData(cls):
+        now = timezone.now()
+        User.objects.bulk_create([
+            User(username=str(i), mobile_number=str(i)) for i in range(max(SEED_ORDERS // 10, 1))
+        ], batch_size=5000)
+        user_ids = list(User.objects.values_list('id', flat=True))
+
+        orders = []
+        for i in range(SEED_ORDERS):
+            completed = i % 3 != 0
+            start = now - timedelta(days=i % 400)
+            orders.append(Order(user_id=user_ids[i % len(user_ids)], subscription_amount=99,
+                                subscription_period='30', status='completed' if completed else 'pending',
+                                start_date=start if completed else None,
+                                expiration_date=start + timedelta(days=30) if completed else None,
+                                is_active=completed and i % 400 < 30))
+        Order.objects.bulk_create(orders, batch_size=5000)
+
+        order_ids = list(Order.objects.values_list('id', flat=True))
+        Transaction.objects.bulk_create([
+            Transaction(razorpay_order_id=f'order_{order_id}', amount=99, amount_due=99, amount_paid=0,
+                        created_at='0', currency='INR', entity='order', receipt=f'receipt_{order_id}',
+                        note_1='', note_2='', status='paid' if order_id % 5 else 'created', order_id=order_id)
+            for order_id in order_ids
+        ], batch_size=5000)
+        CustomSession.objects.bulk_create([
+            CustomSession(session_key=f'key{i}', session_data='', inactive_count=0,
+                          expire_date=now + timedelta(days=i % 300 - 3))
+            for i in range(SEED_ORDERS)
+        ], batch_size=5000)
+        # Mostly hidden videos: with nearly all visible, walking the primary key backwards is as good.
+        Video.objects.bulk_create([
+            Video(name=f'v{i}', description='', director='', cast='', view_on_app=i % 10 == 0)
+            for i in range(max(SEED_ORDERS // 50, 1))
+        ], batch_size=5000)
+
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        cls.user_id = user_ids[0]
+        cls.now = now
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = queryset.explain()
+        # SQLite: "SEARCH ... USING INDEX name"; PostgreSQL: "Index Scan using name", "Bitmap Index Scan on name".
+        self.assertIn(index_name, plan, f'{index_name} not used:\n{plan}')
+
+    def test_subscription_orders(self):
+        # videos.utils.sync_subscription
+        queryset = Order.objects.filter(user_id=self.user_id, status='completed', is_active=True,
+                                        start_date__isnull=False, expiration_date__gt=self.now)
+        self.assertUsesIndex(queryset.order_by('start_date', 'id'), 'order_user_subscription_idx')
+
+    def test_initiated_transactions(self):
+        # OrderCreateView: a payment initiated in the last ten minutes
+        queryset = Transaction.objects.filter(order__user_id=self.user_id, status='created',
+                                              timestamp__gte=self.now - timedelta(minutes=10))
+        self.assertUsesIndex(queryset, 'transaction_order_status_idx')
+
+    def test_expired_sessions(self):
+        # CustomSession.delete_expired_sessions
+        queryset = CustomSession.objects.filter(expire_date__lte=self.now - timedelta(days=1))
+        self.assertUsesIndex(queryset.values_list('pk', flat=True), 'session_expire_date_idx')
+
+    @skipUnless(connection.vendor == 'postgresql',
+                'SQLite keeps no value statistics, so it always estimates half the videos as visible.')
+    def test_app_video_list(self):
+        # VideoListAppView
+        queryset = Video.objects.filter(view_on_app=True).order_by('-id')[:20]
+        self.assertUsesIndex(queryset, 'video_app_list_idx')
+
+
+class OrderSweepTests(TestCase):
+
+    def test_promotes_and_clears_in_batches(self):
+        now = timezone.now()
+        day = timedelta(days=1)
+        queued_user = User.objects.create(username='q', mobile_number='1')
+        lapsed_user = User.objects.create(username='l', mobile_number='2')
+        # bulk_create skips Order.save, leaving the users as the last sync before expiry set them.
+        ended, current, following, lapsed = Order.objects.bulk_create([
+            Order(user=queued_user, subscription_amount=99, subscription_period='30', status='completed',
+                  start_date=now - 40 * day, expiration_date=now - 10 * day, is_active=True),
+            Order(user=queued_user, subscription_amount=99, subscription_period='30', status='completed',
+                  start_date=now - 10 * day, expiration_date=now + 20 * day, is_active=True),
+            Order(user=queued_user, subscription_amount=99, subscription_period='30', status='completed',
+                  start_date=now + 20 * day, expiration_date=now + 50 * day, is_active=True),
+            Order(user=lapsed_user, subscription_amount=99, subscription_period='30', status='completed',
+                  start_date=now - 40 * day, expiration_date=now - 10 * day, is_active=True),
+        ])
+        User.objects.filter(id=queued_user.id).update(
+            subscription_order=ended, subscription_expires_at=ended.expiration_date,
+            subscription_next_start=current.start_date, subscription_next_expires_at=following.expiration_date)
+        User.objects.filter(id=lapsed_user.id).update(subscription_order=lapsed,
+                                                      subscription_expires_at=lapsed.expiration_date)
+
+        metrics = sweep_orders(batch_size=1)
+        self.assertEqual((metrics['promoted'], metrics['deactivated'], metrics['cleared']), (1, 1, 1))
+
+        queued_user.refresh_from_db()
+        self.assertEqual(queued_user.subscription_order_id, current.id)
+        self.assertEqual(queued_user.subscription_expires_at, current.expiration_date)
+        self.assertEqual(queued_user.subscription_next_start, following.start_date)
+        self.assertEqual(queued_user.subscription_next_expires_at, following.expiration_date)
+        lapsed_user.refresh_from_db()
+        self.assertIsNone(lapsed_user.subscription_order_id)
+        self.assertEqual(set(Order.objects.filter(is_active=True).values_list('id', flat=True)),
+                         {current.id, following.id})
+
+
+class WatchHoursTests(TestCase):
+
+    def test_existing_hours_survive(self):
+        user = User.objects.create(username='u', mobile_number='1')
+        untouched = Video.objects.create(name='a', description='', director='', cast='', watch_hours=500,
+                                         watch_hours_baseline=500)
+        watched = Video.objects.create(name='b', description='', director='', cast='', watch_hours=100,
+                                       watch_hours_baseline=100)
+        WatchProgress.objects.create(user=user, video=watched, watched_seconds=60)
+
+        self.assertEqual(aggregate_watch_hours(), 1)
+        aggregate_watch_hours()
+        untouched.refresh_from_db()
+        watched.refresh_from_db()
+        self.assertEqual(untouched.watch_hours, 500)
+        self.assertEqual(watched.watch_hours, 160)
+
+
+PART_SIZE = 5 * 1024 * 1024  # The smallest part S3 accepts
+
+
+@skipUnless(mock_aws, 'boto3 and moto are required for the S3 tests.')
+@override_settings(VIDEO_S3_MULTIPART_THRESHOLD=PART_SIZE, VIDEO_S3_PART_SIZE=PART_SIZE, VIDEO_S3_MAX_WORKERS=3,
+                   VIDEO_S3_PART_RETRIES=2, VIDEO_S3_VERIFY_ETAG=True)
+class ParallelS3StorageTests(SimpleTestCase):
+    """ParallelS3Storage against moto's in-process S3."""
+    bucket = 'test-videos'
+
+    def setUp(self):
+        from .s3_storage import ParallelS3Storage
+
+        aws = mock_aws()
+        aws.start()
+        self.addCleanup(aws.stop)
+        boto3.client('s3', region_name='us-east-1').create_bucket(Bucket=self.bucket)
+
+        self.storage = ParallelS3Storage(bucket_name=self.bucket, region_name='us-east-1', access_key='testing',
+                                         secret_key='testing', file_overwrite=True)
+        self.client = self.storage.connection.meta.client
+        # Don't wait out the retry backoff.
+        sleep = mock.patch('videos.s3_storage.time.sleep')
+        sleep.start()
+        self.addCleanup(sleep.stop)
+        self.data = os.urandom(PART_SIZE * 2 + 1234)
+
+    def fail_calls(self, operation, count, handler):
+        """Run handler on the first count calls of operation; its return value is ignored."""
+        calls = []
+
+        def hook(**kwargs):
+            calls.append(kwargs)
+            if len(calls) <= count:
+                handler(**kwargs)
+
+        event = 'after-call' if operation.startswith('after:') else 'before-parameter-build'
+        self.client.meta.events.register(f'{event}.s3.{operation.removeprefix("after:")}', hook)
+        return calls
+
+    def stored(self, name):
+        return self.client.get_object(Bucket=self.bucket, Key=name)['Body'].read()
+
+    def assertNoPendingUploads(self):
+        self.assertEqual(self.client.list_multipart_uploads(Bucket=self.bucket).get('Uploads', []), [])
+
+    def test_multipart_upload(self):
+        name = self.storage.save('video/a.mp4', ContentFile(self.data))
+        self.assertEqual(self.stored(name), self.data)
+        digests = b''.join(hashlib.md5(self.data[offset:offset + PART_SIZE]).digest()
+                           for offset in range(0, len(self.data), PART_SIZE))
+        etag = self.client.head_object(Bucket=self.bucket, Key=name)['ETag']
+        self.assertEqual(etag, f'"{hashlib.md5(digests).hexdigest()}-3"')
+        self.assertNoPendingUploads()
+
+    def test_small_file_is_one_request(self):
+        calls = self.fail_calls('CreateMultipartUpload', 0, None)
+        name = self.storage.save('video/small.mp4', ContentFile(b'x' * 1024))
+        self.assertEqual(self.stored(name), b'x' * 1024)
+        self.assertEqual(calls, [])
+
+    def test_failed_part_is_retried(self):
+        def fail(**kwargs):
+            raise ClientError({'Error': {'Code': 'InternalError', 'Message': 'injected'}}, 'UploadPart')
+
+        calls = self.fail_calls('UploadPart', 2, fail)
+        name = self.storage.save('video/b.mp4', ContentFile(self.data))
+        self.assertEqual(self.stored(name), self.data)
+        self.assertEqual(len(calls), 5)
+
+    def test_part_etag_mismatch_is_retried(self):
+        def corrupt(parsed, **kwargs):
+            parsed['ETag'] = '"00000000000000000000000000000000"'
+
+        calls = self.fail_calls('after:UploadPart', 1, corrupt)
+        name = self.storage.save('video/c.mp4', ContentFile(self.data))
+        self.assertEqual(self.stored(name), self.data)
+        self.assertEqual(len(calls), 4)
+
+    def test_part_out_of_retries_aborts_upload(self):
+        from .s3_storage import UploadError
+
+        def corrupt(parsed, **kwargs):
+            parsed['ETag'] = '"00000000000000000000000000000000"'
+
+        self.fail_calls('after:UploadPart', 100, corrupt)
+        with self.assertRaises(UploadError):
+            self.storage.save('video/d.mp4', ContentFile(self.data))
+        self.assertNoPendingUploads()
+        self.assertFalse(self.storage.exists('video/d.mp4'))
+
+    def test_object_etag_mismatch_deletes_object(self):
+        from .s3_storage import UploadError
+
+        def corrupt(parsed, **kwargs):
+            parsed['ETag'] = '"00000000000000000000000000000000-3"'
+
+        self.fail_calls('after:CompleteMultipartUpload', 1, corrupt)
+        with self.assertRaises(UploadError):
+            self.storage.save('video/e.mp4', ContentFile(self.data))
+        self.assertFalse(self.storage.exists('video/e.mp4'))
+
+
+class ResumableUploadTests(TestCase):
+    """videos.uploads on the filesystem storage."""
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        media = override_settings(MEDIA_ROOT=media_root.name)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.data = os.urandom(3000)
+        self.upload = create_upload(VideoUpload(kind='file', name='videos/a.mp4', length=len(self.data)))
+
+    def write(self, start, end, expected=None):
+        return write_chunk(self.upload.id, start, end - start, io.BytesIO(self.data[start:end]), expected)
+
+    def stored(self):
+        with Video._meta.get_field('file').storage.open(self.upload.name) as f:
+            return f.read()
+
+    def test_chunks(self):
+        self.write(0, 1000)
+        with self.assertRaises(UploadConflict) as error:
+            self.write(0, 1000)
+        self.assertEqual((error.exception.status, error.exception.offset), (409, 1000))
+        upload = self.write(1000, 3000)
+        self.assertTrue(upload.is_complete())
+        complete_upload(upload)
+        self.assertEqual(self.stored(), self.data)
+
+    def test_checksum_mismatch(self):
+        self.write(0, 1000)
+        with self.assertRaises(UploadConflict) as error:
+            self.write(1000, 2000, expected=hashlib.sha256(b'other').digest())
+        self.assertEqual(error.exception.status, 400)
+        self.assertEqual(VideoUpload.objects.get(id=self.upload.id).offset, 1000)
+        self.assertEqual(self.stored(), self.data[:1000])
+        self.write(1000, 2000, expected=hashlib.sha256(self.data[1000:2000]).digest())
+
+    def test_lease(self):
+        claim(self.upload.id, 0)
+        with self.assertRaises(UploadConflict) as error:
+            self.write(0, 1000)
+        self.assertEqual(str(error.exception), 'Another chunk is being written.')
+
+        # The lease of a request that died runs out.
+        VideoUpload.objects.filter(id=self.upload.id).update(locked_until=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(self.write(0, 1000).offset, 1000)
+        self.assertIsNone(VideoUpload.objects.get(id=self.upload.id).locked_until)
+
+    def test_failed_write_releases_lease(self):
+        class Broken(io.BytesIO):
+            def read(self, size=-1):
+                raise OSError('connection reset')
+
+        with self.assertRaises(OSError):
+            write_chunk(self.upload.id, 0, 1000, Broken())
+        self.assertEqual(self.write(0, 1000).offset, 1000)
+
+
+@skipUnless(mock_aws, 'boto3 and moto are required for the S3 tests.')
+@override_settings(VIDEO_STORAGE='parallel-s3', VIDEO_S3_PART_RETRIES=0, VIDEO_S3_VERIFY_ETAG=True)
+class S3ResumableUploadTests(TestCase):
+    """videos.uploads with every chunk sent as a part of an S3 multipart upload."""
+    bucket = 'test-videos'
+
+    def setUp(self):
+        from .s3_storage import ParallelS3Storage
+
+        aws = mock_aws()
+        aws.start()
+        self.addCleanup(aws.stop)
+        boto3.client('s3', region_name='us-east-1').create_bucket(Bucket=self.bucket)
+        self.storage = ParallelS3Storage(bucket_name=self.bucket, region_name='us-east-1', access_key='testing',
+                                         secret_key='testing', file_overwrite=True)
+        self.client = self.storage.connection.meta.client
+        field = mock.patch.object(Video._meta.get_field('file'), 'storage', self.storage)
+        field.start()
+        self.addCleanup(field.stop)
+
+        self.data = os.urandom(PART_SIZE + 1234)
+        self.upload = create_upload(VideoUpload(kind='file', name='videos/a.mp4', length=len(self.data)))
+
+    def write(self, start, end):
+        return write_chunk(self.upload.id, start, end - start, io.BytesIO(self.data[start:end]))
+
+    def test_chunks_become_parts(self):
+        with self.assertRaises(UploadConflict) as error:
+            self.write(0, 1000)
+        self.assertEqual(error.exception.status, 400)
+
+        self.write(0, PART_SIZE)
+        upload = self.write(PART_SIZE, len(self.data))
+        self.assertEqual(len(upload.storage_state['parts']), 2)
+        complete_upload(upload)
+        self.assertEqual(self.client.get_object(Bucket=self.bucket, Key='videos/a.mp4')['Body'].read(), self.data)
+
+    def test_expiry_aborts_the_multipart_upload(self):
+        self.write(0, PART_SIZE)
+        VideoUpload.objects.filter(id=self.upload.id).update(created_at=timezone.now() - timedelta(days=30))
+        self.assertEqual(expire_uploads(), ['videos/a.mp4'])
+        self.assertEqual(self.client.list_multipart_uploads(Bucket=self.bucket).get('Uploads', []), [])
+
+
+class VideoSyncTests(TestCase):
+
+    def setUp(self):
+        from .catalog import invalidate_catalog
+
+        self.videos = [Video.objects.create(name=name, description='', director='', cast='', view_on_app=True)
+                       for name in 'abcd']
+        # Changed well before the first sync, outside APP_VIDEO_SYNC_OVERLAP.
+        Video.objects.update(updated_at=timezone.now() - timedelta(hours=1))
+        invalidate_catalog()
+
+    def sync(self, token=None):
+        from rest_framework.test import APIRequestFactory
+        from .views.mobile_app import VideoSyncAppView
+
+        request = APIRequestFactory().get('/api/videos/app-video-sync/', {'token': token} if token else {})
+        response = VideoSyncAppView.as_view()(request)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_first_sync_resets(self):
+        from users.utils import decode_cursor
+        from .catalog import get_catalog
+
+        data = self.sync()
+        self.assertTrue(data['reset'])
+        self.assertEqual([item['id'] for item in data['updated']], [video.id for video in reversed(self.videos)])
+        since = get_catalog().built_at - timedelta(seconds=settings.APP_VIDEO_SYNC_OVERLAP)
+        self.assertEqual(decode_cursor(data['token'])['t'], since.isoformat())
+
+    def test_delta(self):
+        a, b, c, d = self.videos
+        token = self.sync()['token']
+
+        a.name = 'renamed'
+        a.save()
+        b.view_on_app = False
+        b.save()
+        deleted_id = c.id
+        c.delete()
+
+        data = self.sync(token)
+        self.assertFalse(data['reset'])
+        self.assertEqual([item['name'] for item in data['updated']], ['renamed'])
+        self.assertEqual(data['hidden'], [b.id])
+        self.assertEqual(data['deleted'], [deleted_id])
+        self.assertNotIn(d.id, [item['id'] for item in data['updated']])
+
+    def test_change_committed_during_the_sync_is_sent_again(self):
+        from .catalog import get_catalog
+
+        token = self.sync()['token']
+        # Written just before the snapshot was read, but committed after it.
+        Video.objects.filter(id=self.videos[3].id).update(updated_at=get_catalog().built_at - timedelta(seconds=1))
+        self.assertEqual([item['id'] for item in self.sync(token)['updated']], [self.videos[3].id])
+
+    def test_unreadable_token_resets(self):
+        data = self.sync('not-a-token')
+        self.assertTrue(data['reset'])
+        self.assertEqual(len(data['updated']), 4)
+
+
+def box(box_type, *children):
+    payload = b''.join(children)
+    return struct.pack('>I4s', 8 + len(payload), box_type) + payload
+
+
+def track(handler, codec, duration, width=0, height=0):
+    tkhd = bytes(76) + struct.pack('>II', width << 16, height << 16)
+    mdhd = bytes(12) + struct.pack('>II', 1000, duration) + bytes(4)
+    stsd = struct.pack('>II', 0, 1) + struct.pack('>I4s', 16, codec) + bytes(8)
+    return box(b'trak', box(b'tkhd', tkhd), box(b'mdia', box(b'mdhd', mdhd),
+                                                 box(b'hdlr', bytes(8) + handler + bytes(12)),
+                                                 box(b'minf', box(b'stbl', box(b'stsd', stsd)))))
+
+
+def mp4(seconds=90, media_size=1024 * 1024, mvhd_version=0):
+    """ftyp, then the media data, then moov, as written by encoders that don't move moov to the front."""
+    if mvhd_version == 1:
+        mvhd = b'\x01' + bytes(19) + struct.pack('>IQ', 600, seconds * 600) + bytes(80)
+    else:
+        mvhd = bytes(12) + struct.pack('>II', 600, seconds * 600) + bytes(80)
+    # 64-bit size, as used for media data over 4 GB.
+    mdat = struct.pack('>I4sQ', 1, b'mdat', 16 + media_size) + bytes(media_size)
+    moov = box(b'moov', box(b'mvhd', mvhd), track(b'vide', b'avc1', seconds * 1000, 1920, 1080),
+               track(b'soun', b'mp4a', seconds * 1000))
+    return box(b'ftyp', b'isom' + bytes(4)) + mdat + moov
+
+
+class BytesReader:
+    def __init__(self, data):
+        self.data = data
+        self.size = len(data)
+        self.bytes_read = 0
+
+    def read_at(self, offset, size):
+        chunk = self.data[offset:offset + size]
+        self.bytes_read += len(chunk)
+        return chunk
+
+    def close(self):
+        pass
+
+
+class Mp4Tests(SimpleTestCase):
+
+    def test_probe(self):
+        data = mp4()
+        metadata = probe(BytesReader(data))
+        self.assertEqual(metadata['duration_ms'], 90000)
+        self.assertEqual((metadata['width'], metadata['height']), (1920, 1080))
+        self.assertEqual((metadata['video_codec'], metadata['audio_codec']), ('avc1', 'mp4a'))
+        self.assertEqual(metadata['bitrate'], len(data) * 8 // 90)
+
+    def test_media_data_is_skipped(self):
+        reader = BytesReader(mp4(media_size=64 * 1024 * 1024))
+        self.assertEqual(probe(reader)['duration_ms'], 90000)
+        self.assertLess(reader.bytes_read, 1024 * 1024)
+
+    def test_64_bit_durations(self):
+        self.assertEqual(probe(BytesReader(mp4(seconds=7200, mvhd_version=1)))['duration_ms'], 7200000)
+
+    def test_invalid_files(self):
+        with self.assertRaises(Mp4Error):
+            probe(BytesReader(box(b'ftyp', b'isom' + bytes(4))))
+        with self.assertRaises(Mp4Error):
+            probe(BytesReader(struct.pack('>I4s', 4096, b'moov') + bytes(100)))
+
+    def test_get_duration(self):
+        from django.core.files.storage import FileSystemStorage
+
+        with tempfile.TemporaryDirectory() as root:
+            storage = FileSystemStorage(location=root)
+            video = Video(file=storage.save('videos/a.mp4', ContentFile(mp4(seconds=42))))
+            video.file.storage = storage
+            self.assertEqual(get_duration(video.file), 42)
+
+            video.file.name = storage.save('videos/b.mp4', ContentFile(b'not an mp4'))
+            self.assertIsNone(get_duration(video.file))
+
+    def test_storage_file_reader(self):
+        from django.core.files.storage import InMemoryStorage
+
+        storage = InMemoryStorage()
+        reader = StorageFileReader(storage, storage.save('videos/a.mp4', ContentFile(mp4(seconds=42))))
+        try:
+            self.assertEqual(probe(reader)['duration_ms'], 42000)
+        finally:
+            reader.close()
+
+    @skipUnless(mock_aws, 'moto is not installed')
+    def test_s3_reads_are_ranged(self):
+        from .s3_storage import ParallelS3Storage
+
+        with mock_aws():
+            storage = ParallelS3Storage(bucket_name='media', access_key='a', secret_key='b', region_name='us-east-1')
+            storage.connection.meta.client.create_bucket(Bucket='media')
+            name = storage.save('videos/a.mp4', ContentFile(mp4(media_size=16 * 1024 * 1024)))
+            video = Video(file=name)
+            video.file.storage = storage
+
+            reader = get_reader(video.file)
+            self.assertIsInstance(reader, S3RangeReader)
+            with mock.patch.object(reader, 'read_at', wraps=reader.read_at) as read_at:
+                self.assertEqual(probe(reader)['duration_ms'], 90000)
+            self.assertLess(sum(call.args[1] for call in read_at.call_args_list), 1024 * 1024)
+
+
+class MediaDeletionTests(TestCase):
+
+    def process(self, delete):
+        storage = mock.Mock()
+        storage.delete.side_effect = delete
+        with mock.patch('videos.media.get_storage', return_value=storage):
+            return process_deletions(batch_size=2)
+
+    def test_rows_are_claimed_before_the_storage_call(self):
+        MediaDeletion.objects.bulk_create([MediaDeletion(name=f'thumbnails/{i}.jpg') for i in range(3)])
+
+        def delete(name):
+            # Another worker polling now finds nothing due in this batch.
+            row = MediaDeletion.objects.get(name=name)
+            self.assertGreater(row.next_attempt_at, timezone.now() + timedelta(minutes=5))
+
+        self.assertEqual(self.process(delete), (3, 0))
+        self.assertFalse(MediaDeletion.objects.exists())
+
+    def test_failed_delete_is_retried_later(self):
+        MediaDeletion.objects.create(name='thumbnails/a.jpg')
+
+        def delete(name):
+            raise OSError('storage is down')
+
+        self.assertEqual(self.process(delete), (0, 1))
+        row = MediaDeletion.objects.get()
+        self.assertEqual((row.attempts, row.last_error), (1, 'storage is down'))
+        self.assertGreater(row.next_attempt_at, timezone.now())
+        self.assertEqual(self.process(delete), (0, 0))
+
+
+@override_settings(IMAGE_RENDITION_WORKERS=1)
+class RenditionTests(TestCase):
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root.name))
+
+    def test_results_are_stored_off_the_result_thread(self):
+        from PIL import Image
+        from django.core.files.storage import default_storage
+        from . import images
+
+        buffer = io.BytesIO()
+        Image.new('RGB', (400, 300)).save(buffer, format='JPEG')
+        source = default_storage.save('thumbnails/a.jpg', ContentFile(buffer.getvalue()))
+
+        stored = threading.Event()
+        threads = []
+
+        def store(model, pk, source, files, lqip):
+            threads.append(threading.current_thread().name)
+            stored.set()
+
+        with mock.patch.object(images, 'store', side_effect=store):
+            images.submit(Video, 1, source).result(timeout=60)
+            self.assertTrue(stored.wait(10))
+        self.assertTrue(threads[0].startswith('renditions-store'))
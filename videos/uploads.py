@@ -0,0 +1,226 @@
+import hashlib
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+# S3 rejects multipart parts smaller than this, except for the last one.
+S3_MIN_PART_SIZE = 5 * 1024 * 1024
+
+
+class UploadConflict(Exception):
+    """A chunk or finalize request that can't be applied; carries the HTTP status and current offset."""
+
+    def __init__(self, message, status=409, offset=None):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+        self.offset = offset
+
+
+def copy_chunk(source, length, write):
+    """Copy up to length bytes of source to write() in VIDEO_UPLOAD_READ_SIZE pieces. Returns the sha256."""
+    digest = hashlib.sha256()
+    remaining = length
+    while remaining > 0:
+        chunk = source.read(min(settings.VIDEO_UPLOAD_READ_SIZE, remaining))
+        if not chunk:
+            break
+        write(chunk)
+        digest.update(chunk)
+        remaining -= len(chunk)
+    return digest
+
+
+class LocalWriter:
+    """Writes chunks in place into the final file of a filesystem storage."""
+
+    def __init__(self, storage):
+        self.storage = storage
+        self.path = storage.path
+
+    def start(self, upload):
+        path = self.path(upload.name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        open(path, 'xb').close()
+        return {}
+
+    def write(self, upload, offset, length, source, expected):
+        with open(self.path(upload.name), 'r+b') as f:
+            f.seek(offset)
+            digest = copy_chunk(source, length, f.write)
+            if expected is not None and digest.digest() != expected:
+                f.truncate(offset)
+                raise UploadConflict('Checksum mismatch.', status=400, offset=offset)
+            # Drops bytes left past the new end by an earlier failed chunk.
+            f.truncate()
+            return f.tell(), digest, upload.storage_state
+
+    def complete(self, upload):
+        return upload.storage_state
+
+    def abort(self, upload):
+        # The file itself is queued for deletion with the other media.
+        pass
+
+
+class S3Writer:
+    """
+    Sends every chunk as the next part of an S3 multipart upload, completed on finalize, so no
+    request needs the earlier chunks. Chunks other than the last must be S3_MIN_PART_SIZE or more.
+    """
+
+    def __init__(self, storage):
+        from storages.utils import clean_name
+
+        self.storage = storage
+        self.client = storage.connection.meta.client
+        self.clean_name = clean_name
+
+    def key(self, upload):
+        return self.storage._normalize_name(self.clean_name(upload.name))
+
+    def start(self, upload):
+        key = self.key(upload)
+        params = self.storage._get_write_parameters(key)
+        response = self.client.create_multipart_upload(Bucket=self.storage.bucket_name, Key=key, **params)
+        return {'upload_id': response['UploadId'], 'parts': []}
+
+    def write(self, upload, offset, length, source, expected):
+        if length < S3_MIN_PART_SIZE and offset + length < upload.length:
+            raise UploadConflict('Chunks before the last one must be at least 5 MB.', status=400, offset=offset)
+        data = bytearray()
+        digest = copy_chunk(source, length, data.extend)
+        if len(data) != length:
+            # A short part in the middle would only fail when the upload is completed.
+            raise UploadConflict('Incomplete chunk.', status=400, offset=offset)
+        if expected is not None and digest.digest() != expected:
+            raise UploadConflict('Checksum mismatch.', status=400, offset=offset)
+
+        state = upload.storage_state
+        # A retried chunk comes back with the same part number and replaces the failed attempt.
+        number = len(state['parts']) + 1
+        _, etag, md5 = self.storage._upload_part(self.client, self.key(upload), state['upload_id'], number,
+                                                 bytes(data))
+        return offset + len(data), digest, dict(state, parts=state['parts'] + [[number, etag, md5.hex()]])
+
+    def complete(self, upload):
+        state = upload.storage_state
+        if state.get('completed'):
+            return state
+        key = self.key(upload)
+        results = [(number, etag, bytes.fromhex(md5)) for number, etag, md5 in state['parts']]
+        response = self.storage._complete_parts(self.client, key, state['upload_id'], results)
+        self.storage._check_etag(self.client, key, response, results)
+        return dict(state, completed=True)
+
+    def abort(self, upload):
+        from botocore.exceptions import ClientError
+
+        state = upload.storage_state
+        if state.get('upload_id') and not state.get('completed'):
+            try:
+                self.client.abort_multipart_upload(Bucket=self.storage.bucket_name, Key=self.key(upload),
+                                                   UploadId=state['upload_id'])
+            except ClientError as e:
+                print(f'Could not abort the multipart upload of {upload.name}: ', str(e))
+
+
+def get_writer(kind):
+    """Chunk writer for the storage of Video.<kind>. Raises NotImplementedError for other storages."""
+    from .models import Video
+
+    storage = Video._meta.get_field(kind).storage
+    if settings.VIDEO_STORAGE == 'parallel-s3':
+        return S3Writer(storage)
+    storage.path('')
+    return LocalWriter(storage)
+
+
+def claim(upload_id, offset):
+    """
+    Take the upload's lease for a request at offset with one conditional UPDATE, so chunks of an
+    upload are serialised across hosts without holding a transaction while they stream. Returns
+    the lease, which the holder passes to release() or to its final UPDATE.
+    """
+    from .models import VideoUpload
+
+    now = timezone.now()
+    lease = now + timedelta(seconds=settings.VIDEO_UPLOAD_LOCK_TIMEOUT)
+    claimed = VideoUpload.objects.filter(Q(locked_until__isnull=True) | Q(locked_until__lt=now), id=upload_id,
+                                         offset=offset, completed_at__isnull=True).update(locked_until=lease)
+    if claimed:
+        return lease
+
+    upload = VideoUpload.objects.filter(id=upload_id).first()
+    if upload is None:
+        raise UploadConflict('Upload ID does not exist.', status=404)
+    if upload.completed_at is not None:
+        raise UploadConflict('Upload is already finalized.', offset=upload.offset)
+    if upload.offset != offset:
+        raise UploadConflict('Offset mismatch.', offset=upload.offset)
+    raise UploadConflict('Another chunk is being written.', offset=upload.offset)
+
+
+def release(upload_id, lease):
+    from .models import VideoUpload
+    VideoUpload.objects.filter(id=upload_id, locked_until=lease).update(locked_until=None)
+
+
+def create_upload(upload):
+    """Reserve the storage name of an unsaved VideoUpload and save it."""
+    upload.storage_state = get_writer(upload.kind).start(upload)
+    upload.save()
+    return upload
+
+
+def write_chunk(upload_id, offset, length, source, expected=None):
+    """Append length bytes of source at offset, checked against the expected sha256 if given."""
+    from .models import VideoUpload
+
+    upload = VideoUpload.objects.filter(id=upload_id).first()
+    if upload is None:
+        raise UploadConflict('Upload ID does not exist.', status=404)
+    if offset + length > upload.length:
+        raise UploadConflict('Chunk exceeds the upload length.', status=400, offset=upload.offset)
+
+    lease = claim(upload_id, offset)
+    try:
+        # Only the lease holder moves the offset, so this read can't change under us.
+        upload.refresh_from_db()
+        new_offset, digest, state = get_writer(upload.kind).write(upload, offset, length, source, expected)
+        checksum = hashlib.sha256((upload.checksum + digest.hexdigest()).encode()).hexdigest()
+        # Fails if the lease ran out and another request took over, or the upload expired.
+        updated = VideoUpload.objects.filter(id=upload.id, locked_until=lease, completed_at__isnull=True).update(
+            offset=new_offset, checksum=checksum, storage_state=state, locked_until=None)
+    except BaseException:
+        release(upload_id, lease)
+        raise
+    if not updated:
+        raise UploadConflict('Upload changed while the chunk was written.')
+    upload.offset, upload.checksum, upload.storage_state = new_offset, checksum, state
+    return upload
+
+
+def complete_upload(upload):
+    """Make a fully written upload readable at its name, e.g. complete the S3 multipart upload."""
+    from .models import VideoUpload
+
+    lease = claim(upload.id, upload.length)
+    try:
+        upload.refresh_from_db()
+        state = get_writer(upload.kind).complete(upload)
+        VideoUpload.objects.filter(id=upload.id, locked_until=lease).update(storage_state=state, locked_until=None)
+    except BaseException:
+        release(upload.id, lease)
+        raise
+    upload.storage_state = state
+    return upload
+
+
+def abort_uploads(uploads):
+    """Free the storage side of dropped uploads, e.g. the parts of unfinished S3 multipart uploads."""
+    for upload in uploads:
+        get_writer(upload.kind).abort(upload)
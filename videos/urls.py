@@ -17,6 +17,9 @@ urlpatterns = [
 
     # Video
     path('video-create/', VideoCreateView.as_view(), name='video-create'),
+    path('video-upload/', VideoUploadView.as_view(), name='video-upload'),
+    path('video-upload/finalize/', VideoUploadFinalizeView.as_view(), name='video-upload-finalize'),
+    path('video-upload/<uuid:upload_id>/', VideoUploadView.as_view(), name='video-upload-detail'),
     path('video-list/', VideoListView.as_view(), name='video-list'),
     path('video-delete/', VideoDeleteView.as_view(), name='video-delete'),
 ]
@@ -26,11 +29,14 @@ urlpatterns += [
     path('app-subscription-plan/list/', subscription_plan_app_list, name='app-subscription-plan-list'),
 
     path('app-video-list/', VideoListAppView.as_view(), name='app-video-list'),
+    path('app-video-sync/', VideoSyncAppView.as_view(), name='app-video-sync'),
     path('app-order-create/', OrderCreateView.as_view(), name='app-order-create'),
     path('app-order-list/', OrderListView.as_view(), name='app-order-list'),
     path('app-check-subscription/', CheckSubscriptionView.as_view(), name='app-check-subscription'),
     path('app-subscription-create/', SubscriptionView.as_view(), name='app-subscription-create'),
     path('app-video-play/', VideoPlayView.as_view(), name='app-video-play'),
+    path('app-video-heartbeat/', VideoHeartbeatView.as_view(), name='app-video-heartbeat'),
+    path('app-continue-watching/', ContinueWatchingView.as_view(), name='app-continue-watching'),
     path('app-transaction-history/', TransactionHistoryView.as_view(), name='app-transaction-history'),
     # test
     path('app-change-order-period/', ChangeSubscriptionPeriod.as_view(), name='app-change-order-period'),
@@ -16,60 +16,146 @@ def get_expiry_date(date, period):
     return exp_date
 
 
-def get_order(order):
-    start_date = order.start_date.astimezone() if order.start_date else ''
-    expiration_date = order.expiration_date.astimezone() if order.expiration_date else ''
+def split_date_time(value):
+    if not value:
+        return '', ''
+    return value.astimezone().strftime("%d/%m/%Y|%H:%M%p").split('|')
+
+
+def get_order(order, user=None):
+    user = user or order.user
+    start_date, start_time = split_date_time(order.start_date)
+    expiration_date, expiration_time = split_date_time(order.expiration_date)
     return {
         "id": order.id,
-        "user": order.user.get_full_name(),
+        "user": user.get_full_name(),
         "subscription_amount": order.subscription_amount,
         "subscription_period": order.subscription_period,
         "status": order.status,
         "created_at": order.created_at.strftime("%d %m %Y"),
-        "start_date": start_date.strftime("%d/%m/%Y") if order.start_date else '',
-        "start_time": start_date.strftime("%H:%M%p") if order.start_date else '',
-        "expiration_date": expiration_date.strftime("%d/%m/%Y") if order.expiration_date else '',
-        "expiration_time": expiration_date.strftime("%H:%M%p") if order.expiration_date else '',
+        "start_date": start_date,
+        "start_time": start_time,
+        "expiration_date": expiration_date,
+        "expiration_time": expiration_time,
         "is_active": order.is_active,
     }
 
 
-def get_orders(user):
-    orders1 = Order.objects.filter(user=user, status='completed').order_by('-start_date')
-    orders2 = Order.objects.filter(user=user).exclude(status='completed').order_by('-created_at')
-    # orders = orders1.union(orders2).order_by('-start_date')
-    orders = [get_order(order) for order in orders1] + [get_order(order) for order in orders2]
+def get_order_history(user):
+    """
+    All orders of the user in one query: completed ones first by start date, then the rest
+    by creation date, newest first.
+    """
+    from django.db.models import Case, When, Value, F, IntegerField
 
-    return orders
+    orders = Order.objects.filter(user=user).only(
+        'id', 'subscription_amount', 'subscription_period', 'status', 'created_at',
+        'start_date', 'expiration_date', 'is_active',
+    ).annotate(
+        group=Case(When(status='completed', then=Value(0)), default=Value(1), output_field=IntegerField()),
+        sort_date=Case(When(status='completed', then=F('start_date')), default=F('created_at')),
+    )
+    return orders.order_by('group', F('sort_date').desc(nulls_last=True), '-id')
 
 
-def subscription_exists(user):
-    from .models import Order
+def get_orders(user):
+    return [get_order(order, user) for order in get_order_history(user)]
+
+
+def get_orders_page(user, cursor=None, per_page=10):
+    """
+    One page of get_orders() plus the cursor of the next page ('' on the last one).
+    Raises ValueError, KeyError or TypeError for a malformed cursor.
+    """
+    from datetime import datetime
+    from django.db.models import Q
+    from users.utils import encode_cursor, decode_cursor
+
+    orders = get_order_history(user)
+    if cursor:
+        cursor = decode_cursor(cursor)
+        group, last_id = int(cursor['g']), int(cursor['id'])
+        after = Q(group__gt=group)
+        if cursor['d'] is None:
+            after |= Q(group=group, sort_date__isnull=True, id__lt=last_id)
+        else:
+            sort_date = datetime.fromisoformat(cursor['d'])
+            after |= Q(group=group, sort_date__lt=sort_date) | Q(group=group, sort_date=sort_date, id__lt=last_id)
+            after |= Q(group=group, sort_date__isnull=True)
+        orders = orders.filter(after)
+
+    orders = list(orders[:per_page + 1])
+    next_cursor = ''
+    if len(orders) > per_page:
+        orders = orders[:per_page]
+        last = orders[-1]
+        next_cursor = encode_cursor({
+            'g': last.group,
+            'd': last.sort_date.isoformat() if last.sort_date else None,
+            'id': last.id,
+        })
+    return [get_order(order, user) for order in orders], next_cursor
+
+
+def valid_subscription_orders(user_ids, now_date):
+    return (Order.objects.filter(user_id__in=user_ids, status='completed', is_active=True,
+                                 start_date__isnull=False, expiration_date__gt=now_date)
+            .order_by('start_date', 'id'))
+
+
+def apply_entitlement(user, valid_orders, now_date):
+    """
+    Set the user's entitlement fields from their valid orders, sorted by start date, and return
+    the ids of the orders to keep active.
+
+    The current order is the earliest running one, or else the earliest upcoming one. Orders
+    starting after it ends stay active as the queue; every other completed order is deactivated.
+    """
+    curr_order = next((o for o in valid_orders if o.start_date <= now_date), None)
+    if curr_order is None and valid_orders:
+        curr_order = valid_orders[0]
+
+    queued = [o for o in valid_orders if curr_order and o.start_date >= curr_order.expiration_date]
+
+    user.subscription_order = curr_order
+    user.subscription_expires_at = curr_order.expiration_date if curr_order else None
+    user.subscription_next_start = queued[0].start_date if queued else None
+    # Queued orders that follow on without a gap extend one run of entitlement.
+    chain_end = None
+    for order in queued:
+        if chain_end is not None and order.start_date > chain_end:
+            break
+        chain_end = max(order.expiration_date, chain_end or order.expiration_date)
+    user.subscription_next_expires_at = chain_end
+    return [o.id for o in queued] + ([curr_order.id] if curr_order else [])
+
+
+def sync_subscription(user):
+    """
+    Recompute the user's entitlement from their orders and store it on the user row.
+    Called when an order changes, never on the read path; the order sweeper does the same
+    for many users at once.
+    """
+    from django.db import transaction
+    from users.models import User, CustomSession
 
-    orders = Order.objects.filter(user=user, status='completed')
     now_date = timezone.now()
-    current_orders = orders.filter(start_date__lte=now_date, expiration_date__gt=now_date, is_active=True)
-    later_orders = orders.filter(start_date__gte=now_date, expiration_date__gt=now_date, is_active=True)
-
-    curr_order = None
-    if current_orders.exists():
-        curr_order = current_orders.earliest('start_date')
-
-    elif later_orders.exists():
-        curr_order = later_orders.earliest('start_date')
+    with transaction.atomic():
+        # Serialises concurrent order changes for the same user.
+        User.objects.select_for_update().filter(id=user.id).exists()
 
-    if curr_order:
-        curr_order.is_active = True
-        curr_order.save()
-        orders.exclude(id=curr_order.id).update(is_active=False)
-        return True
+        keep_ids = apply_entitlement(user, list(valid_subscription_orders([user.id], now_date)), now_date)
+        Order.objects.filter(user_id=user.id, status='completed', is_active=True).exclude(
+            id__in=keep_ids).update(is_active=False)
+        fields = {field: getattr(user, field) for field in User.SUBSCRIPTION_FIELDS}
+        User.objects.filter(id=user.id).update(**fields)
 
-    if orders.exists():
-        orders.update(is_active=False)
-    return False
+    CustomSession.invalidate_user(user.id)
+    return user.subscription_order is not None
 
 
 def get_video(video, app=None):
+    from .images import get_renditions
     # if app is True:
     #     file = video.file.url if video.file else ''
         # trailer = 'https://s3.ap-south-1.amazonaws.com/4handstudio.in/videos/web+1920x1080.mp4'
@@ -81,6 +167,7 @@ def get_video(video, app=None):
         "name": video.name,
         "description": video.description,
         "thumbnail": video.thumbnail.url if video.thumbnail else '',
+        "thumbnail_renditions": get_renditions(video),
         "trailer": video.trailer.url if video.trailer else '',
         "file": video.file.url if video.file else '',
         "director": video.director,
@@ -103,7 +190,6 @@ def get_hours(sec):
     sec = float(sec)
     mint = sec / 60
     hr = mint / 60
-    print(sec, mint, hr)
     if hr >= 1:
         output = f'{rounded(hr)} hours'
     elif mint >= 1:
@@ -16,10 +16,18 @@ def carousel_create(request):
         images = serializer.validated_data.get('image')
         print('images = ', images)
 
+        from django.db import transaction
         carousel_objs = [Carousel(image=image) for image in images]
 
-        Carousel.objects.all().delete()
-        Carousel.objects.bulk_create(carousel_objs)
+        # The old images are queued for deletion by the post_delete signal.
+        with transaction.atomic():
+            Carousel.objects.all().delete()
+            Carousel.objects.bulk_create(carousel_objs)
+
+            # bulk_create doesn't send post_save
+            from ..images import schedule_renditions
+            for carousel in carousel_objs:
+                schedule_renditions(carousel)
 
         data = {'message': 'Carousel created successfully.'}
         return add_success_response(data, status=status.HTTP_201_CREATED)
@@ -31,7 +39,12 @@ def carousel_create(request):
 
 @api_view(['GET'])
 def carousel_list(request):
+    from ..images import get_renditions
     carousel = Carousel.objects.all()
-    data = {'data': [c.image.url for c in carousel]}
+    data = {
+        'data': [c.image.url for c in carousel],
+        # Same order as data; each is {} until its renditions are generated.
+        'renditions': [get_renditions(c) for c in carousel]
+    }
     return add_success_response(data, status=status.HTTP_200_OK)
 
@@ -17,20 +17,86 @@ from django.conf import settings
 
 class VideoListAppView(APIView):
     def get(self, request):
-        # user = request.customuser
-        # get = request.GET.get
-        # page = get('page', 1)
-        # per_page = get('per_page', 12)
+        from django.http import HttpResponse, HttpResponseNotModified
+        from django.utils.http import parse_etags
+        from ..catalog import get_catalog
 
+        cursor = request.GET.get('cursor')
+        per_page = request.GET.get('per_page')
+        if cursor or per_page or not settings.APP_VIDEO_LIST_FULL_RESPONSE:
+            return self.get_page(cursor, per_page)
+
+        snapshot = get_catalog()
+
+        if_none_match = parse_etags(request.META.get('HTTP_IF_NONE_MATCH', ''))
+        if snapshot.etag in if_none_match or '*' in if_none_match:
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(snapshot.body, content_type='application/json')
+        response['ETag'] = snapshot.etag
+        return response
+
+    def get_page(self, cursor, per_page):
+        """Keyset page on -id, so the cost of a page doesn't depend on its position."""
+        from users.utils import encode_cursor, decode_cursor, get_page_size
+
+        per_page = get_page_size(per_page, default=settings.APP_VIDEO_PAGE_SIZE,
+                                 maximum=settings.APP_VIDEO_PAGE_SIZE_MAX)
         videos = Video.objects.filter(view_on_app=True).order_by('-id')
-        # data = get_paginated_list(videos, page, per_page)
-        # serializer = VideoListSerializer(data['data'], many=True)
-        # data['data'] = serializer.data
-        # data['data'] = [get_video(i) for i in data['data']]
-        data = {
-            "data": [get_video(i) for i in videos]
-        }
+        if cursor:
+            try:
+                videos = videos.filter(id__lt=int(decode_cursor(cursor)['id']))
+            except (ValueError, KeyError, TypeError):
+                return add_error_response({'message': 'Invalid cursor'}, status=400)
+
+        videos = list(videos[:per_page + 1])
+        next_cursor = ''
+        if len(videos) > per_page:
+            videos = videos[:per_page]
+            next_cursor = encode_cursor({'id': videos[-1].id})
+        return add_success_response({'data': [get_video(i) for i in videos], 'next_cursor': next_cursor})
 
+
+class VideoSyncAppView(APIView):
+    """
+    Delta sync of the app catalog. Without a token (or with an unreadable one) the client gets
+    every visible video and 'reset': true; with the token from its previous sync it only gets
+    the videos changed, hidden or deleted since then. Either way it gets a new token.
+    """
+
+    def get(self, request):
+        from datetime import datetime, timedelta
+        from users.utils import encode_cursor, decode_cursor
+        from ..catalog import get_catalog
+        from ..models import VideoTombstone
+
+        now = timezone.now()
+        since = None
+        token = request.GET.get('token')
+        if token:
+            try:
+                since = datetime.fromisoformat(decode_cursor(token)['t'])
+            except (ValueError, KeyError, TypeError):
+                since = None
+
+        if since is None:
+            snapshot = get_catalog()
+            # The snapshot may be older than this request; later changes come in the next delta.
+            now = snapshot.built_at
+            data = {'reset': True, 'updated': snapshot.data, 'hidden': [], 'deleted': []}
+        else:
+            changed = Video.objects.filter(updated_at__gt=since).order_by('-id')
+            updated, hidden = [], []
+            for video in changed:
+                if video.view_on_app:
+                    updated.append(get_video(video))
+                else:
+                    hidden.append(video.id)
+            deleted = VideoTombstone.objects.filter(deleted_at__gt=since).values_list('video_id', flat=True)
+            data = {'reset': False, 'updated': updated, 'hidden': hidden, 'deleted': list(deleted)}
+
+        next_since = now - timedelta(seconds=settings.APP_VIDEO_SYNC_OVERLAP)
+        data['token'] = encode_cursor({'t': next_since.isoformat()})
         return add_success_response(data)
 
 
@@ -38,7 +104,7 @@ class OrderCreateView(APIView):
     def post(self, request):
         user = request.customuser
         print('User =', user)
-        if user.has_subscription() is True:
+        if user.check_subscription() is True:
             return add_error_response({'error': 'User is already subscriber'}, status=400)
 
         from datetime import timedelta
@@ -70,9 +136,20 @@ class OrderCreateView(APIView):
 
 class OrderListView(APIView):
     def get(self, request):
+        from users.utils import get_page_size
+        from ..utils import get_orders, get_orders_page
+
         user = request.customuser
-        user.has_subscription()
-        from ..utils import get_orders
+        cursor = request.GET.get('cursor')
+        per_page = request.GET.get('per_page')
+
+        if cursor or per_page:
+            try:
+                data, next_cursor = get_orders_page(user, cursor, get_page_size(per_page))
+            except (ValueError, KeyError, TypeError):
+                return add_error_response({'message': 'Invalid cursor'}, status=400)
+            return Response({'status': 'success', 'data': data, 'next_cursor': next_cursor})
+
         # serializer = OrderListSerializer(orders, many=True)
         return Response({'status': 'success', 'data': get_orders(user)})
 
@@ -80,7 +157,7 @@ class OrderListView(APIView):
 class CheckSubscriptionView(APIView):
     def get(self, request):
         user = request.customuser
-        is_subscribed = user.has_subscription()
+        is_subscribed = user.check_subscription()
         data = {
             'status': 'success',
             'is_subscribed': is_subscribed
@@ -102,7 +179,7 @@ class SubscriptionView(APIView):
         # subscription_amount = request.data.get('subscription_amount')
         # subscription_period = request.data.get('subscription_period')
 
-        is_subscribed = user.has_subscription()
+        is_subscribed = user.check_subscription()
         new_start_date = timezone.now()
         if is_subscribed is True:
 
@@ -141,21 +218,23 @@ class VideoPlayView(APIView):
         user = request.customuser
         video_id = request.data.get('video')
 
-        is_subscribed = user.has_subscription()
+        is_subscribed = user.check_subscription()
         if is_subscribed is True:
-            from ..utils import get_video
+            from ..catalog import get_catalog
+            from ..models import WatchProgress
+            from ..watch_events import play_counter, progress_buffer
             try:
-                from django.db.models import F
-                video = Video.objects.get(id=video_id, view_on_app=True)
-
-                # Add watch count and watch hours
-                video.watch_count = F('watch_count') + 1
-                video.watch_hours = F('watch_hours') + video.duration
-                video.save()
-                # refresh DB
-                video.refresh_from_db()
-                return add_success_response({'data': get_video(video, app=True)})
-            except Video.DoesNotExist:
+                video = get_catalog().by_id[int(video_id)]
+
+                # Add watch count; watch hours come from the playback heartbeats
+                play_counter.add(video['id'])
+
+                position = progress_buffer.get_position(user.id, video['id'])
+                if position is None:
+                    position = WatchProgress.objects.filter(user=user, video_id=video['id']).values_list(
+                        'position', flat=True).first() or 0
+                return add_success_response({'data': dict(video, resume_position=position)})
+            except (KeyError, TypeError, ValueError):
                 return add_error_response({
                     'is_subscribed': is_subscribed,
                     'message': 'Video ID does not exist.'
@@ -166,6 +245,72 @@ class VideoPlayView(APIView):
             })
 
 
+class VideoHeartbeatView(APIView):
+    """
+    Sent by the player every few seconds while a video plays, with the current position and
+    the seconds played since the previous heartbeat.
+    """
+
+    def post(self, request):
+        import math
+        from ..catalog import get_catalog
+        from ..watch_events import progress_buffer
+
+        user = request.customuser
+        is_subscribed = user.check_subscription()
+        if is_subscribed is not True:
+            return add_error_response({'is_subscribed': is_subscribed})
+
+        snapshot = get_catalog()
+        try:
+            video = snapshot.by_id[int(request.data.get('video'))]
+            position = max(float(request.data.get('position', 0)), 0)
+            seconds = float(request.data.get('seconds', 0))
+        except (KeyError, TypeError, ValueError):
+            return add_error_response({'message': 'Invalid video, position or seconds.'}, status=400)
+        # nan slips through min()/max() and would poison watched_seconds and watch_hours.
+        if not (math.isfinite(position) and math.isfinite(seconds)):
+            return add_error_response({'message': 'Invalid video, position or seconds.'}, status=400)
+
+        duration = snapshot.durations[video['id']]
+        if duration:
+            position = min(position, duration)
+        seconds = min(max(seconds, 0), settings.WATCH_HEARTBEAT_MAX_SECONDS)
+
+        progress_buffer.add(user.id, video['id'], position, seconds)
+        return add_success_response({'message': 'Progress saved.'})
+
+
+class ContinueWatchingView(APIView):
+    """The user's most recently watched videos that aren't finished yet, with their positions."""
+
+    def get(self, request):
+        from ..catalog import get_catalog
+        from ..models import WatchProgress
+
+        user = request.customuser
+        snapshot = get_catalog()
+        limit = settings.CONTINUE_WATCHING_LIMIT
+
+        # Over-fetch so finished and hidden videos don't shorten the list.
+        rows = WatchProgress.objects.filter(user=user).order_by('-updated_at').values_list(
+            'video_id', 'position', 'updated_at')[:limit * 2]
+
+        data = []
+        for video_id, position, updated_at in rows:
+            video = snapshot.by_id.get(video_id)
+            if video is None:
+                continue
+            duration = snapshot.durations[video_id]
+            if duration and position >= duration * settings.WATCH_COMPLETED_RATIO:
+                continue
+            data.append(dict(video, resume_position=position,
+                             last_watched=updated_at.strftime("%d-%m-%Y %H:%M")))
+            if len(data) == limit:
+                break
+        return add_success_response({'data': data})
+
+
 class TransactionHistoryView(APIView):
 
     def get_transaction(self, obj):
@@ -180,26 +325,6 @@ class TransactionHistoryView(APIView):
             "order_id": obj.razorpay_order_id
         }
 
-    def update_status(self, trans):
-        import requests
-        from requests.auth import HTTPBasicAuth
-        from json import loads
-        from datetime import timedelta
-        from django.utils import timezone
-
-        config = settings.PAYMENT_CONFIG
-
-        expiry = timezone.now() - timedelta(hours=12)
-        for i in trans.filter(status='created', timestamp__gte=expiry):
-            res = requests.get(f'https://api.razorpay.com/v1/orders/{i.razorpay_order_id}',
-                               auth=HTTPBasicAuth(config['key_id'], config['key_secret']))
-            res = loads(res.text)
-            if 'error' in res:
-                continue
-            if res['status'] != i.status:
-                i.status = res['status']
-                i.save()
-
     def get(self, request):
         get = request.GET.get
         page = get('page', 1)
@@ -207,9 +332,8 @@ class TransactionHistoryView(APIView):
 
         user = request.customuser
 
+        # Pending transactions are settled in the background by payment.reconcile.
         transaction = Transaction.objects.filter(order__user=user).order_by('-id')
-        if page in (1, '1'):
-            self.update_status(transaction)
         data = get_paginated_list(transaction, page, per_page)
         data['data'] = [self.get_transaction(i) for i in data['data']]
         return add_success_response(data)
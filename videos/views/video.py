@@ -4,8 +4,13 @@ from rest_framework.views import APIView
 from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from ..serializers import VideoCreateSerializer, VideoListSerializer
-from ..models import Video
+from ..serializers import (
+    VideoCreateSerializer,
+    VideoListSerializer,
+    VideoUploadCreateSerializer,
+    VideoUploadFinalizeSerializer
+)
+from ..models import Video, VideoUpload
 from users.utils import add_success_response, add_error_response, format_errors, get_paginated_list
 
 
@@ -27,30 +32,8 @@ class VideoCreateView(APIView):
             print('Saved !!!!!')
 
             # Set duration
-            # Moviepy
-            # from moviepy.video.io.VideoFileClip import VideoFileClip
-            from django.conf import settings
-            import os
-            # Opencv
-            # import cv2
-            # file_path = settings.MEDIA_ROOT + '/', obj.file.name
-            # print('file path = ', file_path)
-            # clip = VideoFileClip(file_path)
-            # d = clip.duration
-            # print('duration  = ', d)
-            # clip.close()
-
-            # cv = cv2.VideoCapture(file_path)
-            # fps = cv.get(cv2.CAP_PROP_FPS)
-            # seconds = cv.get(cv2.CAP_PROP_FRAME_COUNT)
-            #
-            # print('----------- opencv response -----------')
-            # print('fps -- ', fps)
-            # print('sec -- ', seconds)
-            # duration = seconds / fps
-            # print('duration -- ', duration)
-
-            # obj.duration = duration
+            from ..mp4 import get_duration
+            obj.duration = get_duration(obj.file)
             obj.save()
 
             return add_success_response({
@@ -62,6 +45,150 @@ class VideoCreateView(APIView):
             })
 
 
+class VideoUploadView(APIView):
+    """
+    Resumable upload of a video file or trailer. POST creates the upload, PATCH appends the
+    request body at the Upload-Offset header, GET returns the offset to resume from. Chunks go
+    to the final storage name (see videos.uploads); the Video row is only created by
+    VideoUploadFinalizeView.
+    """
+
+    def post(self, request):
+        from django.utils.text import get_valid_filename
+        from ..uploads import create_upload
+
+        serializer = VideoUploadCreateSerializer(data=request.data)
+        if not serializer.is_valid():
+            return add_error_response({'error': format_errors(serializer.errors)})
+
+        data = serializer.validated_data
+        field = Video._meta.get_field(data['kind'])
+        upload = VideoUpload(kind=data['kind'], length=data['length'], created_by=request.customuser)
+        upload.name = f"{field.upload_to.rstrip('/')}/{upload.id.hex}_{get_valid_filename(data['filename'])}"
+        try:
+            create_upload(upload)
+        except NotImplementedError:
+            return add_error_response({'message': 'Resumable uploads need a local or parallel-s3 video storage.'},
+                                      status=501)
+        return add_success_response({
+            'id': str(upload.id),
+            'offset': upload.offset,
+            'length': upload.length
+        }, status=status.HTTP_201_CREATED)
+
+    def get(self, request, upload_id):
+        upload = get_object_or_404(VideoUpload, id=upload_id)
+        response = add_success_response({
+            'id': str(upload.id),
+            'offset': upload.offset,
+            'length': upload.length,
+            'checksum': upload.checksum
+        })
+        response['Upload-Offset'] = str(upload.offset)
+        return response
+
+    def patch(self, request, upload_id):
+        import base64
+        from django.conf import settings
+        from ..uploads import UploadConflict, write_chunk
+
+        try:
+            offset = int(request.headers['Upload-Offset'])
+            length = int(request.headers['Content-Length'])
+        except (KeyError, ValueError):
+            return add_error_response({'message': 'Upload-Offset and Content-Length headers are required.'},
+                                      status=400)
+        if length > settings.VIDEO_UPLOAD_MAX_CHUNK_SIZE:
+            return add_error_response({'message': 'Chunk is too large.'}, status=413)
+
+        expected = None
+        if 'Upload-Checksum' in request.headers:
+            algorithm, _, value = request.headers['Upload-Checksum'].partition(' ')
+            if algorithm != 'sha256':
+                return add_error_response({'message': 'Only sha256 checksums are supported.'}, status=400)
+            try:
+                expected = base64.b64decode(value, validate=True)
+            except ValueError:
+                return add_error_response({'message': 'Invalid Upload-Checksum header.'}, status=400)
+
+        try:
+            upload = write_chunk(upload_id, offset, length, request, expected)
+        except UploadConflict as e:
+            data = {'message': e.message}
+            if e.offset is not None:
+                data['offset'] = e.offset
+            return add_error_response(data, status=e.status)
+
+        response = add_success_response({
+            'offset': upload.offset,
+            'length': upload.length,
+            'checksum': upload.checksum
+        })
+        response['Upload-Offset'] = str(upload.offset)
+        return response
+
+
+class VideoUploadFinalizeView(APIView):
+    """Creates the Video from two completed uploads (file and trailer) and the usual fields."""
+
+    def post(self, request):
+        from django.db import transaction
+        from django.utils import timezone
+        from ..mp4 import get_duration
+        from ..uploads import UploadConflict, complete_upload
+
+        user = request.customuser
+        serializer = VideoUploadFinalizeSerializer(data=request.data)
+        if not serializer.is_valid():
+            return add_error_response({'error': format_errors(serializer.errors)})
+
+        upload_ids = {
+            'file': serializer.validated_data.pop('file_upload'),
+            'trailer': serializer.validated_data.pop('trailer_upload')
+        }
+
+        def check(uploads):
+            for kind, upload_id in upload_ids.items():
+                upload = uploads.get(upload_id)
+                if upload is None or upload.kind != kind:
+                    return add_error_response({'message': f'Invalid {kind} upload.'}, status=400)
+                if upload.completed_at is not None:
+                    return add_error_response({'message': f'The {kind} upload is already finalized.'}, status=409)
+                if not upload.is_complete():
+                    return add_error_response({'message': f'The {kind} upload is incomplete.',
+                                               'offset': upload.offset}, status=400)
+
+        uploads = VideoUpload.objects.in_bulk(upload_ids.values())
+        error = check(uploads)
+        if error is not None:
+            return error
+        # Completing an S3 multipart upload and reading the MP4 metadata are storage calls, so they
+        # happen before the row locks.
+        try:
+            for upload in uploads.values():
+                complete_upload(upload)
+        except UploadConflict as e:
+            return add_error_response({'message': e.message}, status=e.status)
+        file_field = Video._meta.get_field('file')
+        duration = get_duration(file_field.attr_class(None, file_field, uploads[upload_ids['file']].name))
+
+        with transaction.atomic():
+            uploads = VideoUpload.objects.select_for_update().in_bulk(upload_ids.values())
+            error = check(uploads)
+            if error is not None:
+                return error
+
+            obj = serializer.save(file=uploads[upload_ids['file']].name,
+                                  trailer=uploads[upload_ids['trailer']].name,
+                                  view_on_app=True, created_by=user, duration=duration)
+            VideoUpload.objects.filter(id__in=upload_ids.values()).update(video=obj, completed_at=timezone.now())
+
+        return add_success_response({
+            'message': 'Video created successfully',
+            'id': obj.id
+        }, status=status.HTTP_201_CREATED)
+
+
 class VideoListView(APIView):
 
     def get(self, request):
@@ -87,6 +214,7 @@ class VideoDeleteView(APIView):
     def post(self, request):
         video_id = request.data.get('id')
         try:
+            # Files are removed later by the process_media_deletions worker.
             video = Video.objects.get(id=video_id)
             video.delete()
         except Video.DoesNotExist:
@@ -0,0 +1,173 @@
+import atexit
+import threading
+import time
+
+from django.conf import settings
+from django.utils import timezone
+
+
+class PlayCounter:
+    """
+    Aggregates play events per video in memory and adds them to Video.watch_count with one
+    UPDATE ... CASE per batch, instead of a row update per play. Pending counts are flushed
+    every interval seconds and when the worker exits.
+    """
+
+    def __init__(self, interval, batch_size=500):
+        self.interval = interval
+        self.batch_size = batch_size
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+
+    def add(self, video_id):
+        with self._lock:
+            self._pending[video_id] = self._pending.get(video_id, 0) + 1
+            due = time.monotonic() - self._last_flush >= self.interval
+        if due:
+            self.flush()
+
+    def flush(self):
+        from django.db.models import Case, When, Value, F, IntegerField
+        from .models import Video
+
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._last_flush = time.monotonic()
+
+        items = list(pending.items())
+        flushed = 0
+        for start in range(0, len(items), self.batch_size):
+            batch = items[start:start + self.batch_size]
+            try:
+                Video.objects.filter(id__in=[video_id for video_id, _ in batch]).update(
+                    watch_count=F('watch_count') + Case(
+                        *[When(id=video_id, then=Value(count)) for video_id, count in batch],
+                        default=Value(0), output_field=IntegerField()),
+                )
+            except Exception as e:
+                print('Play counter flush failed: ', str(e))
+                self._restore(items[start:])
+                break
+            flushed += len(batch)
+        return flushed
+
+    def _restore(self, items):
+        with self._lock:
+            for video_id, count in items:
+                self._pending[video_id] = self._pending.get(video_id, 0) + count
+
+
+class ProgressBuffer:
+    """
+    Collects playback heartbeats per (user, video) in memory, keeping the latest position and
+    the seconds watched since the last flush. A flush folds them into WatchProgress, one row
+    per user and video, with a locked read and one bulk update per batch, after inserting
+    empty rows for pairs seen for the first time.
+    """
+
+    def __init__(self, interval, batch_size=500):
+        self.interval = interval
+        self.batch_size = batch_size
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+
+    def add(self, user_id, video_id, position, seconds):
+        with self._lock:
+            entry = self._pending.get((user_id, video_id))
+            seconds += entry['seconds'] if entry else 0
+            self._pending[(user_id, video_id)] = {'position': position, 'seconds': seconds, 'at': timezone.now()}
+            due = time.monotonic() - self._last_flush >= self.interval
+        if due:
+            self.flush()
+
+    def get_position(self, user_id, video_id):
+        with self._lock:
+            entry = self._pending.get((user_id, video_id))
+        return entry['position'] if entry else None
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._last_flush = time.monotonic()
+
+        items = list(pending.items())
+        flushed = 0
+        for start in range(0, len(items), self.batch_size):
+            batch = items[start:start + self.batch_size]
+            try:
+                self._write(batch)
+            except Exception as e:
+                print('Watch progress flush failed: ', str(e))
+                self._restore(items[start:])
+                break
+            flushed += len(batch)
+        return flushed
+
+    def _write(self, batch):
+        from django.db import transaction
+        from django.contrib.auth import get_user_model
+        from .models import Video, WatchProgress
+
+        user_ids = {user_id for (user_id, _), _ in batch}
+        video_ids = {video_id for (_, video_id), _ in batch}
+
+        with transaction.atomic():
+            rows = WatchProgress.objects.select_for_update().filter(user_id__in=user_ids, video_id__in=video_ids)
+            existing = {(row.user_id, row.video_id): row for row in rows}
+
+            missing = [key for key, _ in batch if key not in existing]
+            if missing:
+                # Users or videos deleted since the heartbeat would fail the whole batch.
+                users = set(get_user_model().objects.filter(id__in=user_ids).values_list('id', flat=True))
+                videos = set(Video.objects.filter(id__in=video_ids).values_list('id', flat=True))
+                # Rows start empty and get their seconds below like any other, so a row another
+                # worker inserted first (a skipped conflict) still receives this batch's seconds.
+                WatchProgress.objects.bulk_create([
+                    WatchProgress(user_id=user_id, video_id=video_id)
+                    for user_id, video_id in missing if user_id in users and video_id in videos
+                ], ignore_conflicts=True)
+                rows = WatchProgress.objects.select_for_update().filter(
+                    user_id__in={user_id for user_id, _ in missing}, video_id__in={video_id for _, video_id in missing})
+                for row in rows:
+                    existing.setdefault((row.user_id, row.video_id), row)
+
+            updates = []
+            for key, entry in batch:
+                row = existing.get(key)
+                if row is not None:
+                    row.position = entry['position']
+                    row.watched_seconds += entry['seconds']
+                    row.updated_at = entry['at']
+                    updates.append(row)
+
+            WatchProgress.objects.bulk_update(updates, ['position', 'watched_seconds', 'updated_at'])
+
+    def _restore(self, items):
+        with self._lock:
+            for key, entry in items:
+                newer = self._pending.get(key)
+                if newer is not None:
+                    entry = dict(newer, seconds=newer['seconds'] + entry['seconds'])
+                self._pending[key] = entry
+
+
+def aggregate_watch_hours():
+    """
+    Set Video.watch_hours (in seconds) to its baseline plus the watched seconds across users, in
+    one UPDATE. Videos without progress rows keep their hours.
+    """
+    from django.db.models import F, OuterRef, Subquery, Sum, FloatField
+    from .models import Video, WatchProgress
+
+    totals = (WatchProgress.objects.filter(video=OuterRef('pk')).order_by().values('video')
+              .annotate(total=Sum('watched_seconds')).values('total'))
+    return Video.objects.filter(id__in=WatchProgress.objects.values('video')).update(
+        watch_hours=F('watch_hours_baseline') + Subquery(totals, output_field=FloatField()))
+
+
+play_counter = PlayCounter(interval=settings.PLAY_COUNT_FLUSH_INTERVAL)
+progress_buffer = ProgressBuffer(interval=settings.WATCH_PROGRESS_FLUSH_INTERVAL)
+atexit.register(play_counter.flush)
+atexit.register(progress_buffer.flush)